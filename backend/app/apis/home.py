@@ -7,11 +7,16 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from ..apis.user.exception import UserNotFoundException, UserOrPasswordErrorException
 from ..config import settings
-from ..extensions.auth import create_access_token
+from ..extensions.auth import PermissionChecker, create_access_token
+from ..extensions.cache import cache_stats
+from ..extensions.database import pool_stats
+from ..extensions.fastapi.timing import TimedRoute
+from ..extensions.password import password_hasher
+from ..extensions.ratelimit import RateLimiter
 from ..services.user import UserService
 
 # 定制一个不带api prefix的api router，将一些随业务变动不大的api放这里
-base_router = APIRouter()
+base_router = APIRouter(route_class=TimedRoute)
 
 
 @base_router.get("/")
@@ -20,7 +25,19 @@ async def helth_check() -> dict:
     return {"message": "Hello, FastAPI!"}
 
 
-@base_router.post("/login")
+@base_router.get("/cache/stats", dependencies=[Depends(PermissionChecker("sys"))])
+async def read_cache_stats() -> dict:
+    """本进程内各个接口缓存的命中率."""
+    return cache_stats.snapshot()
+
+
+@base_router.get("/db/stats", dependencies=[Depends(PermissionChecker("sys"))])
+async def read_db_stats() -> dict:
+    """本进程内各个数据库连接池的状态: 取连接等待耗时、使用中与溢出连接数、连接存活时间等."""
+    return pool_stats.snapshot()
+
+
+@base_router.post("/login", dependencies=[Depends(RateLimiter(times=10, seconds=60))])
 async def user_login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     user_service: UserService = Depends(UserService),
@@ -28,11 +45,18 @@ async def user_login(
     """使用请求表单进行用户登录."""
     existing_user = await user_service.get_user_by_name(form_data.username)
     if existing_user:
-        if not existing_user.verify_password(form_data.password):
+        if not await password_hasher.verify(form_data.password, existing_user.password):
             raise UserOrPasswordErrorException
     else:
         raise UserNotFoundException
 
+    # 密码的加密强度低于当前配置时, 使用当前配置重新加密
+    if password_hasher.needs_rehash(existing_user.password):
+        await user_service.update(
+            existing_user,
+            password=await password_hasher.hash(form_data.password),
+        )
+
     # 过期时间
     access_token_expires = timedelta(minutes=settings.JWT_EXPIRED)
     # 把id进行username加密，要使用str类型
@@ -4,14 +4,27 @@ from typing import Any
 
 from fastapi import APIRouter, Depends
 
+from ...extensions.fastapi.conditional import ResourceVersion, conditional_get
+from ...extensions.fastapi.export import ExportFormatParam, ExportResponse, export_fields
 from ...extensions.fastapi.pagination import PageModel, PageQueryParam
+from ...extensions.fastapi.timing import TimedRoute
+from ...models.resource import Resource
 from ...services.resource import ResourceService
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+
+async def resource_list_version(
+    page: PageQueryParam = None,
+    resource_service: ResourceService = Depends(ResourceService),
+) -> ResourceVersion:
+    """资源列表的版本, 与read_resources检索相同的记录."""
+    return await resource_service.version(offset=page.offset, limit=page.limit, count=True)
 
 
 @router.get(
     "/",
+    dependencies=[Depends(conditional_get(resource_list_version))],
     # dependencies=[Depends(check_jwt_token), Depends(get_current_active_superuser)],
     # response_model=UsersPublic,
 )
@@ -25,3 +38,18 @@ async def read_resources(
     page_out = PageModel.model_validate(page, update={"total": count})
 
     return {"data": resources, "page": page_out}
+
+
+@router.get("/export", response_class=ExportResponse)
+async def export_resources(
+    export_format: ExportFormatParam = "ndjson",
+    resource_service: ResourceService = Depends(ResourceService),
+) -> ExportResponse:
+    """流式导出全部资源信息(NDJSON或CSV)."""
+    fields = export_fields(Resource)
+    return ExportResponse(
+        resource_service.stream(fields),
+        list(fields.values()),
+        export_format,
+        filename="resources",
+    )
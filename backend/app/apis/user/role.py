@@ -4,14 +4,27 @@ from typing import Any
 
 from fastapi import APIRouter, Depends
 
+from ...extensions.fastapi.conditional import ResourceVersion, conditional_get
+from ...extensions.fastapi.export import ExportFormatParam, ExportResponse, export_fields
 from ...extensions.fastapi.pagination import PageModel, PageQueryParam
+from ...extensions.fastapi.timing import TimedRoute
+from ...models.role import Role
 from ...services.role import RoleService
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+
+async def role_list_version(
+    page: PageQueryParam = None,
+    role_service: RoleService = Depends(RoleService),
+) -> ResourceVersion:
+    """角色列表的版本, 与read_roles检索相同的记录."""
+    return await role_service.version(offset=page.offset, limit=page.limit, count=True)
 
 
 @router.get(
     "/",
+    dependencies=[Depends(conditional_get(role_list_version))],
     # dependencies=[Depends(check_jwt_token), Depends(get_current_active_superuser)],
     # response_model=UsersPublic,
 )
@@ -25,3 +38,18 @@ async def read_roles(
     page_out = PageModel.model_validate(page, update={"total": count})
 
     return {"data": roles, "page": page_out}
+
+
+@router.get("/export", response_class=ExportResponse)
+async def export_roles(
+    export_format: ExportFormatParam = "ndjson",
+    role_service: RoleService = Depends(RoleService),
+) -> ExportResponse:
+    """流式导出全部角色信息(NDJSON或CSV)."""
+    fields = export_fields(Role)
+    return ExportResponse(
+        role_service.stream(fields),
+        list(fields.values()),
+        export_format,
+        filename="roles",
+    )
@@ -1,16 +1,30 @@
 # -*- coding: utf-8 -*-
 
 from fastapi import APIRouter, Depends
-from fastapi_cache.decorator import cache
 
-from ...extensions.auth import PermissionChecker, get_current_user
-from ...extensions.cache import request_key_builder
-from ...extensions.fastapi.pagination import PageQueryParam
-from ...models.user import User, UserCreate, UserListPage, UserPublic, UserUpdate
+from ...config import settings
+from ...extensions.auth import (
+    PermissionChecker,
+    Principal,
+    get_current_principal,
+    get_current_user,
+)
+from ...extensions.cache import cached, tagged, vary_key_builder
+from ...extensions.fastapi.export import ExportFormatParam, ExportResponse, export_fields
+from ...extensions.fastapi.pagination import CursorModel, PageQueryParam, cursor_query
+from ...extensions.fastapi.timing import TimedRoute
+from ...models.user import (
+    User,
+    UserCreate,
+    UserListPage,
+    UserPublic,
+    UserScrollPage,
+    UserUpdate,
+)
 from ...services.user import UserService
 from .exception import UsernameUsedException, UserNotFoundException
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.get(
@@ -18,7 +32,12 @@ router = APIRouter()
     dependencies=[Depends(PermissionChecker("sys:user:list"))],
     response_model=UserListPage,
 )
-@cache(expire=60, key_builder=request_key_builder)
+@cached(
+    expire=settings.CACHE_EXPIRE,
+    key_builder=tagged(vary_key_builder(query=("page", "page_size"), scope="public"), "user-list"),
+    stale=60,
+    beta=1,
+)
 async def read_users(
     page: PageQueryParam = None,
     user_service: UserService = Depends(UserService),
@@ -33,11 +52,50 @@ async def read_users(
     return UserListPage(users=users, page=page_out)
 
 
+@router.get(
+    "/scroll",
+    dependencies=[Depends(PermissionChecker("sys:user:list"))],
+    response_model=UserScrollPage,
+)
+async def scroll_users(
+    page: CursorModel = Depends(cursor_query(sort_fields=("id",), count="estimate")),
+    user_service: UserService = Depends(UserService),
+) -> UserScrollPage:
+    """游标分页读取用户信息, 适合数据量大、需要逐页向后翻页的场景."""
+    users = await user_service.get_list(page)
+    return UserScrollPage(users=users, page=page)
+
+
+@router.get(
+    "/export",
+    dependencies=[Depends(PermissionChecker("sys:user:list"))],
+    response_class=ExportResponse,
+)
+async def export_users(
+    export_format: ExportFormatParam = "ndjson",
+    user_service: UserService = Depends(UserService),
+) -> ExportResponse:
+    """流式导出全部用户信息(NDJSON或CSV), 忽略密码, 用于全量同步."""
+    fields = export_fields(UserPublic)
+    return ExportResponse(
+        user_service.stream(fields),
+        list(fields.values()),
+        export_format,
+        filename="users",
+    )
+
+
 @router.get("/me", response_model=UserPublic)
-@cache(expire=60, key_builder=request_key_builder)
-async def user_me(current_user: User = Depends(get_current_user)) -> UserPublic:
+@cached(
+    expire=settings.CACHE_EXPIRE,
+    key_builder=tagged(vary_key_builder(query=(), scope="user"), "user:{principal.id}"),
+)
+async def user_me(
+    principal: Principal = Depends(get_current_principal),
+    user_service: UserService = Depends(UserService),
+) -> UserPublic:
     """获取当前用户详情."""
-    return current_user
+    return await user_service.get(principal.id)
 
 
 @router.patch("/me", response_model=UserPublic)
@@ -76,15 +134,15 @@ async def user_signup(
     dependencies=[Depends(PermissionChecker("sys:user:list"))],
     response_model=UserPublic,
 )
-@cache(expire=60, key_builder=request_key_builder)
+@cached(
+    expire=settings.CACHE_EXPIRE,
+    key_builder=tagged(vary_key_builder(query=(), scope="public"), "user:{user_id}"),
+)
 async def read_user_by_id(
     user_id: int,
     user_service: UserService = Depends(UserService),
-    current_user: User = Depends(get_current_user),
 ) -> UserPublic:
     """根据id访问用户信息."""
-    if user_id == current_user.id:
-        return current_user
     return await user_service.get(user_id)
 
 
@@ -98,13 +156,9 @@ async def update_user(
     user_id: int,
     user_in: UserUpdate,
     user_service: UserService = Depends(UserService),
-    current_user: User = Depends(get_current_user),
 ) -> UserPublic:
     """修改用户信息."""
-    if user_id == current_user.id:
-        db_user = current_user
-    else:
-        db_user = await user_service.get(user_id)
+    db_user = await user_service.get(user_id)
     if not db_user:
         raise UserNotFoundException
     if user_in.name:
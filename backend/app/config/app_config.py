@@ -5,8 +5,11 @@ from typing import Annotated, Literal, Optional
 from pydantic import (
     AnyHttpUrl,
     AnyUrl,
+    BaseModel,
     BeforeValidator,
+    Field,
     MariaDBDsn,
+    MySQLDsn,
     PostgresDsn,
     RedisDsn,
     computed_field,
@@ -25,6 +28,13 @@ def parse_cors(v: str) -> list[str] | str:
     raise ValueError(v)
 
 
+class DBReplicaSettings(BaseModel):
+    """数据库只读副本配置."""
+
+    dsn: MySQLDsn
+    weight: int = Field(default=1, ge=1)  # 按照权重分配只读查询
+
+
 class AppConfigSettings(BaseSettings):
     """应用配置类.
 
@@ -46,6 +56,8 @@ class AppConfigSettings(BaseSettings):
     DEBUG: bool = False
     BASE_URL: AnyHttpUrl = "http://127.0.0.1:8080"
     API_PREFIX: str = "/api"
+    # JSON序列化后端: auto 优先使用orjson, 未安装时使用标准库json
+    JSON_SERIALIZER: Literal["auto", "orjson", "stdlib"] = "auto"
 
     # 服务器配置信息
     HOST: str = "127.0.0.1"
@@ -54,6 +66,15 @@ class AppConfigSettings(BaseSettings):
     DOCS_URL: Optional[str] = (None,)  # 属性值设置为 None 时，表示不开启
     REDOC_URL: Optional[str] = None  # 属性值设置为 None 时，表示不开启
     CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = []
+    # 是否输出Server-Timing响应头(各阶段耗时)
+    SERVER_TIMING_ENABLED: bool = True
+    # 响应压缩配置, 按照Accept-Encoding协商br/zstd/gzip(br、zstd需要安装brotli、zstandard)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    COMPRESSION_THREADPOOL_MIN_SIZE: int = 256 * 1024  # 不小于该字节数的响应在线程池中压缩
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
 
     # cookie 配置信息
     COOKIE_KEY: str = "sessionId"  # key name
@@ -75,6 +96,17 @@ class AppConfigSettings(BaseSettings):
         "/api/user/login",
         "/favicon.ico",
     ]
+    # 登录用户身份与权限缓存
+    AUTH_PRINCIPAL_CACHE_TTL: int = 300  # 缓存秒数
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000  # 进程内最多缓存的用户数
+    AUTH_PRINCIPAL_CACHE_PREFIX: str = "principal"  # Redis key前缀
+    # 授予资源时是否同时授予其所有下级资源(按pid), 例如授予sys即拥有sys:user:list
+    AUTH_PERMISSION_INHERIT: bool = False
+
+    # 密码加密配置
+    PASSWORD_HASH_ROUNDS: int = 12  # bcrypt cost, 登录时低于该值的密码会重新加密
+    PASSWORD_HASH_WORKERS: int = 4  # 加密线程数
+    PASSWORD_HASH_MAX_PENDING: int = 64  # 最多同时执行与等待的加密任务数, 超过时返回503
 
     # 数据库配置
     DB_HOST: str = "127.0.0.1"
@@ -85,7 +117,20 @@ class AppConfigSettings(BaseSettings):
     DB_QUERY_STR: str = "charset=utf8mb4"
     DB_POOL_SIZE: int = 10
     DB_POOL_OVERFLOW: int = 40
+    DB_POOL_TIMEOUT: float = 30  # 从连接池取连接的超时秒数
+    DB_POOL_RECYCLE: int = 3600  # 连接建立超过该秒数后重建, -1表示不重建
+    # 连接池自适应并发限制(AIMD): 按照查询耗时在最小值与连接池上限之间调整同时使用的连接数
+    DB_POOL_ADAPTIVE: bool = False
+    DB_POOL_ADAPTIVE_MIN: int = 2
+    DB_POOL_TARGET_LATENCY: float = 50  # 目标查询耗时(毫秒), 超过时减少并发
     DB_ENABLE_ECHO: bool = True
+    DB_BULK_CHUNK_SIZE: int = 1000  # 批量写入时每条SQL语句的数据条数
+    DB_STREAM_BATCH_SIZE: int = 1000  # 流式读取时每批从服务端游标读取的行数
+    # 只读副本, 例如 DB_REPLICAS='[{"dsn": "mysql+aiomysql://root:@10.0.0.2/test", "weight": 2}]'
+    DB_REPLICAS: list[DBReplicaSettings] = []
+    DB_REPLICA_HEALTH_INTERVAL: float = 5  # 只读副本健康检查间隔秒数
+    DB_REPLICA_HEALTH_TIMEOUT: float = 2  # 只读副本健康检查超时秒数
+    DB_REPLICA_STICKY_SECONDS: float = 1  # 写入之后该秒数内只读查询仍然发送到主库, 避免复制延迟
 
     @computed_field
     @property
@@ -136,6 +181,25 @@ class AppConfigSettings(BaseSettings):
     REDIS_EXPIRE: int = 24 * 60 * 60  # Redis 过期时长
     REDIS_PREFIX: str = "redis-om"  # Redis 全局前缀
 
+    # 接口缓存配置
+    CACHE_EXPIRE: int = 60 * 60  # 接口缓存秒数, 数据通过ServiceBase变更时按标签立即失效
+    CACHE_LOCAL_ENABLED: bool = True  # 是否在Redis前增加进程内缓存
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024  # 进程内缓存最多占用的内存字节数
+    CACHE_LOCAL_TTL: int = 60  # 进程内缓存最长秒数, 错过失效通知时最多使用这么久的旧数据
+    CACHE_LOCK_TIMEOUT: float = 5  # 缓存未命中时等待其他进程重新计算的最长秒数
+    CACHE_LOCK_POLL_INTERVAL: float = 0.05  # 等待其他进程重新计算时检查缓存的间隔秒数
+    # 缓存内容的序列化格式, auto在安装了msgspec时使用msgpack
+    # (msgspec、zstandard、lz4均为可选依赖, 需要时自行安装, 没有安装时使用JSON与zlib)
+    CACHE_CODEC_FORMAT: Literal["auto", "json", "msgpack"] = "auto"
+    # 缓存内容的压缩算法, auto依次选择已安装的zstd、lz4、zlib
+    CACHE_CODEC_COMPRESSION: Literal["auto", "none", "zlib", "zstd", "lz4"] = "auto"
+    CACHE_CODEC_MIN_SIZE: int = 1024  # 缓存内容不小于该字节数时才压缩
+
+    # 限流配置
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PREFIX: str = "ratelimit"  # 限流key前缀
+    RATE_LIMIT_LOCAL_SIZE: int = 10000  # 本地预过滤最多记录的被拒绝key数
+
     # celery
     CELERY_BROKER: str = "redis://127.0.0.1:6379/8"
     CELERY_BACKEND: str = "redis://127.0.0.1:6379/8"
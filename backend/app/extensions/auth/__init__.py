@@ -1,16 +1,25 @@
 # -*- coding: utf-8 -*-
 
 from datetime import UTC, datetime, timedelta
-from typing import Annotated, Literal, Optional
+from typing import Annotated, Any, Literal, Optional, Type
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
+from redis.exceptions import RedisError
+from sqlmodel import SQLModel
 
 from ...config import settings
+from ...models.resource import Resource
+from ...models.role import Role, RoleResourceLink
 from ...models.user import User
+from ...services.resource import ResourceService
+from ...services.role import RoleService
 from ...services.user import UserService
+from ..fastapi.service import on_model_change
+from .permission import PermissionIndex, permission_index
+from .principal import Principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
@@ -32,29 +41,114 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
 
-async def get_current_user(
+def _token_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail={
+            "code": 5000,
+            "message": "Token Error",
+            "data": "Token Error",
+        },
+    )
+
+
+async def get_auth_version(request: Request) -> int:
+    """用户身份缓存与权限索引的全局版本号, 同一个请求内只读取一次.
+
+    get_current_principal已经读取过时直接使用, 不再访问Redis。
+    """
+    version = getattr(request.state, "auth_version", None)
+    if version is None:
+        version = await principal_cache.version()
+    return version
+
+
+async def get_current_principal(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     user_service: UserService = Depends(UserService),
-) -> User:
-    """验证JWT access token.
+) -> Principal:
+    """验证JWT access token, 返回当前用户的身份.
+
+    优先从缓存中读取, 缓存命中时不访问数据库。用户身份同时保存在request.state.principal中,
+    接口缓存按照角色或者用户区分缓存时使用。
 
     :param token: 待验证的token
-    :return: 返回用户信息
+    :return: 返回用户身份
     """
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=settings.JWT_ALGORITHM)
-        username: str = payload.get("sub")
-        # 通过解析得到的username,获取用户信息,并返回
-        return await user_service.get_user_by_name(username)
     except (jwt.JWTError, jwt.ExpiredSignatureError, ValidationError) as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={
-                "code": 5000,
-                "message": "Token Error",
-                "data": "Token Error",
-            },
-        ) from exc  # always include a from clause to facilitate exception chaining
+        raise _token_error() from exc
+
+    username: str = payload.get("sub")
+    if not username:
+        raise _token_error()
+
+    versions = await principal_cache.versions(username)
+    request.state.auth_version = versions[0]
+    principal = await principal_cache.get(username, versions)
+    if principal is not None:
+        request.state.principal = principal
+        return principal
+
+    identity = await user_service.get_user_identity(username)
+    if identity is None:
+        raise _token_error()
+    principal = Principal(
+        id=identity.id,
+        name=identity.name,
+        role_id=identity.role_id,
+        is_active=identity.is_active,
+    )
+    await principal_cache.set(username, versions, principal)
+    request.state.principal = principal
+    return principal
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    user_service: UserService = Depends(UserService),
+) -> User:
+    """获取当前用户的完整信息, 需要修改用户信息时使用, 只做鉴权时请使用get_current_principal.
+
+    :param principal: 当前用户的身份
+    :return: 返回用户信息
+    """
+    user = await user_service.get(principal.id)
+    if user is None:
+        raise _token_error()
+    return user
+
+
+async def get_permission_index(
+    version: int = Depends(get_auth_version),
+    role_service: RoleService = Depends(RoleService),
+    resource_service: ResourceService = Depends(ResourceService),
+) -> PermissionIndex:
+    """获取与缓存版本一致的权限索引, 版本不一致时重新加载."""
+    return await permission_index.ensure(version, role_service, resource_service)
+
+
+@on_model_change(User, Role, Resource, RoleResourceLink)
+async def invalidate_auth_cache(model: Type[SQLModel], ids: list[Any]) -> None:
+    """用户、角色、资源变更时, 使缓存的用户身份与权限索引失效.
+
+    用户变更时只使这些用户的身份缓存失效, 全局版本号与权限索引不变。
+    """
+    try:
+        if model is User:
+            await principal_cache.invalidate_users(ids)
+            return
+        version = await principal_cache.invalidate()
+    except RedisError:
+        permission_index.reset()
+        raise
+
+    if model is Role:
+        permission_index.changed(version, ids)
+    else:
+        permission_index.reset()
 
 
 class PermissionChecker:
@@ -64,10 +158,12 @@ class PermissionChecker:
         """初始化."""
         self.resource_code = resource_code
 
-    def __call__(self, user: Annotated[User, Depends(get_current_user)]) -> Literal[True]:
+    def __call__(
+        self,
+        principal: Annotated[Principal, Depends(get_current_principal)],
+        index: Annotated[PermissionIndex, Depends(get_permission_index)],
+    ) -> Literal[True]:
         """权限验证."""
-        if user.role:
-            for res in user.role.resources:
-                if self.resource_code == res.permission_code:
-                    return True
+        if index.check(principal.role_id, self.resource_code):
+            return True
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Permission denied!")
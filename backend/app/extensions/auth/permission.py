@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections.abc import Iterable
+from typing import Optional
+
+from ...config import settings
+from ...services.resource import ResourceService
+from ...services.role import RoleService
+
+
+class PermissionIndex:
+    """角色权限索引.
+
+    每个permission_code分配一个比特位, 每个角色拥有的权限保存为一个整数位图,
+    权限检查只需要一次按位与运算。开启继承时, 授予某个资源等同于授予其所有下级资源(按pid)。
+
+    索引带有版本号, 与登录用户缓存共用同一个版本号, 版本号变化时重新加载。
+    本进程内的角色变更只重新加载变更的角色, 其他情况全量重新加载。
+    """
+
+    def __init__(self, inherit: bool = False) -> None:
+        self.inherit = inherit
+        self.version: Optional[int] = None
+        # permission_code -> 比特位
+        self._bits: dict[str, int] = {}
+        # 资源id -> 资源及其下级资源的权限位图
+        self._resource_masks: dict[int, int] = {}
+        # 角色id -> 权限位图
+        self._role_masks: dict[int, int] = {}
+        # 本进程内变更, 等待在pending_version时增量加载的角色
+        self._pending_version: Optional[int] = None
+        self._pending_roles: set[int] = set()
+        self._lock = asyncio.Lock()
+
+    def mask(self, code: str) -> int:
+        """权限code对应的位图, 不存在的code为0."""
+        bit = self._bits.get(code)
+        return 0 if bit is None else 1 << bit
+
+    def role_mask(self, role_id: Optional[int]) -> int:
+        """角色拥有的权限位图."""
+        return self._role_masks.get(role_id, 0)
+
+    def check(self, role_id: Optional[int], code: str) -> bool:
+        """角色是否拥有权限."""
+        return bool(self._role_masks.get(role_id, 0) & self.mask(code))
+
+    def build_resources(self, resources: Iterable[tuple[int, int, Optional[str]]]) -> None:
+        """根据(资源id, 父节点id, 权限code)构建资源位图."""
+        self._bits, self._resource_masks = self._resource_tables(resources)
+
+    def build_roles(self, links: Iterable[tuple[int, int]], role_ids: Iterable[int] = ()) -> None:
+        """根据(角色id, 资源id)构建角色位图, role_ids为需要重建的角色, 为空时重建全部角色."""
+        self._role_masks = self._role_table(links, self._resource_masks, role_ids)
+
+    def _resource_tables(
+        self,
+        resources: Iterable[tuple[int, int, Optional[str]]],
+    ) -> tuple[dict[str, int], dict[int, int]]:
+        """计算(permission_code -> 比特位, 资源id -> 资源位图), 不修改索引."""
+        bits: dict[str, int] = {}
+        masks: dict[int, int] = {}
+        parents: dict[int, int] = {}
+        for id_, pid, code in resources:
+            masks[id_] = 1 << bits.setdefault(code, len(bits)) if code else 0
+            parents[id_] = pid
+
+        if self.inherit:
+            children: dict[int, list[int]] = {}
+            for id_, pid in parents.items():
+                children.setdefault(pid, []).append(id_)
+            # 从根节点开始先序遍历, 逆序合并时下级资源总是先于上级资源处理
+            order: list[int] = []
+            stack = [id_ for id_, pid in parents.items() if pid not in parents]
+            while stack:
+                id_ = stack.pop()
+                order.append(id_)
+                stack.extend(children.get(id_, ()))
+            for id_ in reversed(order):
+                if parents[id_] in masks:
+                    masks[parents[id_]] |= masks[id_]
+        return bits, masks
+
+    def _role_table(
+        self,
+        links: Iterable[tuple[int, int]],
+        resource_masks: dict[int, int],
+        role_ids: Iterable[int] = (),
+    ) -> dict[int, int]:
+        """计算角色id -> 权限位图, role_ids不为空时只重新计算这些角色, 其他角色沿用当前位图."""
+        role_ids = set(role_ids)
+        masks = dict.fromkeys(role_ids, 0)
+        for role_id, resource_id in links:
+            masks[role_id] = masks.get(role_id, 0) | resource_masks.get(resource_id, 0)
+        return {**self._role_masks, **masks} if role_ids else masks
+
+    def changed(self, version: int, role_ids: Iterable[int] = ()) -> None:
+        """本进程内的数据变更, version为变更后的版本号.
+
+        role_ids为权限发生变化的角色, 为空表示变更不影响权限(例如用户信息变更)。
+        只有索引恰好落后一个版本时才能增量更新, 否则说明其他进程也有变更, 需要全量重新加载。
+        """
+        current = self._pending_version if self._pending_version is not None else self.version
+        if current is None or current + 1 != version:
+            self.reset()
+            return
+        role_ids = set(role_ids)
+        if role_ids or self._pending_roles:
+            self._pending_version = version
+            self._pending_roles.update(role_ids)
+        else:
+            self.version = version
+
+    def reset(self) -> None:
+        """下次使用时全量重新加载."""
+        self.version = None
+        self._pending_version = None
+        self._pending_roles.clear()
+
+    async def ensure(
+        self,
+        version: int,
+        role_service: RoleService,
+        resource_service: ResourceService,
+    ) -> "PermissionIndex":
+        """确保索引为指定的版本.
+
+        先查询数据并在局部变量中构建新的位图, 再与版本号一起替换(替换过程中没有await),
+        重新加载期间的并发请求仍然使用一致的旧索引; 加锁避免并发请求重复加载。
+        """
+        if self.version == version and self._pending_version is None:
+            return self
+        async with self._lock:
+            if self.version == version and self._pending_version is None:
+                return self
+            bits, resource_masks = self._bits, self._resource_masks
+            if self._pending_version == version:
+                role_ids = set(self._pending_roles)
+                links = await role_service.get_resource_links(role_ids)
+                role_masks = self._role_table(links, resource_masks, role_ids)
+            else:
+                resources = await resource_service.get_permission_tree()
+                links = await role_service.get_resource_links()
+                bits, resource_masks = self._resource_tables(resources)
+                role_masks = self._role_table(links, resource_masks)
+
+            self._bits, self._resource_masks, self._role_masks = bits, resource_masks, role_masks
+            self.version = version
+            # 加载期间又有新的变更时保留等待增量加载的角色
+            if self._pending_version is None or self._pending_version <= version:
+                self._pending_version = None
+                self._pending_roles.clear()
+        return self
+
+
+permission_index = PermissionIndex(inherit=settings.AUTH_PERMISSION_INHERIT)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Iterable, Optional
+
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+
+from ...config import settings
+from ...models.redis import get_redis_client
+from ..serializer import get_serializer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """已登录用户的身份, 鉴权时使用, 不包含用户的其他信息. 权限通过角色在PermissionIndex中检查."""
+
+    id: int
+    name: str
+    role_id: Optional[int] = None
+    is_active: int = 0
+
+    def to_dict(self) -> dict:
+        """转换为可序列化的字典."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "role_id": self.role_id,
+            "is_active": self.is_active,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Principal":
+        """从字典创建."""
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            role_id=data.get("role_id"),
+            is_active=data.get("is_active", 0),
+        )
+
+
+# 缓存的版本号: (全局版本号, 用户的版本号)
+Versions = tuple[int, int]
+
+# 没有缓存过的用户变更之后, 在这段时间(秒)内不写入该用户的缓存.
+# 读取版本号与写入缓存之间(从数据库加载用户时)用户发生变更, 写入的是变更之前的数据
+CHANGED_USER_TTL = 60
+
+# 写入principal并登记用户ID与sub的对应关系, 用户刚刚变更过时不写入
+# KEYS[1] principal的key, KEYS[2] 用户ID -> sub的hash, KEYS[3] 用户变更标记,
+# KEYS[4] 用户版本号的hash
+# ARGV[1] principal, ARGV[2] 过期秒数, ARGV[3] 用户ID, ARGV[4] sub
+# 两个hash的过期时间随每次写入延长, 不短于其中任何一个principal的过期时间
+SET_PRINCIPAL_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[4], ARGV[2])
+return 1
+"""
+
+# 增加缓存过的用户的版本号并删除其ID与sub的对应关系, 没有缓存过的用户写入变更标记
+# KEYS[1] 用户ID -> sub的hash, KEYS[2] 用户版本号的hash, KEYS[3..n+2] 用户变更标记
+# ARGV[1] principal的过期秒数, ARGV[2] 变更标记的过期秒数, ARGV[3..n+2] 用户ID
+# 返回缓存过的用户的sub
+INVALIDATE_USERS_SCRIPT = """
+local subs = {}
+for i = 3, #ARGV do
+    local sub = redis.call('HGET', KEYS[1], ARGV[i])
+    if sub then
+        redis.call('HINCRBY', KEYS[2], sub, 1)
+        redis.call('EXPIRE', KEYS[2], ARGV[1])
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        table.insert(subs, sub)
+    else
+        redis.call('SET', KEYS[i], 1, 'EX', ARGV[2])
+    end
+end
+return subs
+"""
+
+_set_principal = AsyncScript(None, SET_PRINCIPAL_SCRIPT.encode())
+_invalidate_users = AsyncScript(None, INVALIDATE_USERS_SCRIPT.encode())
+
+
+class PrincipalCache:
+    """两级缓存已登录用户的Principal, 按照JWT中的sub(用户名)索引.
+
+    第一级为进程内的LRU缓存, 第二级为Redis, 多个进程共享。所有缓存都带有全局版本号与用户的版本号,
+    角色、资源变更时增加全局版本号, 所有缓存随之失效; 用户变更时只增加该用户的版本号,
+    没有缓存过的用户没有需要失效的缓存, 只在短时间内禁止写入, 避免写入正在加载的旧数据。
+    没有Redis时只使用进程内缓存。权限索引(PermissionIndex)也使用全局版本号判断是否需要重新加载。
+    """
+
+    def __init__(self, maxsize: int, ttl: int, prefix: str) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prefix = prefix
+        self._version = 0
+        # 没有Redis时使用的用户版本号, sub -> 版本号
+        self._subject_versions: dict[str, int] = {}
+        # 没有Redis时没有缓存过的用户的变更标记, 用户ID -> 过期时间
+        self._changed: dict[int, float] = {}
+        # sub -> (版本号, 过期时间, principal)
+        self._local: OrderedDict[str, tuple[Versions, float, Principal]] = OrderedDict()
+
+    @property
+    def version_key(self) -> str:
+        """Redis中全局版本号的key."""
+        return f"{self.prefix}:version"
+
+    @property
+    def subject_versions_key(self) -> str:
+        """Redis中保存用户版本号的hash, sub -> 版本号."""
+        return f"{self.prefix}:versions"
+
+    @property
+    def subjects_key(self) -> str:
+        """Redis中保存用户sub的hash, 用户ID -> sub, 用户变更时按照ID查找sub."""
+        return f"{self.prefix}:subjects"
+
+    def changed_key(self, id_: int | str) -> str:
+        """Redis中没有缓存过的用户的变更标记."""
+        return f"{self.prefix}:changed:{id_}"
+
+    def build_key(self, sub: str, versions: Versions) -> str:
+        """Redis中principal的key."""
+        return f"{self.prefix}:{versions[0]}:{versions[1]}:{sub}"
+
+    async def version(self) -> int:
+        """当前版本号, Redis不可用时使用进程内的版本号."""
+        client = get_redis_client()
+        if client is None:
+            return self._version
+        try:
+            return int(await client.get(self.version_key) or 0)
+        except RedisError:
+            logger.warning("Failed to read principal cache version", exc_info=True)
+            return self._version
+
+    async def versions(self, sub: str) -> Versions:
+        """当前的全局版本号与用户的版本号, 一次访问Redis同时读取."""
+        local = (self._version, self._subject_versions.get(sub, 0))
+        client = get_redis_client()
+        if client is None:
+            return local
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                version, subject_version = await (
+                    pipe.get(self.version_key).hget(self.subject_versions_key, sub).execute()
+                )
+        except RedisError:
+            logger.warning("Failed to read principal cache version", exc_info=True)
+            return local
+        return int(version or 0), int(subject_version or 0)
+
+    async def get(self, sub: str, versions: Versions) -> Optional[Principal]:
+        """读取缓存, 不存在或者版本不符时返回None."""
+        entry = self._local.get(sub)
+        if entry is not None:
+            entry_versions, expires, principal = entry
+            if entry_versions == versions and expires > monotonic():
+                self._local.move_to_end(sub)
+                return principal
+            del self._local[sub]
+
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            value = await client.get(self.build_key(sub, versions))
+        except RedisError:
+            logger.warning("Failed to read principal cache for %s", sub, exc_info=True)
+            return None
+        if value is None:
+            return None
+
+        principal = Principal.from_dict(get_serializer().loads(value))
+        self._set_local(sub, versions, principal)
+        return principal
+
+    async def set(self, sub: str, versions: Versions, principal: Principal) -> None:
+        """写入缓存, versions为读取缓存之前获取的版本号, 避免把过期的数据写入新版本."""
+        client = get_redis_client()
+        if client is None:
+            self._set_local(sub, versions, principal)
+            return
+        try:
+            written = await _set_principal(
+                keys=[
+                    self.build_key(sub, versions),
+                    self.subjects_key,
+                    self.changed_key(principal.id),
+                    self.subject_versions_key,
+                ],
+                args=[get_serializer().dumps(principal.to_dict()), self.ttl, principal.id, sub],
+                client=client,
+            )
+        except RedisError:
+            logger.warning("Failed to write principal cache for %s", sub, exc_info=True)
+            written = True
+        if written:
+            self._set_local(sub, versions, principal)
+
+    async def invalidate(self) -> int:
+        """增加版本号, 使所有缓存失效, 返回新的版本号."""
+        self._version += 1
+        self._local.clear()
+        client = get_redis_client()
+        if client is None:
+            return self._version
+        return await client.incr(self.version_key)
+
+    async def invalidate_users(self, ids: Iterable[int]) -> None:
+        """用户变更时增加这些用户的版本号, 只使这些用户的缓存失效, 全局版本号不变.
+
+        没有缓存过的用户(例如新注册的用户)没有需要失效的缓存, 只写入变更标记,
+        CHANGED_USER_TTL秒内不写入该用户的缓存, 避免变更之前开始加载的旧数据写入缓存。
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        client = get_redis_client()
+        if client is None:
+            cached = {principal.id: sub for sub, (_, _, principal) in self._local.items()}
+            subs = [cached[id_] for id_ in ids if id_ in cached]
+            now = monotonic()
+            self._changed = {id_: until for id_, until in self._changed.items() if until > now}
+            for id_ in ids:
+                if id_ not in cached:
+                    self._changed[id_] = now + CHANGED_USER_TTL
+        else:
+            subs = await _invalidate_users(
+                keys=[
+                    self.subjects_key,
+                    self.subject_versions_key,
+                    *(self.changed_key(id_) for id_ in ids),
+                ],
+                args=[self.ttl, CHANGED_USER_TTL, *ids],
+                client=client,
+            )
+            subs = [sub.decode() if isinstance(sub, bytes) else sub for sub in subs]
+
+        for sub in subs:
+            self._local.pop(sub, None)
+            self._subject_versions[sub] = self._subject_versions.get(sub, 0) + 1
+
+    def clear(self) -> None:
+        """清空进程内缓存."""
+        self._local.clear()
+
+    def _set_local(self, sub: str, versions: Versions, principal: Principal) -> None:
+        if self._changed.get(principal.id, 0) > monotonic():
+            return
+        self._local[sub] = (versions, monotonic() + self.ttl, principal)
+        self._local.move_to_end(sub)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+principal_cache = PrincipalCache(
+    settings.AUTH_PRINCIPAL_CACHE_SIZE,
+    settings.AUTH_PRINCIPAL_CACHE_TTL,
+    settings.AUTH_PRINCIPAL_CACHE_PREFIX,
+)
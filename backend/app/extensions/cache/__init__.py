@@ -7,6 +7,14 @@ from fastapi_cache import FastAPICache
 from starlette.requests import Request
 from starlette.responses import Response
 
+from .codec import BinaryCoder, CacheCodec, CacheDecodeError
+from .decorator import cached
+from .keys import AuthScope, request_key_builder, vary_key_builder
+from .local import LocalCache, TwoLevelBackend
+from .response import CachedResponse, RenderedResponse, render_response
+from .stats import CacheStats, cache_stats
+from .tags import TaggedRedisBackend, invalidate_tags, model_tags, tagged
+
 
 def noself_key_builder(
     func: Callable,
@@ -31,25 +39,24 @@ def noself_key_builder(
     )
 
 
-def request_key_builder(
-    func: Callable,
-    namespace: Optional[str] = "",
-    request: Optional[Request] = None,
-    response: Optional[Response] = None,
-    args: Optional[tuple] = None,
-    kwargs: Optional[dict] = None,
-) -> str:
-    """API route上使用的key builder.
-
-    本key builder在计算key的时候使用Url参数与header参数, 没有采用body. 缓存建议使用在GET请求中,
-    有body的请求一般都是POST类请求, 不建议加缓存
-    """
-    prefix = f"{FastAPICache.get_prefix()}:{namespace}:"
-    query_params = repr(sorted(request.query_params.items()))
-    header_params = repr(sorted(request.headers.items()))
-    return (
-        prefix
-        + hashlib.sha256(
-            f"{request.method.lower()}:{request.url.path}:{query_params}:{header_params}".encode(),
-        ).hexdigest()
-    )
+__all__ = [
+    "AuthScope",
+    "BinaryCoder",
+    "CacheCodec",
+    "CacheDecodeError",
+    "CacheStats",
+    "CachedResponse",
+    "LocalCache",
+    "RenderedResponse",
+    "TaggedRedisBackend",
+    "TwoLevelBackend",
+    "cache_stats",
+    "cached",
+    "invalidate_tags",
+    "model_tags",
+    "noself_key_builder",
+    "render_response",
+    "request_key_builder",
+    "tagged",
+    "vary_key_builder",
+]
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+from collections.abc import Callable
+from functools import cache
+from typing import Any, ClassVar, Literal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from ...config import settings
+from ..serializer import get_serializer
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+CodecFormat = Literal["auto", "json", "msgpack"]
+CodecCompression = Literal["auto", "none", "zlib", "zstd", "lz4"]
+
+
+class CacheDecodeError(ValueError):
+    """缓存内容无法解码, 例如由更新版本的程序写入."""
+
+
+def _enc_hook(obj: Any) -> Any:  # noqa: ANN401
+    """msgpack不支持的类型, pydantic模型与接口的JSON输出保持一致."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return jsonable_encoder(obj)
+
+
+def _compressors() -> dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    """已安装的压缩算法, 名称 -> (压缩, 解压)."""
+    result = {
+        "none": (bytes, bytes),
+        "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    }
+    if zstandard is not None:
+        result["zstd"] = (
+            zstandard.ZstdCompressor(level=3).compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    if lz4_frame is not None:
+        result["lz4"] = (lz4_frame.compress, lz4_frame.decompress)
+    return result
+
+
+class CacheCodec:
+    """缓存内容的二进制编码.
+
+    第一个字节为头部: 高4位为编码版本, 其余各2位为序列化格式与压缩算法的序号,
+    解码时按照头部选择格式与算法, 与当前配置无关。以后修改编码方式时增加版本号,
+    旧版本程序遇到无法识别的版本时抛出CacheDecodeError, 按照缓存未命中处理。
+    内容不小于min_size字节时才压缩, 压缩后没有变小时保存原文。
+    """
+
+    version: ClassVar[int] = 1
+    # 序号写入头部, 只能在末尾追加
+    formats: ClassVar[tuple[str, ...]] = ("json", "msgpack")
+    compressions: ClassVar[tuple[str, ...]] = ("none", "zlib", "zstd", "lz4")
+
+    def __init__(
+        self,
+        format: CodecFormat = "auto",  # noqa: A002
+        compression: CodecCompression = "auto",
+        min_size: int = 1024,
+    ) -> None:
+        self._compressors = _compressors()
+        if format == "auto":
+            format = "msgpack" if msgspec is not None else "json"  # noqa: A001
+        if compression == "auto":
+            compression = next(c for c in ("zstd", "lz4", "zlib") if c in self._compressors)
+        if format == "msgpack" and msgspec is None:
+            msg = "msgspec is required for the msgpack cache format"
+            raise RuntimeError(msg)
+        if compression not in self._compressors:
+            msg = f"Compression {compression!r} is not installed"
+            raise RuntimeError(msg)
+
+        self.format = format
+        self.compression = compression
+        self.min_size = min_size
+        self._header = self.version << 4 | self.formats.index(format) << 2
+        if msgspec is not None:
+            self._msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=_enc_hook)
+            self._msgpack_decoder = msgspec.msgpack.Decoder()
+
+    def encode(self, value: Any) -> bytes:  # noqa: ANN401
+        """编码."""
+        if self.format == "msgpack":
+            data = self._msgpack_encoder.encode(value)
+        else:
+            data = get_serializer().dumps(value, default=jsonable_encoder)
+
+        header = self._header
+        if self.compression != "none" and len(data) >= self.min_size:
+            compressed = self._compressors[self.compression][0](data)
+            if len(compressed) < len(data):
+                data = compressed
+                header |= self.compressions.index(self.compression)
+        return bytes((header,)) + data
+
+    def decode(self, data: bytes | str) -> Any:  # noqa: ANN401
+        """解码."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data or data[0] >> 4 != self.version:
+            msg = "Unknown cache codec version"
+            raise CacheDecodeError(msg)
+        format = self.formats[data[0] >> 2 & 0b11]  # noqa: A001
+        compression = self.compressions[data[0] & 0b11]
+        if compression not in self._compressors:
+            msg = f"Compression {compression!r} is not installed"
+            raise CacheDecodeError(msg)
+
+        payload = self._compressors[compression][1](data[1:])
+        if format == "msgpack":
+            if msgspec is None:
+                msg = "msgspec is not installed"
+                raise CacheDecodeError(msg)
+            return self._msgpack_decoder.decode(payload)
+        return get_serializer().loads(payload)
+
+
+@cache
+def get_codec() -> CacheCodec:
+    """按照配置项创建的缓存编码."""
+    return CacheCodec(
+        settings.CACHE_CODEC_FORMAT,
+        settings.CACHE_CODEC_COMPRESSION,
+        settings.CACHE_CODEC_MIN_SIZE,
+    )
+
+
+class BinaryCoder(Coder):
+    """使用CacheCodec的缓存编码器, 缓存内容为二进制, Redis客户端不能自动解码为字符串."""
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:  # noqa: ANN401
+        """编码缓存内容."""
+        if isinstance(value, JSONResponse):
+            value = get_serializer().loads(value.body)
+        return get_codec().encode(value)
+
+    @classmethod
+    def decode(cls, value: bytes | str) -> Any:  # noqa: ANN401
+        """解码缓存内容."""
+        return get_codec().decode(value)
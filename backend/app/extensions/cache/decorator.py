@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+import logging
+import math
+import random
+import time
+import uuid
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ...config import settings
+from .response import RenderedResponse, render_response
+from .stats import cache_stats
+from .tags import TaggedRedisBackend
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 只删除自己持有的锁
+# KEYS[1] 锁的key, ARGV[1] 加锁时写入的token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_lock = AsyncScript(None, RELEASE_LOCK_SCRIPT.encode())
+
+# 本进程内正在计算的缓存, key -> 计算结果
+_inflight: dict[str, asyncio.Future] = {}
+
+
+class CacheEntry:
+    """缓存内容以及逻辑过期时间.
+
+    Redis中保存为 b"逻辑过期时间|计算耗时|预先渲染的响应",
+    Redis的过期时间为逻辑过期时间加上允许使用旧数据的时间。
+    result为解码后的RenderedResponse, 读取缓存时解码, 或者为刚刚渲染的结果。
+    """
+
+    __slots__ = ("delta", "expires", "result", "value")
+
+    def __init__(self, value: bytes | str, expires: float, delta: float) -> None:
+        self.value = value.encode("utf-8") if isinstance(value, str) else value
+        self.expires = expires
+        self.delta = delta
+        self.result: Any = None
+
+    def dumps(self) -> bytes:
+        """编码为缓存内容."""
+        return b"%.3f|%.4f|" % (self.expires, self.delta) + self.value
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Optional["CacheEntry"]:
+        """从缓存内容解码, 格式不符时返回None."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        expires, _, rest = data.partition(b"|")
+        delta, _, value = rest.partition(b"|")
+        try:
+            return cls(value, float(expires), float(delta))
+        except ValueError:
+            return None
+
+    def should_refresh(self, beta: float, now: float) -> bool:
+        """是否需要重新计算: 已经过期, 或者按照XFetch算法提前刷新.
+
+        计算耗时越长、越接近过期时间, 提前刷新的概率越高, 避免大量请求在过期的瞬间同时重新计算。
+        """
+        if now >= self.expires:
+            return True
+        if beta <= 0:
+            return False
+        return now - self.delta * beta * math.log(1 - random.random()) >= self.expires  # noqa: S311
+
+
+def _redis(backend: Backend) -> Any:  # noqa: ANN401
+    return backend.redis if isinstance(backend, RedisBackend) else None
+
+
+async def acquire_lock(backend: Backend, key: str, timeout: float) -> Optional[str]:
+    """获取跨进程的重新计算锁, 成功时返回token, 没有Redis时总是成功."""
+    client = _redis(backend)
+    token = uuid.uuid4().hex
+    if client is None:
+        return token
+    try:
+        acquired = await client.set(f"{key}:lock", token, nx=True, px=int(timeout * 1000))
+    except RedisError:
+        logger.warning("Failed to acquire cache lock for %s", key, exc_info=True)
+        return token
+    return token if acquired else None
+
+
+async def release_lock(backend: Backend, key: str, token: str) -> None:
+    """释放重新计算锁."""
+    client = _redis(backend)
+    if client is None:
+        return
+    try:
+        await _release_lock(keys=[f"{key}:lock"], args=[token], client=client)
+    except RedisError:
+        logger.warning("Failed to release cache lock for %s", key, exc_info=True)
+
+
+def cached(
+    expire: Optional[int] = None,
+    key_builder: Optional[Callable[..., Any]] = None,
+    namespace: str = "",
+    stale: int = 0,
+    beta: float = 0,
+    lock_timeout: Optional[float] = None,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """合并并发请求的接口缓存, 与fastapi_cache.decorator.cache用法相同.
+
+    缓存的是最终输出的响应(包括统一返回结构、预先压缩的响应体与ETag),
+    命中时直接输出, 不再经过pydantic校验、序列化与元数据中间件。
+    缓存未命中时, 本进程内相同key的并发请求只计算一次, 其他请求等待计算结果;
+    多个进程之间使用Redis锁, 只有获得锁的进程重新计算, 其他进程等待缓存写入。
+
+    使用方法:
+        @cached(expire=3600, key_builder=vary_key_builder(scope="public"), stale=60, beta=1)
+
+    :param expire: 缓存秒数, 默认使用FastAPICache的配置
+    :param key_builder: 缓存key builder, 默认使用FastAPICache的配置
+    :param namespace: 缓存namespace
+    :param stale: 过期后仍然可以使用旧数据的秒数, 期间由一个请求重新计算, 其他请求直接返回旧数据
+    :param beta: XFetch提前刷新系数, 0表示不提前刷新, 越大越早刷新
+    :param lock_timeout: 跨进程锁的秒数, 等待其他进程计算的最长时间
+    """
+    lock_timeout = lock_timeout or settings.CACHE_LOCK_TIMEOUT
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        # 与fastapi_cache相同, 没有声明request/response参数时追加, 调用func前移除
+        signature = inspect.signature(func)
+        names = {
+            param.annotation: name
+            for name, param in signature.parameters.items()
+            if param.annotation in (Request, Response)
+        }
+        parameters = list(signature.parameters.values())
+        for annotation, name in ((Request, "request"), (Response, "response")):
+            if annotation not in names:
+                names[annotation] = f"__cache_{name}"
+                parameters.append(
+                    inspect.Parameter(
+                        names[annotation],
+                        inspect.Parameter.KEYWORD_ONLY,
+                        annotation=annotation,
+                    ),
+                )
+        injected = [name for name in names.values() if name.startswith("__cache_")]
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:  # noqa: ANN401
+            request: Request = kwargs.get(names[Request])
+            response: Response = kwargs.get(names[Response])
+            for name in injected:
+                kwargs.pop(name, None)
+
+            if (
+                not FastAPICache.get_enable()
+                or request.method != "GET"
+                or request.headers.get("Cache-Control") in ("no-store", "no-cache")
+            ):
+                return await func(*args, **kwargs)
+
+            backend = FastAPICache.get_backend()
+            ttl = expire or FastAPICache.get_expire() or settings.CACHE_EXPIRE
+            builder = key_builder or FastAPICache.get_key_builder()
+            # 不是vary_key_builder生成的key builder无法得知权限范围, 按照每个用户单独缓存处理
+            private = getattr(builder, "auth_scope", "user") != "public"
+            key = builder(
+                func,
+                namespace,
+                request=request,
+                response=response,
+                args=args,
+                kwargs={k: v for k, v in kwargs.items() if k not in names.values()},
+            )
+            if inspect.isawaitable(key):
+                key = await key
+
+            async def compute() -> CacheEntry:
+                start = time.monotonic()
+                await _read_generations(backend, key)
+                result = await func(*args, **kwargs)
+                rendered = await render_response(request, result, response)
+                entry = CacheEntry(rendered.dumps(), time.time() + ttl, time.monotonic() - start)
+                entry.result = rendered
+                try:
+                    await backend.set(key, entry.dumps(), ttl + stale)
+                except Exception:
+                    logger.warning("Failed to set cache %s", key, exc_info=True)
+                return entry
+
+            entry = await _read(backend, key)
+            if entry is not None and not entry.should_refresh(beta, time.time()):
+                return _respond(entry, request, response, private)
+
+            if entry is not None and time.time() < entry.expires + stale:
+                # 旧数据仍然可用, 只有获得锁的请求重新计算
+                if key in _inflight:
+                    return _respond(entry, request, response, private)
+                token = await acquire_lock(backend, key, lock_timeout)
+                if token is None:
+                    return _respond(entry, request, response, private)
+                entry = await _single_flight(key, compute, backend, token)
+                return _respond(entry, request, response, private)
+
+            entry = await _coalesce(key, compute, backend, lock_timeout)
+            return _respond(entry, request, response, private)
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+
+    return decorator
+
+
+async def _read_generations(backend: Backend, key: str) -> None:
+    """计算之前记录标签的版本号, 计算期间标签失效时不写入旧数据."""
+    if not isinstance(backend, TaggedRedisBackend):
+        return
+    try:
+        await backend.read_generations()
+    except Exception:
+        logger.warning("Failed to read cache tags for %s", key, exc_info=True)
+
+
+async def _read(backend: Backend, key: str) -> Optional[CacheEntry]:
+    """读取并解码缓存, 无法解码的缓存(例如由其他版本的程序写入)按照未命中处理."""
+    try:
+        _, data = await backend.get_with_ttl(key)
+    except Exception:
+        logger.warning("Failed to get cache %s", key, exc_info=True)
+        return None
+    entry = None if data is None else CacheEntry.loads(data)
+    if entry is None:
+        return None
+    try:
+        entry.result = RenderedResponse.loads(entry.value)
+    except Exception:
+        logger.warning("Failed to decode cache %s", key, exc_info=True)
+        return None
+    return entry
+
+
+def _respond(
+    entry: CacheEntry,
+    request: Request,
+    response: Optional[Response],
+    private: bool,
+) -> Response:
+    result = entry.result.to_response(
+        request.headers.get("accept-encoding", ""),
+        request.headers.get("if-none-match"),
+        private,
+    )
+    # 返回Response时FastAPI不再合并依赖项(例如限流)设置的响应头
+    if response is not None:
+        result.headers.raw.extend(
+            header for header in response.headers.raw if header[0] != b"content-length"
+        )
+    return result
+
+
+async def _join(
+    key: str,
+    future: asyncio.Future,
+    compute: Callable[[], Awaitable[CacheEntry]],
+    backend: Backend,
+) -> CacheEntry:
+    """等待本进程内正在进行的计算, 计算被取消时自己重新计算."""
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not future.cancelled():
+            raise
+    return await _single_flight(key, compute, backend)
+
+
+async def _single_flight(
+    key: str,
+    compute: Callable[[], Awaitable[CacheEntry]],
+    backend: Backend,
+    token: Optional[str] = None,
+) -> CacheEntry:
+    """本进程内相同key只计算一次, token为已经获得的跨进程锁, 计算结束后释放."""
+    future = _inflight.get(key)
+    if future is not None:
+        return await _join(key, future, compute, backend)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        entry = await compute()
+        future.set_result(entry)
+        return entry
+    except asyncio.CancelledError:
+        # 请求被取消(例如客户端断开), 等待的请求重新计算
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # 没有其他请求等待时避免 "Future exception was never retrieved"
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
+        if token is not None:
+            await release_lock(backend, key, token)
+
+
+async def _coalesce(
+    key: str,
+    compute: Callable[[], Awaitable[CacheEntry]],
+    backend: Backend,
+    lock_timeout: float,
+) -> CacheEntry:
+    """缓存未命中时合并计算: 进程内等待同一个计算, 进程间等待获得锁的进程写入缓存."""
+    if key in _inflight:
+        return await _join(key, _inflight[key], compute, backend)
+
+    token = await acquire_lock(backend, key, lock_timeout)
+    deadline = time.monotonic() + lock_timeout
+    while token is None and time.monotonic() < deadline:
+        await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+        # 请求已经在第一次读取时记为未命中, 轮询不再计入统计
+        with cache_stats.paused():
+            entry = await _read(backend, key)
+        if entry is not None:
+            return entry
+        if key in _inflight:
+            return await _join(key, _inflight[key], compute, backend)
+        token = await acquire_lock(backend, key, lock_timeout)
+    # 等待超时时(持有锁的进程出错或者太慢)自己计算
+    return await _single_flight(key, compute, backend, token)
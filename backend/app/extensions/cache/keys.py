@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections.abc import Sequence
+from typing import Any, Callable, Literal, Optional
+
+from fastapi_cache import FastAPICache
+from jose import jwt
+from starlette.requests import Request
+
+from ...config import settings
+
+# 缓存的权限范围: public 所有用户共享, role 同一角色共享, user 每个用户单独缓存
+AuthScope = Literal["public", "role", "user"]
+
+
+def auth_identity(request: Request, scope: AuthScope) -> str:
+    """请求在指定权限范围内的标识.
+
+    优先使用get_current_principal保存在request.state中的身份, 路由没有依赖登录用户时,
+    user范围从JWT中获取用户名, role范围无法得知角色, 按照匿名用户处理。
+    """
+    if scope == "public":
+        return ""
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return f"r{principal.role_id}" if scope == "role" else f"u{principal.id}"
+    if scope == "user":
+        authorization = request.headers.get("Authorization", "")
+        if authorization.lower().startswith("bearer "):
+            try:
+                payload = jwt.decode(
+                    authorization[7:],
+                    settings.JWT_SECRET_KEY,
+                    algorithms=settings.JWT_ALGORITHM,
+                )
+                return f"s{payload.get('sub')}"
+            except jwt.JWTError:
+                pass
+    return "-"
+
+
+def vary_key_builder(
+    query: Optional[Sequence[str]] = None,
+    headers: Sequence[str] = (),
+    scope: AuthScope = "user",
+) -> Callable[..., str]:
+    """按照声明的策略生成API route上使用的key builder.
+
+    缓存key只由请求方法、路径、指定的查询参数与header以及权限范围决定, 其他header(User-Agent、
+    Cookie、链路追踪等)不参与计算, 不同客户端的相同请求可以共享缓存。key builder在声明时预先编译,
+    请求时只读取需要的字段。未指定namespace时使用路由函数名, 便于按照namespace统计命中率。
+
+    使用方法:
+        @cache(key_builder=vary_key_builder(query=("page", "size"), scope="public"))
+
+    :param query: 参与计算的查询参数, None表示全部查询参数
+    :param headers: 参与计算的header
+    :param scope: 权限范围
+    """
+    query_names = None if query is None else tuple(sorted(set(query)))
+    header_names = tuple(sorted({name.lower() for name in headers}))
+
+    def builder(
+        func: Callable,
+        namespace: Optional[str] = "",
+        request: Optional[Request] = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> str:
+        if query_names is None:
+            query_params = sorted(request.query_params.multi_items())
+        else:
+            query_params = [(name, request.query_params.getlist(name)) for name in query_names]
+        parts = [
+            request.method,
+            request.url.path,
+            repr(query_params),
+            repr([request.headers.get(name) for name in header_names]),
+            auth_identity(request, scope),
+        ]
+        digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=16).hexdigest()
+        return f"{FastAPICache.get_prefix()}:{namespace or func.__name__}:{digest}"
+
+    # 输出响应时根据权限范围决定是否允许共享缓存保存
+    builder.auth_scope = scope
+    return builder
+
+
+# 默认每个用户单独缓存, 所有查询参数参与计算
+request_key_builder = vary_key_builder()
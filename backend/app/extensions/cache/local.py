@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextlib
+import logging
+import sys
+from collections import OrderedDict
+from contextvars import ContextVar
+from math import ceil
+from time import monotonic
+from typing import Optional
+
+from fastapi_cache import FastAPICache
+from redis.asyncio.client import AbstractRedis
+from redis.exceptions import RedisError
+
+from ..serializer import get_serializer
+from .stats import cache_stats
+from .tags import TaggedRedisBackend
+
+logger = logging.getLogger(__name__)
+
+# 当前请求读取缓存未命中时进程内缓存的版本,
+# 写入缓存时版本已经变化说明期间有缓存失效, 计算结果可能是旧数据, 不写入进程内缓存
+_miss_generation: ContextVar[Optional[int]] = ContextVar("cache_miss_generation", default=None)
+
+
+class LocalCache:
+    """进程内LRU缓存, 按照缓存内容占用的字节数限制大小, 每个缓存单独设置过期时间."""
+
+    def __init__(self, max_bytes: int, max_ttl: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.size = 0
+        # 每次删除缓存时加1, 用于判断读取Redis期间是否有缓存失效
+        self.generation = 0
+        # key -> (过期时间, 缓存内容, 占用字节数)
+        self._data: OrderedDict[str, tuple[float, bytes, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[tuple[int, bytes]]:
+        """读取缓存, 返回 (剩余秒数, 缓存内容), 不存在或者已经过期时返回None."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        remain = entry[0] - monotonic()
+        if remain <= 0:
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return ceil(remain), entry[1]
+
+    def set(self, key: str, value: bytes, ttl: Optional[int]) -> None:
+        """写入缓存, 过期时间不超过max_ttl, 超过容量时淘汰最久未使用的缓存."""
+        ttl = min(ttl, self.max_ttl) if ttl and ttl > 0 else self.max_ttl
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        self._remove(key)
+        self._data[key] = (monotonic() + ttl, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.size -= evicted
+
+    def delete(self, *keys: str) -> None:
+        """删除缓存."""
+        self.generation += 1
+        for key in keys:
+            self._remove(key)
+
+    def clear(self, prefix: str = "") -> None:
+        """清空缓存, 指定prefix时只删除该前缀的缓存."""
+        if not prefix:
+            self.generation += 1
+            self._data.clear()
+            self.size = 0
+            return
+        self.delete(*[key for key in self._data if key.startswith(prefix)])
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+class TwoLevelBackend(TaggedRedisBackend):
+    """两级缓存后端: 进程内LocalCache + Redis.
+
+    读取时先查进程内缓存, 未命中再读取Redis并写入进程内缓存,
+    进程内缓存的过期时间不超过Redis中的剩余时间。
+    缓存失效时通过Redis发布订阅通知所有进程删除进程内缓存, 订阅断开期间可能错过通知,
+    重新订阅时清空进程内缓存。
+    """
+
+    def __init__(self, redis: AbstractRedis, local: LocalCache) -> None:
+        super().__init__(redis)
+        self.local = local
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def channel(self) -> str:
+        """发布缓存失效通知的频道."""
+        return f"{FastAPICache.get_prefix()}:invalidate"
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[bytes]]:
+        """读取缓存以及剩余秒数."""
+        entry = self.local.get(key)
+        if entry is not None:
+            cache_stats.record(key, hit=True, local=True)
+            return entry
+        generation = self.local.generation
+        ttl, value = await super().get_with_ttl(key)
+        if value is None:
+            _miss_generation.set(generation)
+        elif self.local.generation == generation:
+            self.local.set(key, value, ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """读取缓存."""
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry[1]
+        return await super().get(key)
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> bool:
+        """写入Redis与进程内缓存, 返回是否写入."""
+        written = await super().set(key, value, expire)
+        generation = _miss_generation.get()
+        _miss_generation.set(None)
+        if written and (generation is None or generation == self.local.generation):
+            self.local.set(key, value, expire)
+        return written
+
+    async def invalidate(self, *tags: str) -> list[str]:
+        """使标签下的所有缓存失效, 并通知其他进程."""
+        keys = await super().invalidate(*tags)
+        if keys:
+            self.local.delete(*keys)
+            await self.publish({"keys": keys})
+        return keys
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        """删除namespace下的所有缓存或者指定的缓存, 并通知其他进程."""
+        result = await super().clear(namespace, key)
+        if namespace:
+            self.local.clear(f"{namespace}:")
+            await self.publish({"prefix": f"{namespace}:"})
+        elif key:
+            self.local.delete(key)
+            await self.publish({"keys": [key]})
+        return result
+
+    async def publish(self, message: dict) -> None:
+        """发布缓存失效通知."""
+        await self.redis.publish(self.channel, get_serializer().dumps(message))
+
+    def handle(self, data: str | bytes) -> None:
+        """处理缓存失效通知."""
+        message = get_serializer().loads(data)
+        if "prefix" in message:
+            self.local.clear(message["prefix"])
+        self.local.delete(*message.get("keys", ()))
+
+    async def listen(self, retry_interval: float = 1) -> None:
+        """订阅缓存失效通知, 连接断开时重新订阅."""
+        while True:
+            try:
+                async with self.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # 订阅之前的通知无法收到, 清空进程内缓存
+                    self.local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.handle(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError):
+                logger.warning("Cache invalidation subscriber disconnected", exc_info=True)
+            except Exception:
+                logger.exception("Failed to handle cache invalidation message")
+            self.local.clear()
+            await asyncio.sleep(retry_interval)
+
+    def start(self) -> None:
+        """启动订阅任务."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        """停止订阅任务."""
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import struct
+from typing import Any, Optional
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute, serialize_response
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from ...config import settings
+from ..fastapi.api import ENVELOPE_SCOPE_KEY, envelope, mark_enveloped
+from ..fastapi.compression import COMPRESSORS, compress, negotiate
+from ..fastapi.conditional import coded_etag, etag_matches
+from .codec import get_codec
+
+# 不随缓存保存的响应头, 输出时重新计算
+_SKIP_HEADERS = frozenset((b"content-length", b"content-encoding", b"etag", b"vary"))
+
+
+class CachedResponse(Response):
+    """直接输出预先渲染的响应体, 不再经过pydantic校验、序列化与元数据中间件."""
+
+    def __init__(self, *args: Any, enveloped: bool = False, **kwargs: Any) -> None:  # noqa: ANN401
+        super().__init__(*args, **kwargs)
+        self.enveloped = enveloped
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """输出响应, 已经包装统一返回结构时告知元数据中间件."""
+        if self.enveloped:
+            mark_enveloped(scope)
+        await super().__call__(scope, receive, send)
+
+
+class RenderedResponse:
+    """预先渲染的接口响应, 保存到缓存中, 命中时直接输出.
+
+    响应体为最终输出的字节(已经包装统一返回结构), 不小于CACHE_CODEC_MIN_SIZE字节时只保存
+    各个已安装算法(gzip以及br、zstd)压缩后的版本, 不接受压缩的客户端输出时再解压。
+    缓存中依次保存: 4字节的元数据长度, CacheCodec编码的状态码、响应头等元数据(第一个字节为
+    带版本号的头部), 之后为各个版本的响应体。其他版本的程序写入的缓存解码时抛出CacheDecodeError,
+    按照缓存未命中处理。
+    """
+
+    __slots__ = ("bodies", "enveloped", "etag", "headers", "status_code")
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: list[tuple[str, str]],
+        bodies: dict[str, bytes],
+        etag: str,
+        enveloped: bool = False,
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        # 编码 -> 响应体, identity为未压缩的响应体
+        self.bodies = bodies
+        self.etag = etag
+        self.enveloped = enveloped
+
+    @classmethod
+    def from_body(
+        cls,
+        status_code: int,
+        headers: list[tuple[str, str]],
+        body: bytes,
+        enveloped: bool = False,
+    ) -> "RenderedResponse":
+        """从未压缩的响应体创建, 计算ETag并预先压缩."""
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if len(body) < settings.CACHE_CODEC_MIN_SIZE:
+            bodies = {"identity": body}
+        else:
+            bodies = {coding: compress(body, coding) for coding in COMPRESSORS}
+        return cls(status_code, headers, bodies, etag, enveloped)
+
+    def dumps(self) -> bytes:
+        """编码为缓存内容."""
+        meta = {
+            "status": self.status_code,
+            "headers": self.headers,
+            "etag": self.etag,
+            "enveloped": self.enveloped,
+            "sizes": [[coding, len(body)] for coding, body in self.bodies.items()],
+        }
+        encoded = get_codec().encode(meta)
+        return struct.pack("!I", len(encoded)) + encoded + b"".join(self.bodies.values())
+
+    @classmethod
+    def loads(cls, data: bytes) -> "RenderedResponse":
+        """从缓存内容解码."""
+        (length,) = struct.unpack_from("!I", data)
+        meta = get_codec().decode(data[4 : 4 + length])
+        rest = data[4 + length :]
+        bodies, offset = {}, 0
+        for coding, size in meta["sizes"]:
+            bodies[coding] = rest[offset : offset + size]
+            offset += size
+        if offset != len(rest):
+            msg = "Truncated cached response"
+            raise ValueError(msg)
+        headers = [tuple(header) for header in meta["headers"]]
+        return cls(meta["status"], headers, bodies, meta["etag"], meta["enveloped"])
+
+    def to_response(
+        self,
+        accept_encoding: str = "",
+        if_none_match: Optional[str] = None,
+        private: bool = False,
+    ) -> Response:
+        """按照客户端接受的编码选择响应体, 生成响应, If-None-Match匹配时返回304.
+
+        缓存可能随时按照标签失效, 客户端每次都需要通过If-None-Match验证, 因此输出no-cache,
+        而不是服务端缓存的剩余时间; 按照用户或角色缓存的响应只能保存在客户端(private)。
+        """
+        if "identity" in self.bodies:
+            coding = "identity"
+        else:
+            coding = negotiate(accept_encoding, tuple(self.bodies)) or "identity"
+
+        # 不同压缩版本的强ETag不同, 条件请求比较时忽略编码后缀
+        etag = self.etag if coding == "identity" else coded_etag(self.etag, coding)
+        headers = {"ETag": etag}
+        if "identity" not in self.bodies:
+            headers["Vary"] = "Accept-Encoding"
+        headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+        if if_none_match is not None and etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+
+        if coding in self.bodies:
+            body = self.bodies[coding]
+        else:
+            body = gzip.decompress(self.bodies["gzip"])
+        headers = {**dict(self.headers), **headers}
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return CachedResponse(
+            body,
+            status_code=self.status_code,
+            headers=headers,
+            enveloped=self.enveloped,
+        )
+
+
+def _find_route(request: Request) -> Optional[APIRoute]:
+    endpoint = request.scope.get("endpoint")
+    for route in request.app.routes:
+        if isinstance(route, APIRoute) and route.endpoint is endpoint:
+            return route
+    return None
+
+
+async def render_response(
+    request: Request,
+    result: Any,  # noqa: ANN401
+    sub_response: Optional[Response] = None,
+) -> RenderedResponse:
+    """与FastAPI相同, 按照路由的response_model校验、序列化接口的返回值, 渲染为最终输出的字节.
+
+    元数据中间件会包装统一返回结构时, 预先包装好, 输出时不再经过元数据中间件。
+    """
+    if isinstance(result, StreamingResponse):
+        msg = "Streaming responses can not be cached"
+        raise TypeError(msg)
+    if not isinstance(result, Response):
+        route = _find_route(request)
+        if route is None:
+            msg = f"No route found for {request.url.path}"
+            raise RuntimeError(msg)
+        content = await serialize_response(
+            field=route.response_field,
+            response_content=result,
+            include=route.response_model_include,
+            exclude=route.response_model_exclude,
+            by_alias=route.response_model_by_alias,
+            exclude_unset=route.response_model_exclude_unset,
+            exclude_defaults=route.response_model_exclude_defaults,
+            exclude_none=route.response_model_exclude_none,
+            is_coroutine=True,
+        )
+        response_class = route.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        status_code = route.status_code or (sub_response and sub_response.status_code) or 200
+        result = response_class(content, status_code=status_code)
+
+    body = result.body
+    media_type = result.headers.get("content-type", "")
+    enveloped = bool(request.scope.get(ENVELOPE_SCOPE_KEY))
+    if (
+        enveloped
+        and media_type.startswith("application/json")
+        and result.status_code >= 200  # noqa: PLR2004
+        and result.status_code not in (204, 304)
+    ):
+        body = envelope(body)
+    headers = [
+        (key.decode("latin-1"), value.decode("latin-1"))
+        for key, value in result.headers.raw
+        if key.lower() not in _SKIP_HEADERS
+    ]
+    return RenderedResponse.from_body(result.status_code, headers, body, enveloped)
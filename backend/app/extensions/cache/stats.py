@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 为True时当前请求的缓存读取不计入统计
+_paused: ContextVar[bool] = ContextVar("cache_stats_paused", default=False)
+
+
+class CacheStats:
+    """按照namespace统计接口缓存的命中与未命中次数(进程内), 命中次数包含进程内缓存的命中次数."""
+
+    def __init__(self) -> None:
+        # namespace -> [命中次数, 未命中次数, 进程内缓存命中次数]
+        self._counters: dict[str, list[int]] = defaultdict(lambda: [0, 0, 0])
+
+    @staticmethod
+    def namespace(key: str) -> str:
+        """从缓存key(前缀:namespace:摘要)中取出namespace."""
+        _, _, rest = key.partition(":")
+        namespace, _, _ = rest.rpartition(":")
+        return namespace
+
+    def record(self, key: str, hit: bool, local: bool = False) -> None:
+        """记录一次缓存读取, local表示命中的是进程内缓存."""
+        if _paused.get():
+            return
+        counters = self._counters[self.namespace(key)]
+        counters[0 if hit else 1] += 1
+        if local:
+            counters[2] += 1
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """期间的缓存读取不计入统计, 例如等待其他进程写入缓存时的轮询, 每个请求只统计一次."""
+        token = _paused.set(True)
+        try:
+            yield
+        finally:
+            _paused.reset(token)
+
+    def snapshot(self) -> dict[str, dict]:
+        """各namespace的命中次数、未命中次数、进程内缓存命中次数以及命中率."""
+        result = {}
+        for namespace, (hits, misses, local_hits) in sorted(self._counters.items()):
+            total = hits + misses
+            result[namespace] = {
+                "hits": hits,
+                "misses": misses,
+                "local_hits": local_hits,
+                "hit_rate": round(hits / total, 4) if total else 0,
+            }
+        return result
+
+    def reset(self) -> None:
+        """清空统计."""
+        self._counters.clear()
+
+
+cache_stats = CacheStats()
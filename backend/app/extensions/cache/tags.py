@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Iterable
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, Type
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from redis.commands.core import AsyncScript
+from sqlmodel import SQLModel
+
+from ..fastapi.service import on_model_change
+from .stats import cache_stats
+
+# 标签版本号的过期秒数, 只需要长于一次计算的耗时, 过期后从0重新开始
+TAG_GENERATION_TTL = 86400
+
+# 写入缓存并登记标签, 标签集合的过期时间不短于其中缓存的过期时间,
+# 计算之前读取的标签版本号与当前不同时(期间标签失效过, 计算结果可能是旧数据)不写入
+# KEYS[1] 缓存key, KEYS[2..n+1] 标签集合的key, KEYS[n+2..2n+1] 标签版本号的key,
+# ARGV[1] 缓存内容, ARGV[2] 过期秒数, 0表示不过期, ARGV[3..n+2] 计算之前读取的标签版本号(可选)
+# 返回是否写入
+TAGGED_SET_SCRIPT = """
+local expire = tonumber(ARGV[2])
+local n = (#KEYS - 1) / 2
+if #ARGV > 2 then
+    for i = 1, n do
+        if (redis.call('GET', KEYS[n + 1 + i]) or '0') ~= ARGV[2 + i] then
+            return 0
+        end
+    end
+end
+if expire > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', expire)
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+for i = 2, n + 1 do
+    -- TTL: -2 集合不存在, -1 集合不过期
+    local ttl = redis.call('TTL', KEYS[i])
+    redis.call('SADD', KEYS[i], KEYS[1])
+    if expire <= 0 then
+        redis.call('PERSIST', KEYS[i])
+    elseif ttl == -2 or (ttl >= 0 and ttl < expire) then
+        redis.call('EXPIRE', KEYS[i], expire)
+    end
+end
+return 1
+"""
+
+# 删除标签集合中登记的所有缓存以及标签集合本身, 并增加标签的版本号
+# KEYS[1..n] 标签集合的key, KEYS[n+1..2n] 标签版本号的key, ARGV[1] 版本号的过期秒数
+# 返回被删除的缓存key
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+local n = #KEYS / 2
+for i = 1, n do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members, 500 do
+        redis.call('UNLINK', unpack(members, j, math.min(j + 499, #members)))
+    end
+    for _, member in ipairs(members) do
+        table.insert(deleted, member)
+    end
+    redis.call('DEL', KEYS[i])
+    redis.call('INCR', KEYS[n + i])
+    redis.call('EXPIRE', KEYS[n + i], ARGV[1])
+end
+return deleted
+"""
+
+_tagged_set = AsyncScript(None, TAGGED_SET_SCRIPT.encode())
+_invalidate_tags = AsyncScript(None, INVALIDATE_TAGS_SCRIPT.encode())
+
+# 当前请求正在计算的缓存所属的标签, 由tagged生成的key builder设置, 写入缓存时登记
+_pending_tags: ContextVar[tuple[str, ...]] = ContextVar("cache_tags", default=())
+# 当前请求计算之前读取的标签版本号, 写入缓存时与Redis中的版本号比较
+_tag_generations: ContextVar[Optional[tuple[bytes, ...]]] = ContextVar(
+    "cache_tag_generations",
+    default=None,
+)
+
+
+def tag_key(tag: str) -> str:
+    """标签集合在Redis中的key."""
+    return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+
+def tag_generation_key(tag: str) -> str:
+    """标签版本号在Redis中的key, 标签每次失效时加1."""
+    return f"{FastAPICache.get_prefix()}:tagver:{tag}"
+
+
+def model_tags(model: Type[SQLModel], ids: Iterable[Any] = ()) -> list[str]:
+    """模型变更时需要失效的标签: 列表标签 表名-list 以及每个对象的标签 表名:id."""
+    name = model.__tablename__
+    return [f"{name}-list", *(f"{name}:{id_}" for id_ in ids)]
+
+
+def tagged(key_builder: Callable, *tags: str) -> Callable:
+    """为key builder生成的缓存登记标签, 标签中可以使用路由函数的参数, 例如 user:{user_id}.
+
+    使用方法:
+        @cache(expire=3600, key_builder=tagged(request_key_builder, "user:{user_id}"))
+    """
+
+    def builder(
+        func: Callable,
+        namespace: Optional[str] = "",
+        *,
+        kwargs: Optional[dict] = None,
+        **options: Any,  # noqa: ANN401
+    ) -> str:
+        key = key_builder(func, namespace, kwargs=kwargs, **options)
+        _pending_tags.set(tuple(tag.format(**(kwargs or {})) for tag in tags))
+        return key
+
+    builder.auth_scope = getattr(key_builder, "auth_scope", "user")
+    return builder
+
+
+class TaggedRedisBackend(RedisBackend):
+    """支持标签的Redis缓存后端.
+
+    写入缓存时把key加入各个标签的集合, 按照标签失效时删除集合中的所有缓存,
+    数据变更后即可让相关的接口缓存失效, 而不必等待缓存过期。读取时按照namespace统计命中率。
+    标签失效时版本号加1, 计算之前调用read_generations记录版本号, 写入时版本号已经变化则不写入,
+    避免失效之前开始的计算在失效之后写入旧数据。
+    """
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[bytes]]:
+        """读取缓存以及剩余秒数, 同时统计命中率."""
+        ttl, value = await super().get_with_ttl(key)
+        cache_stats.record(key, value is not None)
+        return ttl, value
+
+    async def read_generations(self) -> None:
+        """计算缓存内容之前读取当前请求的标签的版本号."""
+        tags = _pending_tags.get()
+        if tags:
+            generations = await self.redis.mget([tag_generation_key(tag) for tag in tags])
+            _tag_generations.set(tuple(generation or b"0" for generation in generations))
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> bool:
+        """写入缓存, 同时登记当前请求的标签, 返回是否写入.
+
+        记录过标签版本号时(read_generations), 版本号已经变化则不写入。
+        """
+        tags = _pending_tags.get()
+        generations = _tag_generations.get()
+        _tag_generations.set(None)
+        if not tags:
+            await super().set(key, value, expire)
+            return True
+        _pending_tags.set(())
+        written = await _tagged_set(
+            keys=[
+                key,
+                *(tag_key(tag) for tag in tags),
+                *(tag_generation_key(tag) for tag in tags),
+            ],
+            args=[value, expire or 0, *(generations or ())],
+            client=self.redis,
+        )
+        return bool(written)
+
+    async def invalidate(self, *tags: str) -> list[str]:
+        """使标签下的所有缓存失效, 返回被删除的缓存key."""
+        if not tags:
+            return []
+        keys = await _invalidate_tags(
+            keys=[
+                *(tag_key(tag) for tag in tags),
+                *(tag_generation_key(tag) for tag in tags),
+            ],
+            args=[TAG_GENERATION_TTL],
+            client=self.redis,
+        )
+        # 接口缓存使用的客户端不自动解码, 返回的key为bytes
+        return [key.decode("utf-8") if isinstance(key, bytes) else key for key in keys]
+
+
+async def invalidate_tags(*tags: str) -> list[str]:
+    """使标签下的所有缓存失效, 缓存没有初始化或者不支持标签时忽略."""
+    backend = FastAPICache._backend
+    if not isinstance(backend, TaggedRedisBackend):
+        return []
+    return await backend.invalidate(*tags)
+
+
+@on_model_change()
+async def invalidate_model_cache(model: Type[SQLModel], ids: list[Any]) -> None:
+    """ServiceBase保存、更新、删除对象后, 使该模型相关的缓存失效."""
+    await invalidate_tags(*model_tags(model, ids))
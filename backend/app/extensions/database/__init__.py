@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from .counter import QueryCounter
+from .loader import IdLoader
+from .pool import AdaptiveLimiter, InstrumentedPool, PoolMonitor, instrument_pool, pool_stats
+from .routing import ReplicaSet, RoutingSession, replica_read, replica_reads
+from .statements import LIMIT, OFFSET, StatementTemplates, statement_templates
+from .uow import UnitOfWork, unit_of_work
+
+__all__ = [
+    "LIMIT",
+    "OFFSET",
+    "AdaptiveLimiter",
+    "IdLoader",
+    "InstrumentedPool",
+    "PoolMonitor",
+    "QueryCounter",
+    "ReplicaSet",
+    "RoutingSession",
+    "StatementTemplates",
+    "UnitOfWork",
+    "instrument_pool",
+    "pool_stats",
+    "replica_read",
+    "replica_reads",
+    "statement_templates",
+    "unit_of_work",
+]
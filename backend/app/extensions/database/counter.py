@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+
+
+class QueryCounter:
+    """统计执行的SQL语句数以及加载的ORM对象数, 用于在测试中限制接口的查询次数.
+
+    加载的对象按照模型统计, 可以发现连带加载关联对象(例如加载角色时加载了全部用户)的问题。
+
+    使用方法:
+        with QueryCounter(engine) as counter:
+            await client.get("/api/user/me")
+        counter.assert_max(statements=2, objects=1)
+
+    :param engine: 统计的引擎
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine.sync_engine
+        self.statements: list[str] = []
+        self.objects: Counter[str] = Counter()
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        event.listen(SQLModel, "load", self._on_load, propagate=True)
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        event.remove(SQLModel, "load", self._on_load)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        self.statements.append(statement)
+
+    def _on_load(self, target: SQLModel, context: Any) -> None:  # noqa: ANN401
+        self.objects[type(target).__name__] += 1
+
+    def reset(self) -> None:
+        """清零统计."""
+        self.statements.clear()
+        self.objects.clear()
+
+    def assert_max(self, statements: int, objects: Optional[int] = None) -> None:
+        """检查语句数与对象数不超过上限, 超过时列出执行的语句."""
+        if len(self.statements) > statements:
+            executed = "\n".join(self.statements)
+            msg = f"{len(self.statements)} statements executed, expected at most {statements}:\n"
+            raise AssertionError(msg + executed)
+        total = sum(self.objects.values())
+        if objects is not None and total > objects:
+            msg = f"{total} objects loaded {dict(self.objects)}, expected at most {objects}"
+            raise AssertionError(msg)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections.abc import Hashable, Iterable, Sequence
+from typing import Any, Generic, Optional, Type, TypeVar
+
+from sqlalchemy import bindparam, event
+from sqlalchemy.orm import Session as SyncSession
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession as Session
+
+from .statements import statement_templates
+
+ModelType = TypeVar("ModelType", bound=SQLModel)
+
+# session.info中保存批量加载器的key
+ID_LOADERS_KEY = "id_loaders"
+
+
+class IdLoader(Generic[ModelType]):
+    """按照ID批量加载对象, 每个session(即每个请求)每个模型的每种加载方式一个.
+
+    同一个事件循环周期内的多次load合并为一次WHERE id IN (...)查询, 重复的ID只查询一次;
+    加载过的对象(包括不存在的ID)缓存在加载器中, 同一个请求中再次加载时不再查询。
+    对象变更时由ServiceBase.notify_change清除缓存, session回滚时清除全部缓存。
+
+    :param session: 请求的session
+    :param model: 模型类
+    :param profile: 关联对象加载方式的名称
+    :param options: 加载方式对应的查询选项
+    :param max_batch_size: 每次查询的最大ID数, 超过时分为多次查询
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        model: Type[ModelType],
+        profile: Optional[str] = None,
+        options: Sequence[ORMOption] = (),
+        max_batch_size: int = 500,
+    ) -> None:
+        self.session = session
+        self.model = model
+        self.profile = profile
+        self.options = options
+        self.max_batch_size = max_batch_size
+        self.cache: dict[Hashable, Optional[ModelType]] = {}
+        self.queries = 0
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._batch: list[Hashable] = []
+        self._tasks: set[asyncio.Task] = set()
+        # session不支持并发查询, 多批查询依次执行
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def of(
+        cls,
+        session: Session,
+        model: Type[ModelType],
+        profile: Optional[str] = None,
+        options: Sequence[ORMOption] = (),
+    ) -> "IdLoader[ModelType]":
+        """session中模型的加载器, 第一次使用时创建."""
+        loaders = session.info.setdefault(ID_LOADERS_KEY, {})
+        loader = loaders.get((model, profile))
+        if loader is None:
+            loader = loaders[model, profile] = cls(session, model, profile, options)
+        return loader
+
+    @staticmethod
+    def forget(session: Session, model: Type[SQLModel], ids: Iterable[Hashable]) -> None:
+        """对象变更之后清除session中模型所有加载器的缓存."""
+        ids = list(ids)
+        for (loader_model, _), loader in session.info.get(ID_LOADERS_KEY, {}).items():
+            if loader_model is model:
+                loader.clear(ids)
+
+    async def load(self, id_: Hashable) -> Optional[ModelType]:
+        """加载ID对应的对象, 不存在时返回None."""
+        if id_ in self.cache:
+            return self.cache[id_]
+        # 一个调用方被取消时不影响等待同一个ID的其他调用方
+        return await asyncio.shield(self._enqueue(id_))
+
+    async def load_many(self, ids: Iterable[Hashable]) -> list[Optional[ModelType]]:
+        """加载多个ID对应的对象, 结果与ids的顺序一致, 不存在的ID对应None."""
+        ids = list(ids)
+        results = {id_: self.cache[id_] for id_ in ids if id_ in self.cache}
+        # 先同步加入批次, 与同一周期内的其他load合并为一次查询
+        futures = {id_: self._enqueue(id_) for id_ in ids if id_ not in results}
+        for id_, future in futures.items():
+            results[id_] = await asyncio.shield(future)
+        return [results[id_] for id_ in ids]
+
+    def clear(self, ids: Optional[Iterable[Hashable]] = None) -> None:
+        """清除缓存, ids为None时清除全部."""
+        if ids is None:
+            self.cache.clear()
+            return
+        for id_ in ids:
+            self.cache.pop(id_, None)
+
+    def _enqueue(self, id_: Hashable) -> asyncio.Future:
+        """ID加入待查询的批次, 返回等待结果的future."""
+        future = self._pending.get(id_)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[id_] = loop.create_future()
+            if not self._batch:
+                # 当前周期中其他协程的load执行完之后再查询
+                loop.call_soon(self._dispatch)
+            self._batch.append(id_)
+        return future
+
+    def _dispatch(self) -> None:
+        task = asyncio.create_task(self._load_batch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self) -> None:
+        batch, self._batch = self._batch, []
+        statement = statement_templates.get(
+            (self.model, "get_many", self.profile),
+            lambda: select(self.model)
+            .where(self.model.id.in_(bindparam("ids", expanding=True)))
+            .options(*self.options),
+        )
+        try:
+            async with self._lock:
+                for start in range(0, len(batch), self.max_batch_size):
+                    chunk = batch[start : start + self.max_batch_size]
+                    results = await self.session.exec(statement, params={"ids": chunk})
+                    self.queries += 1
+                    found = {obj.id: obj for obj in results.all()}
+                    for id_ in chunk:
+                        self.cache[id_] = found.get(id_)
+                        self._pending.pop(id_).set_result(self.cache[id_])
+        except Exception as e:
+            for id_ in batch:
+                future = self._pending.pop(id_, None)
+                if future is not None:
+                    future.set_exception(e)
+
+
+@event.listens_for(SyncSession, "after_soft_rollback")
+def _clear_loaders(session: SyncSession, previous_transaction: Any) -> None:  # noqa: ANN401
+    """回滚之后缓存的对象已经过期, 清除加载器的缓存."""
+    for loader in session.info.get(ID_LOADERS_KEY, {}).values():
+        loader.clear()
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import bisect
+import time
+import weakref
+from collections import deque
+from time import perf_counter
+from typing import Any, ClassVar, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import default
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, PoolProxiedConnection
+from sqlalchemy.util import await_only
+
+# 连接的record_info中的标记, 表示该连接占用了自适应并发限制的名额
+LIMITED_KEY = "adaptive_limited"
+
+# 执行语句时编译缓存的使用情况
+_CACHE_STATUS = {
+    default.CACHE_HIT: "hits",
+    default.CACHE_MISS: "misses",
+    default.CACHING_DISABLED: "disabled",
+    default.NO_CACHE_KEY: "no_cache_key",
+    default.NO_DIALECT_SUPPORT: "no_dialect_support",
+}
+
+
+class Histogram:
+    """毫秒耗时直方图, 记录落在各个区间的次数."""
+
+    # 区间上限(毫秒), 最后一个区间为无穷大
+    buckets: ClassVar[tuple[float, ...]] = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """记录一次耗时."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict[str, Any]:
+        """各区间的次数(le为区间上限)以及次数、平均值、最大值."""
+        labels = [f"le_{bucket:g}" for bucket in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0,
+            "max_ms": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class AdaptiveLimiter:
+    """AIMD自适应并发限制, 限制同时从连接池取出的连接数.
+
+    查询耗时不超过目标值时加性增加(每完成约limit次查询加1), 超过时乘性减少,
+    每轮(limit次查询)最多减少一次, 避免一次慢查询突发使限制骤降。
+    数据库变慢时减少并发, 请求在限制处排队, 而不是全部压到数据库上。
+
+    :param max_limit: 最大并发数, 一般为连接池大小加上溢出数
+    :param min_limit: 最小并发数
+    :param target_latency: 目标查询耗时(毫秒)
+    :param backoff: 乘性减少的系数
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        target_latency: float = 50,
+        backoff: float = 0.9,
+    ) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.limit = float(max_limit)
+        self.in_use = 0
+        self.decreases = 0
+        # 上次减少之后观察到的查询次数
+        self._since_decrease = max_limit
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        """等待并占用一个并发名额, 超时时抛出sqlalchemy.exc.TimeoutError."""
+        try:
+            async with asyncio.timeout(timeout):
+                while self.in_use >= int(self.limit):
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters.append(waiter)
+                    try:
+                        await waiter
+                    finally:
+                        if waiter in self._waiters:
+                            self._waiters.remove(waiter)
+        except TimeoutError as e:
+            msg = f"Adaptive pool limit of {int(self.limit)} reached, timeout {timeout}"
+            raise exc.TimeoutError(msg) from e
+        self.in_use += 1
+
+    def release(self) -> None:
+        """归还一个并发名额."""
+        self.in_use -= 1
+        self._wake()
+
+    def observe(self, latency: float) -> None:
+        """根据一次查询的耗时(毫秒)调整限制."""
+        self._since_decrease += 1
+        if latency > self.target_latency:
+            if self._since_decrease >= self.limit and self.limit > self.min_limit:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._since_decrease = 0
+                self.decreases += 1
+        elif self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._wake()
+
+    def _wake(self) -> None:
+        available = int(self.limit) - self.in_use
+        for waiter in list(self._waiters)[: max(0, available)]:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def snapshot(self) -> dict[str, Any]:
+        """当前限制与占用情况."""
+        return {
+            "limit": round(self.limit, 2),
+            "in_use": self.in_use,
+            "waiting": len(self._waiters),
+            "decreases": self.decreases,
+        }
+
+
+class PoolMonitor:
+    """连接池统计: 取连接等待耗时、查询耗时、使用中/溢出连接数、连接存活时间、重建次数与编译缓存.
+
+    :param name: 名称, 例如primary或者只读副本的地址
+    :param limiter: 自适应并发限制, 为None时不限制
+    """
+
+    def __init__(self, name: str, limiter: Optional[AdaptiveLimiter] = None) -> None:
+        self.name = name
+        self.limiter = limiter
+        self.pool: Optional[AsyncAdaptedQueuePool] = None
+        self.checkout_wait = Histogram()
+        self.query_latency = Histogram()
+        self.opened = 0
+        self.closed = 0
+        self.recycled = 0
+        self.invalidated = 0
+        self.timeouts = 0
+        self.cache_stats = dict.fromkeys(_CACHE_STATUS.values(), 0)
+        self.engine: Optional[AsyncEngine] = None
+        self.records: weakref.WeakSet[ConnectionPoolEntry] = weakref.WeakSet()
+
+    def attach(self, engine: AsyncEngine) -> None:
+        """通过连接池与引擎事件收集统计."""
+        sync_engine = engine.sync_engine
+        self.engine = engine
+        self.pool = sync_engine.pool
+        if isinstance(self.pool, InstrumentedPool):
+            self.pool.monitor = self
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "close", self._on_close)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+        event.listen(sync_engine, "soft_invalidate", self._on_invalidate)
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_execute)
+
+    def _on_connect(self, dbapi_connection: Any, record: ConnectionPoolEntry) -> None:  # noqa: ANN401
+        self.opened += 1
+        self.records.add(record)
+        # 同一个record重新建立连接: 失效之后的重建, 或者超过pool_recycle之后的回收
+        if record.record_info.get("connected") and not record.record_info.pop("invalidated", False):
+            self.recycled += 1
+        record.record_info["connected"] = True
+
+    def _on_close(self, dbapi_connection: Any, record: ConnectionPoolEntry) -> None:  # noqa: ANN401
+        self.closed += 1
+
+    def _on_invalidate(
+        self,
+        dbapi_connection: Any,  # noqa: ANN401
+        record: ConnectionPoolEntry,
+        exception: Optional[BaseException],
+    ) -> None:
+        self.invalidated += 1
+        record.record_info["invalidated"] = True
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        context._pool_monitor_start = perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        latency = (perf_counter() - context._pool_monitor_start) * 1000
+        self.query_latency.observe(latency)
+        status = _CACHE_STATUS.get(getattr(context, "cache_hit", None))
+        if status is not None:
+            self.cache_stats[status] += 1
+        if self.limiter is not None:
+            self.limiter.observe(latency)
+
+    def snapshot(self) -> dict[str, Any]:
+        """当前统计."""
+        pool = self.pool
+        now = time.time()
+        ages = [now - record.starttime for record in self.records if record.dbapi_connection]
+        result = {
+            "size": pool.size() if pool else 0,
+            "checked_in": pool.checkedin() if pool else 0,
+            "checked_out": pool.checkedout() if pool else 0,
+            "overflow": max(0, pool.overflow()) if pool else 0,
+            "checkout_wait": self.checkout_wait.snapshot(),
+            "query_latency": self.query_latency.snapshot(),
+            "connections": {
+                "open": len(ages),
+                "max_age_s": round(max(ages, default=0), 1),
+                "avg_age_s": round(sum(ages) / len(ages), 1) if ages else 0,
+                "opened": self.opened,
+                "closed": self.closed,
+                "recycled": self.recycled,
+                "invalidated": self.invalidated,
+            },
+            "timeouts": self.timeouts,
+            "statement_cache": self._cache_snapshot(),
+        }
+        if self.limiter is not None:
+            result["adaptive"] = self.limiter.snapshot()
+        return result
+
+    def _cache_snapshot(self) -> dict[str, Any]:
+        """编译缓存的命中次数、命中率以及缓存的语句数."""
+        stats = self.cache_stats
+        total = stats["hits"] + stats["misses"]
+        cache = self.engine.sync_engine._compiled_cache if self.engine else None
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / total, 4) if total else 0,
+            "size": len(cache) if cache is not None else 0,
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """记录取连接等待耗时的连接池, 配置了自适应并发限制时先在限制处排队, 归还连接时释放名额.
+
+    通过create_async_engine(poolclass=InstrumentedPool)使用, 再由PoolMonitor.attach关联统计。
+    """
+
+    monitor: Optional[PoolMonitor] = None
+
+    def connect(self) -> PoolProxiedConnection:
+        """取出连接, 记录等待耗时."""
+        monitor = self.monitor
+        if monitor is None:
+            return super().connect()
+
+        start = perf_counter()
+        limiter = monitor.limiter
+        try:
+            if limiter is not None:
+                await_only(limiter.acquire(self._timeout))
+            try:
+                connection = super().connect()
+            except BaseException:
+                if limiter is not None:
+                    limiter.release()
+                raise
+        except exc.TimeoutError:
+            monitor.timeouts += 1
+            raise
+        finally:
+            monitor.checkout_wait.observe((perf_counter() - start) * 1000)
+        if limiter is not None:
+            # 归还连接时释放并发名额
+            connection.record_info[LIMITED_KEY] = True
+        return connection
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            if record.record_info.pop(LIMITED_KEY, False) and self.monitor is not None:
+                self.monitor.limiter.release()
+
+    def recreate(self) -> "InstrumentedPool":
+        """dispose之后重建的连接池沿用原来的统计."""
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        if self.monitor is not None:
+            self.monitor.pool = pool
+        return pool
+
+
+class PoolStats:
+    """进程内各个连接池的统计."""
+
+    def __init__(self) -> None:
+        self.monitors: dict[str, PoolMonitor] = {}
+
+    def register(self, monitor: PoolMonitor) -> PoolMonitor:
+        """登记连接池统计, 同名的统计会被替换."""
+        self.monitors[monitor.name] = monitor
+        return monitor
+
+    def snapshot(self) -> dict[str, dict]:
+        """所有连接池的统计."""
+        return {name: monitor.snapshot() for name, monitor in self.monitors.items()}
+
+
+pool_stats = PoolStats()
+
+
+def instrument_pool(
+    engine: AsyncEngine,
+    name: str,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> PoolMonitor:
+    """为引擎的连接池添加统计, 登记到pool_stats."""
+    monitor = PoolMonitor(name, limiter)
+    monitor.attach(engine)
+    return pool_stats.register(monitor)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+import logging
+import random
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import monotonic
+from typing import Any, Optional, TypeVar
+
+from sqlalchemy import Engine, Select, event, text
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.sql.dml import UpdateBase
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 当前上下文中的只读查询是否发送到只读副本
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads() -> Iterator[None]:
+    """上下文中执行的只读查询(SELECT)发送到只读副本, 写入以及写入之后的查询仍然发送到主库."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_read(target: T) -> T:
+    """只读查询发送到只读副本的装饰器.
+
+    装饰函数时, 函数中的只读查询发送到只读副本; 装饰服务类时对类的所有公开方法(包括继承的方法)
+    生效。写入总是发送到主库, 因此装饰包含写入的方法也是安全的。
+    副本可能落后于主库, 鉴权数据与版本(ETag)等需要最新数据的查询不要装饰, 一般只装饰列表查询。
+
+    使用方法:
+        @replica_read
+        async def get_role_list(self, offset: int, limit: int) -> List[Role]: ...
+    """
+    if isinstance(target, type):
+        for name, member in inspect.getmembers(target, inspect.isfunction):
+            if not name.startswith("_"):
+                setattr(target, name, replica_read(member))
+        return target
+
+    func: Callable[..., Any] = target
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            with replica_reads():
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        with replica_reads():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaSet:
+    """一组加权的只读副本, 在健康的副本中按照权重随机选择, 全部不可用时回退到主库.
+
+    健康检查: 主动检查定时在每个副本上执行SELECT 1, 失败的副本暂停使用, 恢复后重新加入;
+    被动检查在副本的连接断开等错误发生时立即暂停该副本。
+    为避免复制延迟读到旧数据(例如写入后缓存失效, 随即从副本读取旧数据写回缓存),
+    进程内最近sticky_seconds秒内有过写入时, 只读查询也发送到主库。
+
+    :param replicas: (副本引擎, 权重)列表
+    :param sticky_seconds: 写入之后只读查询仍然发送到主库的秒数
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[tuple[AsyncEngine, int]],
+        sticky_seconds: float = 0,
+    ) -> None:
+        self.engines = [engine for engine, _ in replicas]
+        self.weights = [weight for _, weight in replicas]
+        self.healthy = [True] * len(self.engines)
+        self.sticky_seconds = sticky_seconds
+        self.last_write = float("-inf")
+        for engine in self.engines:
+            event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """按照权重选择一个健康的副本, 最近有过写入或者没有健康的副本时返回None."""
+        if monotonic() - self.last_write < self.sticky_seconds:
+            return None
+        candidates = [i for i, healthy in enumerate(self.healthy) if healthy]
+        if not candidates:
+            return None
+        weights = [self.weights[i] for i in candidates]
+        return self.engines[random.choices(candidates, weights)[0]]  # noqa: S311
+
+    def record_write(self) -> None:
+        """记录写入时间."""
+        self.last_write = monotonic()
+
+    def mark(self, engine: AsyncEngine | Engine, healthy: bool) -> None:
+        """修改副本的健康状态."""
+        for i, replica in enumerate(self.engines):
+            if engine in (replica, replica.sync_engine) and self.healthy[i] != healthy:
+                self.healthy[i] = healthy
+                logger.warning(
+                    "Database replica %s is %s",
+                    replica.url.render_as_string(),
+                    "back online" if healthy else "down, falling back to primary",
+                )
+
+    def _on_error(self, context: ExceptionContext) -> None:
+        if context.is_disconnect and context.engine is not None:
+            self.mark(context.engine, healthy=False)
+
+    async def ping(self, engine: AsyncEngine, timeout: float) -> bool:
+        """在副本上执行SELECT 1."""
+        try:
+            async with asyncio.timeout(timeout), engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        except Exception:
+            return False
+        return True
+
+    async def check(self, timeout: float) -> None:
+        """检查所有副本, 更新健康状态."""
+        results = await asyncio.gather(*(self.ping(engine, timeout) for engine in self.engines))
+        for engine, healthy in zip(self.engines, results):
+            self.mark(engine, healthy)
+
+    async def monitor(self, interval: float, timeout: float) -> None:
+        """定时检查所有副本, 在应用生命周期内作为后台任务运行."""
+        while True:
+            await self.check(timeout)
+            await asyncio.sleep(interval)
+
+    async def dispose(self) -> None:
+        """关闭所有副本的连接池."""
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class RoutingSession(Session):
+    """读写分离session, replica_reads上下文中的SELECT发送到只读副本, 其余发送到主库.
+
+    session中发生过写入(flush或者执行INSERT/UPDATE/DELETE)之后, 同一个session(即同一个请求)的
+    查询都发送到主库, 保证读到自己的写入。没有配置只读副本时与普通session相同。
+
+    :param replicas: 只读副本
+    """
+
+    def __init__(
+        self,
+        *args: Any,  # noqa: ANN401
+        replicas: Optional[ReplicaSet] = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.written = False
+
+    def get_bind(
+        self,
+        mapper: Any = None,  # noqa: ANN401
+        *,
+        clause: Any = None,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        """选择执行语句的引擎."""
+        if self.replicas is not None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.written = True
+            elif (
+                not self.written
+                and _replica_reads.get()
+                and isinstance(clause, Select)
+                and clause._for_update_arg is None
+            ):
+                replica = self.replicas.choose()
+                if replica is not None:
+                    return replica.sync_engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_write(session: RoutingSession) -> None:
+    """提交写入之后开始计算sticky时间."""
+    if session.replicas is not None and session.written:
+        session.replicas.record_write()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Callable, Hashable
+from typing import TypeVar
+
+from sqlalchemy import Integer, bindparam
+from sqlalchemy.sql import Executable
+
+StatementType = TypeVar("StatementType", bound=Executable)
+
+# 分页参数, 用于预先构造的列表查询: statement.offset(OFFSET).limit(LIMIT)
+OFFSET = bindparam("offset", type_=Integer)
+LIMIT = bindparam("limit", type_=Integer)
+
+
+class StatementTemplates:
+    """预先构造的查询语句.
+
+    常用查询只构造一次, 参数使用bindparam, 执行时通过params传入。每次查询省去构造语句的开销,
+    语句对象不变, 生成编译缓存key的结果也会被缓存, 编译缓存始终命中。
+    (lambda_stmt同样可以缓存语句, 但实测每次调用的开销比预先构造的语句更大, 因此不使用。)
+
+    使用方法:
+        statement = statement_templates.get(
+            (User, "get"),
+            lambda: select(User).where(User.id == bindparam("id")),
+        )
+        await session.exec(statement, params={"id": 1})
+    """
+
+    def __init__(self) -> None:
+        self._statements: dict[Hashable, Executable] = {}
+
+    def get(self, key: Hashable, build: Callable[[], StatementType]) -> StatementType:
+        """获取key对应的语句, 第一次获取时调用build构造.
+
+        :param key: 语句的key, 一般为(模型, 查询名称)
+        :param build: 构造语句的函数, 语句中的参数使用bindparam
+        """
+        statement = self._statements.get(key)
+        if statement is None:
+            statement = self._statements[key] = build()
+        return statement
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
+statement_templates = StatementTemplates()
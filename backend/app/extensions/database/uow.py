@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, Optional, Type
+
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession as Session
+
+# session.info中保存工作单元的key
+UNIT_OF_WORK_KEY = "unit_of_work"
+
+
+class UnitOfWork:
+    """请求级工作单元, 同一个请求中的所有服务共用一个session, 所有写入在请求结束时一次提交.
+
+    服务请求提交时只flush, 在同一个事务中继续执行, 请求正常结束时统一提交;
+    请求出错时回滚全部写入。服务的每次写入在SAVEPOINT中执行, 写入出错只回滚这次写入。
+    模型变更通知(例如缓存失效)推迟到提交成功之后再发送, 避免其他请求在提交之前读到旧数据并写回缓存。
+    session在首次查询时才从连接池获取连接, 命中缓存等没有查询的请求不占用连接。
+
+    :param session: 请求的session
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.commit_requested = False
+        # 模型 -> 变更对象的ID
+        self.changes: dict[Type[SQLModel], list[Any]] = defaultdict(list)
+
+    @classmethod
+    def current(cls, session: Session) -> Optional["UnitOfWork"]:
+        """session所属的工作单元, 不在请求中(例如脚本、测试)时返回None."""
+        return session.info.get(UNIT_OF_WORK_KEY)
+
+    def request_commit(self) -> None:
+        """服务请求提交, 推迟到请求结束时执行."""
+        self.commit_requested = True
+
+    def record_change(self, model: Type[SQLModel], ids: list[Any]) -> None:
+        """记录模型变更, 提交成功之后再通知."""
+        self.changes[model].extend(ids)
+
+    def discard(self) -> None:
+        """整个事务已经回滚, 之前请求的提交与记录的变更都已经无效."""
+        self.commit_requested = False
+        self.changes = defaultdict(list)
+
+    async def commit(
+        self,
+        notify: Callable[[Type[SQLModel], list[Any]], Awaitable[None]],
+    ) -> None:
+        """有服务请求过提交时提交事务, 然后发送变更通知; 只读的请求直接结束事务, 归还连接."""
+        if not self.commit_requested:
+            await self.session.rollback()
+            return
+        await self.session.commit()
+        self.commit_requested = False
+        changes, self.changes = self.changes, defaultdict(list)
+        for model, ids in changes.items():
+            await notify(model, ids)
+
+
+@asynccontextmanager
+async def unit_of_work(
+    session: Session,
+    notify: Callable[[Type[SQLModel], list[Any]], Awaitable[None]],
+) -> AsyncIterator[UnitOfWork]:
+    """在session上开启工作单元, 正常结束时提交, 出错时回滚.
+
+    :param session: 请求的session
+    :param notify: 提交之后发送模型变更通知的函数
+    """
+    uow = UnitOfWork(session)
+    session.info[UNIT_OF_WORK_KEY] = uow
+    try:
+        yield uow
+    except BaseException:
+        await session.rollback()
+        raise
+    else:
+        await uow.commit(notify)
+    finally:
+        session.info.pop(UNIT_OF_WORK_KEY, None)
@@ -1,11 +1,38 @@
 # -*- coding: utf-8 -*-
 
-import json
 import typing
 
 from fastapi.responses import JSONResponse
+from starlette.types import Receive, Scope, Send
 
-from ..serializer.json import CustomJsonEncoder
+from ..serializer import get_serializer
+
+# scope中的标记位, 表示响应体已经是统一返回结构, 元数据中间件无需再次包装
+ENVELOPED_SCOPE_KEY = "app.enveloped"
+# scope中的标记位, 表示元数据中间件会为当前请求的响应包装统一返回结构
+ENVELOPE_SCOPE_KEY = "app.envelope"
+
+# 统一返回结构中data之前与之后的字节, data放在最后, 以便直接拼接handler的输出
+ENVELOPE_PREFIX = (
+    get_serializer()
+    .dumps({"status": True, "code": 0, "message": "成功", "data": None})
+    .removesuffix(b"null}")
+)
+ENVELOPE_SUFFIX = b"}"
+# 直接返回 {"status": ...} 字典的接口(如 /login)视为已经是统一返回结构
+ENVELOPED_BODY_PREFIX = b'{"status":'
+
+
+def mark_enveloped(scope: Scope) -> None:
+    """标记当前请求的响应无需再包装统一返回结构."""
+    scope[ENVELOPED_SCOPE_KEY] = True
+
+
+def envelope(body: bytes) -> bytes:
+    """与元数据中间件相同, 为handler输出的完整JSON包装统一返回结构."""
+    if body.startswith(ENVELOPED_BODY_PREFIX):
+        return body
+    return ENVELOPE_PREFIX + (body or b"null") + ENVELOPE_SUFFIX
 
 
 class ApiResponse(JSONResponse):
@@ -28,13 +55,11 @@ class ApiResponse(JSONResponse):
         body = {"status": self.status, "code": self.code, "message": self.message, "data": content}
         super().__init__(content=body, **options)
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """输出响应, 并告知元数据中间件本响应已经是统一返回结构."""
+        mark_enveloped(scope)
+        await super().__call__(scope, receive, send)
+
     def render(self, content: typing.Any) -> bytes:  # noqa: ANN401
         """渲染函数."""
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            cls=CustomJsonEncoder,
-        ).encode("utf-8")
+        return get_serializer().dumps(content)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from typing import ClassVar, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ...config import settings
+from .conditional import coded_etag
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class Compressor(ABC):
+    """增量压缩器, 流式输出时每一块压缩后立即flush, 客户端可以及时解压."""
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """压缩一块数据并flush."""
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        """结束压缩, 返回剩余的数据."""
+
+
+class GzipCompressor(Compressor):
+    """gzip压缩器."""
+
+    def __init__(self) -> None:
+        self._obj = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """压缩一块数据, 使用Z_SYNC_FLUSH输出完整的deflate块."""
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """结束压缩, 输出剩余数据与gzip尾部."""
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor(Compressor):
+    """brotli压缩器."""
+
+    def __init__(self) -> None:
+        self._obj = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        """压缩一块数据并flush."""
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        """结束brotli流."""
+        return self._obj.finish()
+
+
+class ZstdCompressor(Compressor):
+    """zstd压缩器."""
+
+    def __init__(self) -> None:
+        self._obj = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """压缩一块数据, 输出完整的zstd块."""
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        """结束zstd帧."""
+        return self._obj.flush()
+
+
+# 已安装的压缩算法, 按照服务端的优先顺序排列
+COMPRESSORS: dict[str, Callable[[], Compressor]] = {
+    **({"br": BrotliCompressor} if brotli is not None else {}),
+    **({"zstd": ZstdCompressor} if zstandard is not None else {}),
+    "gzip": GzipCompressor,
+}
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """整体压缩."""
+    compressor = COMPRESSORS[coding]()
+    return compressor.compress(body) + compressor.finish()
+
+
+def parse_accept_encoding(accept_encoding: str) -> dict[str, float]:
+    """解析Accept-Encoding, 返回 编码 -> q值, 格式错误的q值视为1."""
+    result = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 1.0
+        result[coding] = q
+    return result
+
+
+def negotiate(
+    accept_encoding: str,
+    available: tuple[str, ...] = tuple(COMPRESSORS),
+) -> Optional[str]:
+    """从available中选择客户端q值最高的编码, q值相同时按照available的顺序, 都不接受时返回None."""
+    accepted = parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """响应压缩中间件, 纯ASGI实现, 按照Accept-Encoding协商br/zstd/gzip.
+
+    不压缩: 小于COMPRESSION_MIN_SIZE字节的响应、已经压缩的响应(例如接口缓存中预先压缩的响应)、
+    图片等不适合压缩的类型以及声明了no-transform的响应。
+    流式输出时逐块压缩并flush; 大于COMPRESSION_THREADPOOL_MIN_SIZE字节的响应在线程池中压缩,
+    不阻塞事件循环。应当放在元数据中间件外层, 压缩包装统一返回结构之后的响应体。
+    """
+
+    compressible_types: ClassVar[tuple[str, ...]] = (
+        "text/",
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    )
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, coding, self.compressible_types)(scope, receive, send)
+
+
+class CompressionResponder:
+    """压缩一个请求的响应."""
+
+    def __init__(self, app: ASGIApp, coding: str, compressible_types: tuple[str, ...]) -> None:
+        self.app = app
+        self.coding = coding
+        self.compressible_types = compressible_types
+        self.send: Send = None
+        self.initial_message: Message = {}
+        self.compressing = False
+        self.started = False
+        self.compressor: Optional[Compressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def should_compress(self, message: Message) -> bool:
+        """根据状态码与响应头判断是否需要压缩."""
+        if message["status"] < 200 or message["status"] in (204, 304):  # noqa: PLR2004
+            return False
+        headers = Headers(raw=message["headers"])
+        content_length = headers.get("content-length")
+        return (
+            "content-encoding" not in headers
+            and "no-transform" not in headers.get("cache-control", "")
+            and headers.get("content-type", "").startswith(self.compressible_types)
+            and (content_length is None or int(content_length) >= settings.COMPRESSION_MIN_SIZE)
+        )
+
+    async def send_compressed(self, message: Message) -> None:
+        """修改响应头, 压缩响应体."""
+        if message["type"] == "http.response.start":
+            if message["status"] == 304:  # noqa: PLR2004
+                self.tag_not_modified(message)
+            self.compressing = self.should_compress(message)
+            if self.compressing:
+                # 需要看到第一块body之后才能确定是否流式输出, 暂不发送
+                self.initial_message = message
+                return
+        elif message["type"] == "http.response.body" and self.compressing:
+            await self.send_body(message)
+            return
+        await self.send(message)
+
+    def tag_not_modified(self, message: Message) -> None:
+        """304没有响应体, 输出与压缩后的200相同的ETag与Vary, 客户端更新缓存的响应头时保持一致."""
+        headers = MutableHeaders(raw=message["headers"])
+        etag = headers.get("etag")
+        if etag:
+            headers["ETag"] = coded_etag(etag, self.coding)
+            headers.add_vary_header("Accept-Encoding")
+
+    async def send_body(self, message: Message) -> None:
+        """第一块body即为全部内容时整体压缩, 否则逐块压缩."""
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                self.compressing = False
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.coding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag:
+                headers["ETag"] = coded_etag(etag, self.coding)
+
+            if not more_body:
+                if len(body) >= settings.COMPRESSION_THREADPOOL_MIN_SIZE:
+                    body = await run_in_threadpool(compress, body, self.coding)
+                else:
+                    body = compress(body, self.coding)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.initial_message)
+                await self.send({**message, "body": body})
+                return
+
+            del headers["Content-Length"]
+            await self.send(self.initial_message)
+            self.compressor = COMPRESSORS[self.coding]()
+
+        body = self.compressor.compress(body) if body else b""
+        if not more_body:
+            body += self.compressor.finish()
+        await self.send({**message, "body": body})
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, NamedTuple, Optional
+
+from fastapi import Depends, Request, Response
+from starlette.datastructures import Headers
+
+from ...config import settings
+
+# 同一个资源不同压缩版本的ETag为 "摘要-编码"
+CONTENT_CODINGS = ("gzip", "br", "zstd")
+
+
+class ResourceVersion(NamedTuple):
+    """资源的版本, 由轻量的版本查询得到, 用于条件请求."""
+
+    etag: str
+    last_modified: Optional[datetime] = None
+
+
+class NotModifiedException(Exception):  # noqa: N818
+    """资源没有变化, 返回不带响应体的304."""
+
+    def __init__(self, headers: dict[str, str]) -> None:
+        self.headers = headers
+
+
+def make_etag(*parts: Any) -> str:  # noqa: ANN401
+    """根据版本信息(例如id与更新时间)计算强ETag."""
+    return f'"{hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """压缩版本的ETag: 强ETag加上编码后缀, 弱ETag以及已经带有后缀的ETag不变."""
+    if etag.startswith("W/") or etag.endswith(tuple(f'-{c}"' for c in CONTENT_CODINGS)):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match使用弱比较, 忽略W/前缀以及压缩版本的-gzip/-br后缀."""
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip().removeprefix("W/")
+        for coding in CONTENT_CODINGS:
+            tag = tag.replace(f'-{coding}"', '"')
+        return tag
+
+    if if_none_match.strip() == "*":
+        return True
+    target = opaque(etag)
+    return any(opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def http_date(value: datetime) -> str:
+    """格式化为HTTP日期, 没有时区的时间视为UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return format_datetime(value.astimezone(UTC), usegmt=True)
+
+
+def is_settled(last_modified: datetime) -> bool:
+    """修改时间早于当前这一秒, 秒级的修改时间可以作为验证器, 没有时区的时间视为UTC."""
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=UTC)
+    now = datetime.now(UTC).replace(microsecond=0)
+    return last_modified.replace(microsecond=0) < now
+
+
+def is_not_modified(
+    headers: Headers,
+    etag: Optional[str],
+    last_modified: Optional[datetime] = None,
+) -> bool:
+    """按照RFC 9110判断条件请求: 有If-None-Match时只比较ETag, 否则比较If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=UTC)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=UTC)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_get(
+    version: Callable[..., Awaitable[ResourceVersion]],
+) -> Callable[..., Awaitable[None]]:
+    """生成支持条件请求的依赖, 在读取数据之前通过轻量的版本查询判断资源是否变化.
+
+    资源没有变化时抛出NotModifiedException, 不再执行endpoint, 直接返回304;
+    否则在响应头中输出ETag与Last-Modified。ETag包含APP_VERSION, 升级后输出格式变化时自动失效。
+    更新时间只精确到秒, 当前这一秒内修改过的资源可能在同一秒内再次修改, 不输出Last-Modified,
+    客户端只能通过ETag验证, If-Modified-Since不会得到过期的304。
+
+    使用方法:
+        @router.get("/", dependencies=[Depends(conditional_get(role_list_version))])
+
+    :param version: 返回ResourceVersion的依赖, 可以使用与endpoint相同的参数与服务
+    """
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        current: ResourceVersion = Depends(version),
+    ) -> None:
+        etag = make_etag(settings.APP_VERSION, current.etag)
+        headers = {"ETag": etag}
+        last_modified = current.last_modified
+        if last_modified is not None and not is_settled(last_modified):
+            last_modified = None
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        if request.method in ("GET", "HEAD") and is_not_modified(
+            request.headers,
+            etag,
+            last_modified,
+        ):
+            raise NotModifiedException(headers)
+        response.headers.update(headers)
+
+    return dependency
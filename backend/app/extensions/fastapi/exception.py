@@ -7,8 +7,10 @@ from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 from starlette.exceptions import HTTPException
+from starlette.responses import Response
 
 from .api import ApiResponse
+from .conditional import NotModifiedException
 
 logger = logging.getLogger(__name__)
 
@@ -118,6 +120,7 @@ error_message = {
     404: "访问地址不存在",
     405: "请求方法不能被用于请求相应的资源",
     500: "服务器发生未知错误",
+    503: "服务繁忙, 请稍后再试",
 }
 
 
@@ -294,6 +297,14 @@ def register_global_exception(app: FastAPI) -> None:
             status_code=exc.status_code,
         )
 
+    @app.exception_handler(NotModifiedException)
+    async def not_modified_exception_handler(
+        request: Request,
+        exc: NotModifiedException,
+    ) -> Response:
+        """条件请求的资源没有变化, 返回不带响应体的304, 不包装统一返回结构."""
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=exc.headers)
+
     @app.exception_handler(HTTPException)
     async def http_exception_handler(
         request: Request,
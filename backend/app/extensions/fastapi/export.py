@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
+from datetime import date
+from decimal import Decimal
+from typing import Annotated, Any, Literal, Type
+
+from fastapi import Query
+from sqlmodel import SQLModel
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from ..serializer import get_serializer, json_default
+from .api import mark_enveloped
+
+# 导出格式
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# 导出格式查询参数, 例如 /api/user/export?format=csv
+ExportFormatParam = Annotated[ExportFormat, Query(alias="format", description="导出格式")]
+
+
+def export_fields(model: Type[SQLModel]) -> dict[str, str]:
+    """模型的字段名 -> 导出的列名, 有别名(例如驼峰)时使用别名, 与接口输出的key一致."""
+    return {name: field.alias or name for name, field in model.model_fields.items()}
+
+
+def render_ndjson(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    """一批数据渲染为NDJSON, 每行一个JSON对象."""
+    dumps = get_serializer().dumps
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_value(value: Any) -> Any:  # noqa: ANN401
+    if isinstance(value, (date, Decimal)):
+        return json_default(value)
+    return value
+
+
+def render_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    """一批数据渲染为CSV, 日期时间的格式与NDJSON(JSON序列化)相同."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+class ExportResponse(StreamingResponse):
+    """流式导出响应, 从服务端游标逐批读取数据, 逐批渲染为NDJSON或CSV输出, 内存占用与数据量无关.
+
+    响应体不是JSON, 不经过元数据中间件包装统一返回结构。
+
+    :param batches: 逐批产出数据行的异步迭代器, 例如ServiceBase.stream
+    :param columns: 列名, 与数据行中的值一一对应
+    :param export_format: 导出格式
+    :param filename: 下载的文件名(不含扩展名)
+    """
+
+    def __init__(
+        self,
+        batches: AsyncIterable[Sequence[Sequence[Any]]],
+        columns: Sequence[str],
+        export_format: ExportFormat = "ndjson",
+        filename: str = "export",
+    ) -> None:
+        super().__init__(
+            self.render(batches, columns, export_format),
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}.{export_format}"',
+                "Cache-Control": "no-store",
+                # 禁止nginx缓冲整个响应, 边读边输出
+                "X-Accel-Buffering": "no",
+            },
+        )
+
+    @staticmethod
+    async def render(
+        batches: AsyncIterable[Sequence[Sequence[Any]]],
+        columns: Sequence[str],
+        export_format: ExportFormat,
+    ) -> AsyncIterator[bytes]:
+        """逐批渲染, CSV先输出表头."""
+        if export_format == "csv":
+            yield render_csv([columns])
+        async for rows in batches:
+            if export_format == "csv":
+                yield render_csv(rows)
+            else:
+                yield render_ndjson(columns, rows)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """输出响应, 并告知元数据中间件不要包装响应体."""
+        mark_enveloped(scope)
+        await super().__call__(scope, receive, send)
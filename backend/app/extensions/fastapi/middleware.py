@@ -1,32 +1,57 @@
 # -*- coding: utf-8 -*-
 
-import json
-import time
-from datetime import datetime, timedelta
 from typing import ClassVar
 
-from fastapi import Request, Response
-from fastapi.responses import JSONResponse
-from starlette.datastructures import MutableHeaders
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .api import (
+    ENVELOPE_PREFIX,
+    ENVELOPE_SCOPE_KEY,
+    ENVELOPE_SUFFIX,
+    ENVELOPED_BODY_PREFIX,
+    ENVELOPED_SCOPE_KEY,
+)
+from .timing import start_timing, stop_timing
 
-# https://github.com/tiangolo/fastapi/discussions/6223
-class TimingMiddleware(BaseHTTPMiddleware):
-    """API计时中间件."""
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:  # noqa: D102
-        begin = time.time()
-        response = await call_next(request)
-        response_time = time.time() - begin
-        response.headers["X-Response-Time"] = str(response_time)
-        return response
+class TimingMiddleware:
+    """API计时中间件.
+
+    纯ASGI实现, 在响应头中输出 Server-Timing 与 X-Response-Time(秒)。
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing, token = start_timing()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.header())
+                headers["X-Response-Time"] = str(timing.elapsed() / 1e9)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            stop_timing(token)
 
 
 # https://github.com/tiangolo/fastapi/issues/4766
 class MetaDataAdderMiddleware:
-    """将API输出结果进行统一格式化的中间件."""
+    """将API输出结果进行统一格式化的中间件.
+
+    handler输出的JSON字节不再解析, 直接在前后拼接统一返回结构的字节片段, 变成
+    {"status": true, "code": 0, "message": "成功", "data": <原始输出>}.
+    已经是统一返回结构的输出(ApiResponse或者以status开头的字典)保持原样.
+    """
 
     application_generic_urls: ClassVar[list[str]] = [
         "/openapi.json",
@@ -45,9 +70,9 @@ class MetaDataAdderMiddleware:
             scope["path"].startswith(endpoint)
             for endpoint in MetaDataAdderMiddleware.application_generic_urls
         ):
-            responder = MetaDataAdderMiddlewareResponder(
-                self.app,
-            )  # , self.standard_meta_data, self.additional_custom_information)
+            # 告知handler(例如接口缓存)响应会被包装, 可以预先渲染统一返回结构
+            scope[ENVELOPE_SCOPE_KEY] = True
+            responder = MetaDataAdderMiddlewareResponder(self.app)
             await responder(scope, receive, send)
             return
         await self.app(scope, receive, send)
@@ -56,87 +81,81 @@ class MetaDataAdderMiddleware:
 class MetaDataAdderMiddlewareResponder:
     """将API输出结果进行统一格式化."""
 
+    envelope_prefix: ClassVar[bytes] = ENVELOPE_PREFIX
+    envelope_suffix: ClassVar[bytes] = ENVELOPE_SUFFIX
+    enveloped_body_prefix: ClassVar[bytes] = ENVELOPED_BODY_PREFIX
+
     def __init__(
         self,
         app: ASGIApp,
     ) -> None:
         self.app = app
+        self.scope: Scope = {}
         self.initial_message: Message = {}
+        self.wrapping = False
+        self.started = False
+        self.body_sent = False
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        self.scope = scope
         self.send = send
         await self.app(scope, receive, self.send_with_meta_response)
 
+    def should_wrap(self, message: Message) -> bool:
+        """根据响应头判断是否需要包装统一返回结构."""
+        if self.scope.get(ENVELOPED_SCOPE_KEY) or self.scope.get("method") == "HEAD":
+            return False
+        if message["status"] in (204, 304) or message["status"] < 200:  # noqa: PLR2004
+            return False
+        headers = Headers(raw=message["headers"])
+        return (
+            headers.get("content-type", "").startswith("application/json")
+            and "content-encoding" not in headers
+            and headers.get("content-length") != "0"
+        )
+
     async def send_with_meta_response(self, message: Message) -> None:
         """修改response信息."""
         message_type = message["type"]
         if message_type == "http.response.start":
-            # Don't send the initial message until we've determined how to
-            # modify the outgoing headers correctly.
-            self.initial_message = message
-
-        elif message_type == "http.response.body":
-            if message.get("more_body"):
-                response_body = json.loads(message["body"].decode())
-
-                data = {}
-                if not isinstance(response_body, dict) or response_body.get("status") is None:
-                    data["status"] = True
-                    data["code"] = 0
-                    data["message"] = "成功"
-                    data["data"] = response_body
-                else:
-                    data = response_body
-
-                data_to_be_sent_to_user = json.dumps(data, default=str).encode("utf-8")
+            self.wrapping = self.should_wrap(message)
+            if self.wrapping:
+                # 需要看到第一块body之后才能确定如何修改响应头, 暂不发送
+                self.initial_message = message
+                return
+        elif message_type == "http.response.body" and self.wrapping:
+            await self.send_wrapped_body(message)
+            return
+        await self.send(message)
 
-                headers = MutableHeaders(raw=self.initial_message["headers"])
-                headers["Content-Length"] = str(len(data_to_be_sent_to_user))
-                message["body"] = data_to_be_sent_to_user
+    async def send_wrapped_body(self, message: Message) -> None:
+        """在第一块body前拼接前缀, 在最后一块body后拼接后缀, 支持多块的流式输出."""
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
 
+        if not self.started:
+            self.started = True
+            if body.startswith(self.enveloped_body_prefix):
+                self.wrapping = False
                 await self.send(self.initial_message)
-            await self.send(message)
-
-
-# immediately after imports
-# https://semaphoreci.com/blog/custom-middleware-fastapi
-class RateLimitingMiddleware(BaseHTTPMiddleware):
-    """限流中间件."""
-
-    # Rate limiting configurations
-    RATE_LIMIT_DURATION = timedelta(minutes=1)
-    RATE_LIMIT_REQUESTS = 3
-
-    def __init__(self, app) -> None:  # noqa: ANN001
-        super().__init__(app)
-        # Dictionary to store request counts for each IP
-        self.request_counts = {}
-
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):  # noqa: D102, ANN201
-        # Get the client's IP address
-        client_ip = request.client.host
-
-        # Check if IP is already present in request_counts
-        request_count, last_request = self.request_counts.get(client_ip, (0, datetime.min))
-
-        # Calculate the time elapsed since the last request
-        elapsed_time = datetime.now() - last_request  # noqa: DTZ005
-
-        if elapsed_time > self.RATE_LIMIT_DURATION:
-            # If the elapsed time is greater than the rate limit duration, reset the count
-            request_count = 1
-        else:
-            if request_count >= self.RATE_LIMIT_REQUESTS:
-                # If the request count exceeds the rate limit, return a JSON response
-                # with an error message
-                return JSONResponse(
-                    status_code=429,
-                    content={"message": "Rate limit exceeded. Please try again later."},
+                await self.send(message)
+                return
+
+            self.body_sent = bool(body)
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            if "content-length" in headers:
+                headers["Content-Length"] = str(
+                    int(headers["content-length"])
+                    + len(self.envelope_prefix)
+                    + len(self.envelope_suffix),
                 )
-            request_count += 1
+            await self.send(self.initial_message)
+            body = self.envelope_prefix + body
+        else:
+            self.body_sent = self.body_sent or bool(body)
 
-        # Update the request count and last request timestamp for the IP
-        self.request_counts[client_ip] = (request_count, datetime.now())  # noqa: DTZ005
+        if not more_body:
+            # 没有任何输出内容时data为null, 保证输出仍是合法的JSON
+            body += self.envelope_suffix if self.body_sent else b"null" + self.envelope_suffix
 
-        # Proceed with the request
-        return await call_next(request)
+        await self.send({**message, "body": body})
@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
 
-from typing import Annotated
+import base64
+import hashlib
+import hmac
+from collections.abc import Callable, Sequence
+from typing import Annotated, Any, Literal, Optional
 
-from fastapi import Depends
-from pydantic import computed_field
+from fastapi import Depends, Query
+from fastapi.encoders import jsonable_encoder
+from pydantic import Field, computed_field
 
+from ...config import settings
+from ..serializer import get_serializer
+from .exception import APIException
 from .model import AliasCamelModel
 
+# 总数统计方式: exact 精确统计, estimate 使用表的统计信息估算, none 不统计
+CountMode = Literal["exact", "estimate", "none"]
+
 
 class PageModel(AliasCamelModel):
     """分页查询参数."""
@@ -45,3 +56,119 @@ def page_query(page: int = 1, page_size: int = 10) -> PageModel:
 
 
 PageQueryParam = Annotated[PageModel, Depends(page_query)]
+
+
+class InvalidCursorException(APIException):
+    """游标无效异常类."""
+
+    status_code = 400
+    code = 10004
+    message = "分页游标无效"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(settings.JWT_SECRET_KEY.encode(), payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(sort: str, desc: bool, values: Sequence[Any]) -> str:
+    """生成签名的游标, 内容为排序字段、排序方向以及最后一条记录的(排序字段值, id)."""
+    payload = get_serializer().dumps({"s": sort, "d": desc, "v": jsonable_encoder(values)})
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_cursor(cursor: str, sort: str, desc: bool) -> list[Any]:
+    """校验并解析游标, 游标被篡改或者与当前的排序方式不符时抛出InvalidCursorException."""
+    try:
+        payload, signature = (_b64decode(part) for part in cursor.split("."))
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise InvalidCursorException
+        data = get_serializer().loads(payload)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursorException from exc
+    if data.get("s") != sort or data.get("d") != desc or len(data.get("v", ())) != 2:  # noqa: PLR2004
+        raise InvalidCursorException
+    return data["v"]
+
+
+class CursorModel(AliasCamelModel):
+    """游标分页查询参数与结果.
+
+    按照(排序字段, id)定位, 使用 WHERE (k, id) > (...) 查询下一页, 不需要扫描并丢弃之前的记录。
+    排序字段应当是有索引且不为空的字段。
+    """
+
+    page_size: int = 10
+    cursor: Optional[str] = Field(default=None, exclude=True)
+    sort: str = Field(default="id", exclude=True)
+    desc: bool = Field(default=False, exclude=True)
+    count: CountMode = Field(default="none", exclude=True)
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total: int | None = None
+
+    @property
+    def limit(self) -> int:
+        """SQL select limit, 多取一条用于判断是否还有下一页."""
+        return self.page_size + 1
+
+    def position(self) -> Optional[list[Any]]:
+        """当前游标指向的(排序字段值, id), 第一页时为None."""
+        if not self.cursor:
+            return None
+        return decode_cursor(self.cursor, self.sort, self.desc)
+
+    def paginate(self, items: Sequence[Any]) -> list[Any]:
+        """截取当前页的记录, 并生成下一页的游标."""
+        items = list(items)
+        self.has_more = len(items) > self.page_size
+        items = items[: self.page_size]
+        self.next_cursor = None
+        if self.has_more:
+            last = items[-1]
+            self.next_cursor = encode_cursor(
+                self.sort,
+                self.desc,
+                [getattr(last, self.sort), last.id],
+            )
+        return items
+
+
+def cursor_query(
+    sort_fields: Sequence[str] = ("id",),
+    count: CountMode = "none",
+    max_page_size: int = 100,
+) -> Callable[..., CursorModel]:
+    """生成游标分页查询参数的依赖.
+
+    :param sort_fields: 允许排序的字段, 第一个为默认排序字段, 应当都有索引
+    :param count: 默认的总数统计方式
+    :param max_page_size: 每页最多记录数
+    """
+
+    def dependency(
+        cursor: Optional[str] = None,
+        page_size: Annotated[int, Query(ge=1, le=max_page_size)] = 10,
+        sort: Annotated[Literal[tuple(sort_fields)], Query()] = sort_fields[0],
+        desc: bool = False,
+        count: CountMode = count,
+    ) -> CursorModel:
+        return CursorModel(
+            cursor=cursor,
+            page_size=page_size,
+            sort=sort,
+            desc=desc,
+            count=count,
+        )
+
+    return dependency
+
+
+CursorQueryParam = Annotated[CursorModel, Depends(cursor_query())]
@@ -1,71 +1,577 @@
 # -*- coding: utf-8 -*-
 
+import logging
 from abc import ABC
-from typing import Generic, Optional, Type, TypeVar
+from collections import defaultdict
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Sequence,
+)
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import groupby
+from typing import Any, ClassVar, Generic, Optional, Type, TypeVar
 
-from sqlmodel import SQLModel, delete, select
+from sqlalchemy import (
+    ColumnElement,
+    Executable,
+    Row,
+    Select,
+    and_,
+    case,
+    insert,
+    or_,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlmodel import SQLModel, delete, func, select, text
 from sqlmodel.ext.asyncio.session import AsyncSession as Session
 
+from ...config import settings
+from ..database import IdLoader, UnitOfWork, statement_templates
+from .conditional import ResourceVersion, make_etag
+from .pagination import CountMode, CursorModel, InvalidCursorException, PageModel
+
 ModelType = TypeVar("ModelType", bound=SQLModel)
 
+# 关联对象的加载方式: 名称 -> 查询选项(joinedload/selectinload等)
+LoadProfiles = dict[str, Sequence[ORMOption]]
+
+logger = logging.getLogger(__name__)
+
+# 模型变更监听函数, 参数为变更的模型类以及变更对象的ID列表
+ChangeListener = Callable[[Type[SQLModel], list[Any]], Awaitable[None]]
+
+# 模型 -> 监听函数, key为None的监听函数监听所有模型
+_change_listeners: dict[Optional[Type[SQLModel]], list[ChangeListener]] = defaultdict(list)
+
+
+def on_model_change(*models: Type[SQLModel]) -> Callable[[ChangeListener], ChangeListener]:
+    """注册模型变更监听, ServiceBase保存、更新、删除对象并提交后调用, 不指定模型时监听所有模型.
+
+    使用方法:
+        @on_model_change(User, Role)
+        async def invalidate(model, ids): ...
+    """
+
+    def decorator(listener: ChangeListener) -> ChangeListener:
+        for model in models or (None,):
+            _change_listeners[model].append(listener)
+        return listener
+
+    return decorator
+
+
+async def notify_model_change(model: Type[SQLModel], ids: Iterable[Any]) -> None:
+    """通知模型变更, 监听函数出错时只记录日志, 不影响已经提交的业务."""
+    ids = list(ids)
+    for listener in (*_change_listeners.get(model, ()), *_change_listeners.get(None, ())):
+        try:
+            await listener(model, ids)
+        except Exception:  # noqa: PERF203
+            logger.warning("Model change listener %r failed", listener, exc_info=True)
+
+
+# 批量写入的数据, 可以是模型对象或者字典, 支持同步与异步迭代器
+BulkItems = Iterable[SQLModel | dict] | AsyncIterable[SQLModel | dict]
+
+
+async def iter_chunks(items: BulkItems, size: int) -> AsyncIterator[list[Any]]:
+    """将同步或异步迭代器按照size分块."""
+    chunk = []
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
 
 class ServiceBase(Generic[ModelType], ABC):
-    """基础服务类，提供服务公共方法."""
+    """基础服务类，提供服务公共方法.
+
+    模型的关联关系默认不加载, 需要关联对象的查询通过load_profiles中命名的加载方式指定, 例如:
+        load_profiles = {"role": (joinedload(User.role),)}
+        user = await user_service.get(id_, profile="role")
+    """
+
+    load_profiles: ClassVar[LoadProfiles] = {}
+    # upsert默认不更新的字段: 主键与创建时间保持原值, 软删除标记需要在update_fields中明确指定
+    upsert_excluded_fields: ClassVar[frozenset[str]] = frozenset(
+        ("id", "create_time", "is_deleted"),
+    )
 
     def __init__(self, model: Type[ModelType], session: Session) -> None:
         self.session = session
         self.model = model
 
-    async def get(self, id_: Optional[int] = None) -> ModelType | None:
-        """检索对象."""
-        statement = select(self.model).where(self.model.id == id_)
-        results = await self.session.exec(statement=statement)
-        return results.one_or_none()
+    def load_options(self, profile: Optional[str] = None) -> Sequence[ORMOption]:
+        """加载方式对应的查询选项, profile为None时不加载关联对象."""
+        if profile is None:
+            return ()
+        try:
+            return self.load_profiles[profile]
+        except KeyError:
+            msg = f"Unknown load profile {profile!r} for {type(self).__name__}"
+            raise ValueError(msg) from None
+
+    def loader(self, profile: Optional[str] = None) -> IdLoader[ModelType]:
+        """当前session中模型按照加载方式profile的批量加载器."""
+        return IdLoader.of(self.session, self.model, profile, self.load_options(profile))
+
+    async def get(
+        self,
+        id_: Optional[int] = None,
+        profile: Optional[str] = None,
+    ) -> ModelType | None:
+        """检索对象.
+
+        同一个事件循环周期内的多次调用(例如asyncio.gather)合并为一次查询,
+        同一个请求中检索过的对象不再重复查询。
+
+        :param id_: 对象ID
+        :param profile: 关联对象的加载方式, 见load_profiles
+        """
+        if id_ is None:
+            return None
+        return await self.loader(profile).load(id_)
+
+    async def get_many(
+        self,
+        ids: Iterable[int],
+        profile: Optional[str] = None,
+    ) -> list[ModelType | None]:
+        """按照ID批量检索对象, 结果与ids的顺序一致, 不存在的ID对应None."""
+        return await self.loader(profile).load_many(ids)
+
+    async def get_list(
+        self,
+        page: PageModel | CursorModel,
+        *criteria: ColumnElement[bool],
+        profile: Optional[str] = None,
+    ) -> list[ModelType]:
+        """分页检索对象列表, 并将总数、下一页游标等分页信息写入page.
+
+        page为PageModel时使用OFFSET/LIMIT分页并精确统计总数;
+        为CursorModel时按照(排序字段, id)游标分页, 总数按照page.count统计。
+
+        :param page: 分页参数
+        :param criteria: 查询条件
+        :param profile: 关联对象的加载方式, 见load_profiles
+        """
+        statement = select(self.model).where(*criteria).options(*self.load_options(profile))
+        if isinstance(page, PageModel):
+            statement = statement.offset(page.offset).limit(page.limit)
+            page.total = await self.count(*criteria)
+            results = await self.session.exec(statement)
+            return results.all()
+
+        key = getattr(self.model, page.sort)
+        id_column = self.model.id
+        position = page.position()
+        if position is not None:
+            key_value = self._cursor_value(key, position[0])
+            id_value = position[1]
+            if key is id_column:
+                seek = id_column < id_value if page.desc else id_column > id_value
+            elif page.desc:
+                seek = or_(key < key_value, and_(key == key_value, id_column < id_value))
+            else:
+                seek = or_(key > key_value, and_(key == key_value, id_column > id_value))
+            statement = statement.where(seek)
+
+        order_by = [key.desc() if page.desc else key.asc()]
+        if key is not id_column:
+            order_by.append(id_column.desc() if page.desc else id_column.asc())
+        statement = statement.order_by(*order_by).limit(page.limit)
+
+        page.total = await self.count(*criteria, mode=page.count)
+        results = await self.session.exec(statement)
+        return page.paginate(results.all())
+
+    async def count(self, *criteria: ColumnElement[bool], mode: CountMode = "exact") -> int | None:
+        """统计记录数.
+
+        mode为estimate时, 没有查询条件且数据库为MySQL/MariaDB时使用表的统计信息估算, 否则精确统计;
+        mode为none时不统计, 返回None。
+        """
+        if mode == "none":
+            return None
+        if mode == "estimate" and not criteria and self.session.get_bind().dialect.name == "mysql":
+            statement = text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name",
+            ).bindparams(table_name=self.model.__tablename__)
+            result = await self.session.execute(statement)
+            estimated = result.scalar_one_or_none()
+            if estimated is not None:
+                return int(estimated)
+
+        if criteria:
+            statement = select(func.count()).select_from(self.model).where(*criteria)
+        else:
+            statement = statement_templates.get(
+                (self.model, "count"),
+                lambda: select(func.count()).select_from(self.model),
+            )
+        result = await self.session.exec(statement)
+        return result.one()
+
+    async def version(
+        self,
+        *criteria: ColumnElement[bool],
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        count: bool = False,
+    ) -> ResourceVersion:
+        """轻量的版本查询, 用于条件请求: 只检索表的字段计算ETag, 不构造模型对象, 不序列化输出.
+
+        更新时间只精确到秒, 同一秒内的多次修改更新时间相同, 因此ETag由全部字段计算, 内容变化时
+        ETag一定变化。查询条件与分页参数应当与读取数据时相同。模型需要继承TimestampModel。
+
+        :param criteria: 查询条件
+        :param offset: 分页偏移
+        :param limit: 分页大小
+        :param count: 是否把总数计入版本, 输出中包含总数的分页列表需要
+        """
+        table = self.model.__table__
+        statement = select(table).where(*criteria).offset(offset).limit(limit)
+        rows = (await self.session.execute(statement)).all()
+        total = await self.count(*criteria) if count else None
+        return ResourceVersion(
+            make_etag(self.model.__tablename__, total, [tuple(row) for row in rows]),
+            max((row.update_time for row in rows), default=None),
+        )
+
+    def stream(
+        self,
+        fields: Iterable[str],
+        *criteria: ColumnElement[bool],
+        batch_size: int = settings.DB_STREAM_BATCH_SIZE,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """按照id顺序流式检索对象的部分字段, 每次产出batch_size行, 用于大批量导出.
+
+        使用服务端游标逐批读取, 内存占用与数据量无关; 只检索指定字段, 不构造模型对象。
+        流式响应在请求的session关闭之后才开始读取, 因此调用时即选择引擎(主库或只读副本),
+        读取时单独获取一个连接, 读取结束后归还。
+
+        :param fields: 检索的字段名
+        :param criteria: 查询条件
+        :param batch_size: 每批行数
+        """
+        statement = (
+            select(*(getattr(self.model, field) for field in fields))
+            .where(*criteria)
+            .order_by(self.model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        engine = AsyncEngine(self.session.get_bind(clause=statement))
+        return self._stream(engine, statement)
+
+    @staticmethod
+    async def _stream(engine: AsyncEngine, statement: Select) -> AsyncIterator[Sequence[Row]]:
+        async with engine.connect() as connection:
+            result = await connection.stream(statement)
+            async for rows in result.partitions():
+                yield rows
+
+    @staticmethod
+    def _cursor_value(column: Any, value: Any) -> Any:  # noqa: ANN401
+        """将游标中的JSON值转换为字段的Python类型."""
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return value
+        try:
+            if value is None or isinstance(value, python_type):
+                return value
+            if python_type is datetime:
+                return datetime.fromisoformat(value)
+            if python_type is date:
+                return date.fromisoformat(value)
+            if python_type is Decimal:
+                return Decimal(str(value))
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursorException from exc
+        return value
 
     async def save(self, obj: ModelType) -> ModelType:
         """对象保存."""
-        self.session.add(obj)
-        await self.commit_or_rollback()
+        async with self._writing():
+            self.session.add(obj)
+            await self.commit_or_rollback()
         await self.session.refresh(obj)
-        return self
+        await self.notify_change([obj.id])
+        return obj
 
     async def delete(self, obj: ModelType, commit: bool = True) -> None:
         """对象删除."""
-        await self.session.delete(obj)
-        if commit:
+        if not commit:
+            await self.session.delete(obj)
+            return
+        async with self._writing():
+            await self.session.delete(obj)
             await self.commit_or_rollback()
+        await self.notify_change([obj.id])
 
     async def delete_by_id(self, id_: int) -> None:
         """按ID删除."""
         statement = delete(self.model).where(self.model.id == id_)
 
-        await self.session.exec(statement=statement)
-        await self.session.commit()
+        async with self._writing():
+            await self.session.exec(statement=statement)
+            await self.commit_or_rollback()
+        await self.notify_change([id_])
 
     async def update(self, obj: ModelType, **kwargs) -> ModelType:  # noqa: ANN003
         """对象更新."""
-        required_commit = False
-        for k, v in kwargs.items():
-            if hasattr(obj, k) and getattr(obj, k) != v:
-                required_commit = True
-                setattr(obj, k, v)
-        if required_commit:
-            await self.commit_or_rollback()
+        changes = {k: v for k, v in kwargs.items() if hasattr(obj, k) and getattr(obj, k) != v}
+        if changes:
+            async with self._writing():
+                for k, v in changes.items():
+                    setattr(obj, k, v)
+                await self.commit_or_rollback()
+            await self.notify_change([obj.id])
         return obj
 
-    async def add_or_update(self, obj: ModelType, where: str, **kwargs) -> ModelType:  # noqa: ANN003
-        """新增或更新."""
-        record = self.session.query.filter_by(**where).first()
+    async def add_or_update(self, where: dict, **kwargs) -> ModelType:  # noqa: ANN003
+        """按照where条件检索对象, 存在时更新, 不存在时新增."""
+        statement = select(self.model).filter_by(**where)
+        results = await self.session.exec(statement=statement)
+        record = results.first()
         if record:
-            await record.update(record, **kwargs)
+            return await self.update(record, **kwargs)
+        return await self.save(self.model(**where, **kwargs))
+
+    def _to_rows(self, items: list[SQLModel | dict]) -> list[list[dict]]:
+        """批量写入的数据转换为字典, 并按照字段分组.
+
+        多行VALUES要求每行字段相同: 连续的字段相同的数据为一组, 每组生成一条语句,
+        分组保持数据的顺序; 缺少的字段不补值, 由数据库使用默认值。
+        部分数据没有设置主键时, 主键写入NULL由数据库自动分配; 全部没有设置时不写入主键。
+        """
+        rows = [dict(item) if isinstance(item, dict) else item.model_dump() for item in items]
+        if all(row.get("id") is None for row in rows):
+            for row in rows:
+                row.pop("id", None)
         else:
-            record = await self.save(ModelType(**kwargs))
-        return record
+            for row in rows:
+                row.setdefault("id", None)
+        return [list(group) for _, group in groupby(rows, key=lambda row: row.keys())]
+
+    async def bulk_insert(
+        self,
+        items: BulkItems,
+        chunk_size: int = settings.DB_BULK_CHUNK_SIZE,
+        commit: bool = True,
+    ) -> list[int]:
+        """批量新增, 每chunk_size条数据生成多行INSERT语句, 按照数据的顺序返回新增记录的ID.
+
+        数据库支持RETURNING(MariaDB 10.5+)时直接返回ID, 否则根据lastrowid推算:
+        假定一条多行INSERT分配的自增ID是连续的, 只在innodb_autoinc_lock_mode为0或1时成立;
+        为2(MySQL 8的默认值)或者使用Galera集群时推算的ID可能不正确,
+        需要准确的ID时请使用支持RETURNING的数据库, 或者逐条save。
+        """
+        table = self.model.__table__
+        dialect = self.session.get_bind().dialect
+        ids: list[int] = []
+        async with self._writing():
+            async for chunk in iter_chunks(items, chunk_size):
+                for rows in self._to_rows(chunk):
+                    statement = insert(table).values(rows)
+                    if dialect.insert_returning:
+                        result = await self.session.execute(statement.returning(table.c.id))
+                        ids.extend(result.scalars().all())
+                    else:
+                        result = await self.session.execute(statement)
+                        ids.extend(range(result.lastrowid, result.lastrowid + len(rows)))
+            if commit:
+                await self.commit_or_rollback()
+        if commit:
+            await self.notify_change(ids)
+        return ids
+
+    async def bulk_update(
+        self,
+        items: BulkItems,
+        chunk_size: int = settings.DB_BULK_CHUNK_SIZE,
+        commit: bool = True,
+    ) -> list[int]:
+        """批量按ID更新, 每条数据必须包含id, 只更新数据中出现的字段, 返回更新记录的ID.
+
+        每chunk_size条数据生成一条 UPDATE ... SET k = CASE id WHEN ... END WHERE id IN (...) 语句。
+        """
+        table = self.model.__table__
+        ids: list[int] = []
+        async with self._writing():
+            async for chunk in iter_chunks(items, chunk_size):
+                rows = [
+                    dict(item) if isinstance(item, dict) else item.model_dump(exclude_unset=True)
+                    for item in chunk
+                ]
+                chunk_ids = [row["id"] for row in rows]
+                columns = {key for row in rows for key in row if key != "id"}
+                values = {
+                    key: case(
+                        {row["id"]: row[key] for row in rows if key in row},
+                        value=table.c.id,
+                        else_=table.c[key],
+                    )
+                    for key in columns
+                }
+                if values:
+                    statement = update(table).where(table.c.id.in_(chunk_ids)).values(values)
+                    await self.session.execute(statement)
+                ids.extend(chunk_ids)
+            if commit:
+                await self.commit_or_rollback()
+        if commit:
+            await self.notify_change(ids)
+        return ids
+
+    async def upsert(
+        self,
+        items: BulkItems,
+        update_fields: Optional[Iterable[str]] = None,
+        conflict_fields: Iterable[str] = ("id",),
+        chunk_size: int = settings.DB_BULK_CHUNK_SIZE,
+        commit: bool = True,
+    ) -> list[int]:
+        """批量新增或更新, MariaDB使用 INSERT ... ON DUPLICATE KEY UPDATE.
+
+        :param items: 数据
+        :param update_fields: 冲突时更新的字段,
+            默认为每条数据中除upsert_excluded_fields(id, 创建时间, 软删除标记)以外的全部字段
+        :param conflict_fields: 判断冲突的唯一索引字段, MariaDB根据所有唯一索引判断冲突,
+            不支持RETURNING时使用这些字段检索写入记录的ID
+        :param chunk_size: 每条INSERT语句的数据条数
+        :param commit: 是否提交
+        :return: 新增或更新记录的ID. 数据库不支持RETURNING并且conflict_fields只有id时,
+            新增记录没有ID可以检索, 只返回数据中带有的ID(新增记录也不会发送变更通知)
+        """
+        table = self.model.__table__
+        dialect = self.session.get_bind().dialect
+        conflict_fields = list(conflict_fields)
+        ids: list[int] = []
+        async with self._writing():
+            async for chunk in iter_chunks(items, chunk_size):
+                for rows in self._to_rows(chunk):
+                    statement = self._upsert_statement(rows, update_fields, conflict_fields)
+                    if dialect.insert_returning:
+                        result = await self.session.execute(statement.returning(table.c.id))
+                        ids.extend(result.scalars().all())
+                    else:
+                        await self.session.execute(statement)
+                        ids.extend(await self._written_ids(rows, conflict_fields))
+            if commit:
+                await self.commit_or_rollback()
+        if commit:
+            await self.notify_change(ids)
+        return ids
+
+    def _upsert_statement(
+        self,
+        rows: list[dict],
+        update_fields: Optional[Iterable[str]],
+        conflict_fields: list[str],
+    ) -> Executable:
+        """一组字段相同的数据的 INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE 语句."""
+        table = self.model.__table__
+        dialect = self.session.get_bind().dialect
+        fields = (
+            list(update_fields)
+            if update_fields is not None
+            else [key for key in rows[0] if key not in self.upsert_excluded_fields]
+        )
+        if dialect.name == "mysql":
+            statement = mysql.insert(table).values(rows)
+            return statement.on_duplicate_key_update(
+                {key: statement.inserted[key] for key in fields},
+            )
+        if dialect.name in ("postgresql", "sqlite"):
+            module = postgresql if dialect.name == "postgresql" else sqlite
+            statement = module.insert(table).values(rows)
+            return statement.on_conflict_do_update(
+                index_elements=conflict_fields,
+                set_={key: statement.excluded[key] for key in fields},
+            )
+        msg = f"upsert is not supported by {dialect.name}"
+        raise NotImplementedError(msg)
+
+    async def _written_ids(self, rows: list[dict], conflict_fields: list[str]) -> list[int]:
+        """不支持RETURNING时, 按照conflict_fields检索upsert写入记录的ID."""
+        if conflict_fields == ["id"] or not all(key in rows[0] for key in conflict_fields):
+            return [row["id"] for row in rows if row.get("id") is not None]
+        table = self.model.__table__
+        columns = [table.c[key] for key in conflict_fields]
+        values = [tuple(row[key] for key in conflict_fields) for row in rows]
+        if len(columns) == 1:
+            condition = columns[0].in_([value[0] for value in values])
+        else:
+            condition = tuple_(*columns).in_(values)
+        result = await self.session.execute(select(table.c.id).where(condition))
+        return list(result.scalars().all())
 
     async def commit_or_rollback(self) -> None:
-        """提交或回滚."""
+        """提交或回滚.
+
+        session属于请求级工作单元时只flush, 写入检查(例如唯一索引冲突)立即生效,
+        提交推迟到请求结束时统一执行。出错时在SAVEPOINT中(_writing)由SAVEPOINT回滚这次写入,
+        否则回滚整个事务, 并清除工作单元中已经无效的提交请求与变更记录。
+        """
+        uow = UnitOfWork.current(self.session)
         try:
-            await self.session.commit()
+            if uow is None:
+                await self.session.commit()
+            else:
+                await self.session.flush()
+                uow.request_commit()
+        except Exception:
+            if not self.session.in_nested_transaction():
+                await self.session.rollback()
+                if uow is not None:
+                    uow.discard()
+            raise
+
+    @asynccontextmanager
+    async def _writing(self) -> AsyncIterator[None]:
+        """写入出错时回滚.
+
+        session属于请求级工作单元时在SAVEPOINT中写入, 出错只回滚这次写入,
+        请求中之前的写入以及工作单元的状态不受影响; 否则回滚整个事务。
+        """
+        if UnitOfWork.current(self.session) is not None:
+            async with self.session.begin_nested():
+                yield
+            return
+        try:
+            yield
         except Exception:
             await self.session.rollback()
             raise
+
+    async def notify_change(self, ids: Iterable[Any]) -> None:
+        """通知模型变更, session属于请求级工作单元时推迟到提交之后."""
+        ids = list(ids)
+        IdLoader.forget(self.session, self.model, ids)
+        uow = UnitOfWork.current(self.session)
+        if uow is None:
+            await notify_model_change(self.model, ids)
+        else:
+            uow.record_change(self.model, list(ids))
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import wraps
+from time import perf_counter_ns
+from typing import Any, ClassVar, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class ServerTiming:
+    """单个请求的各阶段耗时统计, 单位为纳秒.
+
+    输出为 Server-Timing 响应头, 参考 https://www.w3.org/TR/server-timing/
+    """
+
+    # 阶段名称与说明, 同时决定响应头中的输出顺序
+    phases: ClassVar[dict[str, str]] = {
+        "dep": "auth/dependencies",
+        "app": "handler",
+        "db": "database",
+        "redis": "redis",
+        "ser": "serialization",
+    }
+
+    def __init__(self) -> None:
+        self.start = perf_counter_ns()
+        self.durations: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+        self.endpoint_start: Optional[int] = None
+        self.endpoint_end: Optional[int] = None
+
+    def record(self, name: str, duration: int) -> None:
+        """累计某个阶段的耗时."""
+        self.durations[name] = self.durations.get(name, 0) + duration
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def record_route(self, handler_start: int, handler_end: int) -> None:
+        """根据路由处理与endpoint执行的时间点, 拆分出依赖解析、业务处理与序列化耗时."""
+        if self.endpoint_start is None or self.endpoint_end is None:
+            return
+        self.record("dep", self.endpoint_start - handler_start)
+        self.record("app", self.endpoint_end - self.endpoint_start)
+        self.record("ser", handler_end - self.endpoint_end)
+
+    def elapsed(self) -> int:
+        """请求开始至今的耗时."""
+        return perf_counter_ns() - self.start
+
+    def header(self) -> str:
+        """生成Server-Timing响应头, dur单位为毫秒."""
+        metrics = []
+        for name, desc in self.phases.items():
+            if name in self.durations:
+                # 数据库与redis阶段附带调用次数
+                detail = f"{desc} x{self.counts[name]}" if name in ("db", "redis") else desc
+                metrics.append(f'{name};dur={self.durations[name] / 1e6:.3f};desc="{detail}"')
+        metrics.append(f"total;dur={self.elapsed() / 1e6:.3f}")
+        return ", ".join(metrics)
+
+
+_current_timing: ContextVar[Optional[ServerTiming]] = ContextVar("server_timing", default=None)
+
+
+def current_timing() -> Optional[ServerTiming]:
+    """当前请求的耗时统计, 不在请求中时为None."""
+    return _current_timing.get()
+
+
+def start_timing() -> tuple[ServerTiming, Token]:
+    """为当前请求开始耗时统计."""
+    timing = ServerTiming()
+    return timing, _current_timing.set(timing)
+
+
+def stop_timing(token: Token) -> None:
+    """结束当前请求的耗时统计."""
+    _current_timing.reset(token)
+
+
+def record(name: str, duration: int) -> None:
+    """累计当前请求某个阶段的耗时, 不在请求中时忽略."""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.record(name, duration)
+
+
+@contextmanager
+def measure(name: str) -> Iterator[None]:
+    """统计代码块耗时, 计入当前请求的name阶段."""
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(name, perf_counter_ns() - start)
+
+
+def _timed_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    """记录endpoint开始与结束的时间点."""
+    if asyncio.iscoroutinefunction(call):
+
+        @wraps(call)
+        async def async_endpoint(**kwargs: Any) -> Any:  # noqa: ANN401
+            timing = _current_timing.get()
+            if timing is None:
+                return await call(**kwargs)
+            timing.endpoint_start = perf_counter_ns()
+            try:
+                return await call(**kwargs)
+            finally:
+                timing.endpoint_end = perf_counter_ns()
+
+        return async_endpoint
+
+    @wraps(call)
+    def sync_endpoint(**kwargs: Any) -> Any:  # noqa: ANN401
+        timing = _current_timing.get()
+        if timing is None:
+            return call(**kwargs)
+        timing.endpoint_start = perf_counter_ns()
+        try:
+            return call(**kwargs)
+        finally:
+            timing.endpoint_end = perf_counter_ns()
+
+    return sync_endpoint
+
+
+class TimedRoute(APIRoute):
+    """记录依赖解析、endpoint执行与响应序列化耗时的路由类.
+
+    使用方法: APIRouter(route_class=TimedRoute)
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:  # noqa: D102
+        self.dependant.call = _timed_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def timed_route_handler(request: Request) -> Response:
+            timing = _current_timing.get()
+            if timing is None:
+                return await handler(request)
+            start = perf_counter_ns()
+            response = await handler(request)
+            timing.record_route(start, perf_counter_ns())
+            return response
+
+        return timed_route_handler
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """通过SQLAlchemy事件统计SQL执行耗时, 计入当前请求的db阶段."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        context._server_timing_start = perf_counter_ns()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+        record("db", perf_counter_ns() - context._server_timing_start)
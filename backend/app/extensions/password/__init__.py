@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from ...config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def hash_password(raw_password: str, rounds: int) -> str:
+    """bcrypt加密密码(同步, 耗时操作)."""
+    return bcrypt.hashpw(raw_password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def check_password(raw_password: str, hashed_password: str) -> bool:
+    """bcrypt验证密码(同步, 耗时操作)."""
+    try:
+        return bcrypt.checkpw(raw_password.encode(), hashed_password.encode())
+    except ValueError:
+        # 数据库中的密码不是合法的bcrypt格式
+        return False
+
+
+def password_rounds(hashed_password: str) -> Optional[int]:
+    """bcrypt密码的cost, 格式为 $2b$12$..., 无法解析时返回None."""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():  # noqa: PLR2004
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """在独立的线程池中执行bcrypt加密与验证, 避免阻塞事件循环.
+
+    bcrypt计算时会释放GIL, 线程池可以利用多核。等待执行的任务超过max_pending时直接返回503,
+    以免登录请求堆积导致所有请求超时。
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, rounds: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """线程池, 第一次使用时创建."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hasher",
+            )
+        return self._executor
+
+    async def run(self, func: Callable[[], T]) -> T:
+        """在线程池中执行, 排队的任务过多时返回503."""
+        if self.pending >= self.max_pending:
+            logger.warning("Password hasher overloaded, %d tasks pending", self.pending)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙, 请稍后再试",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, raw_password: str) -> str:
+        """加密密码."""
+        return await self.run(partial(hash_password, raw_password, self.rounds))
+
+    async def verify(self, raw_password: str, hashed_password: str) -> bool:
+        """验证密码."""
+        return await self.run(partial(check_password, raw_password, hashed_password))
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """密码的cost低于当前配置时需要重新加密."""
+        rounds = password_rounds(hashed_password)
+        return rounds is not None and rounds < self.rounds
+
+    def shutdown(self) -> None:
+        """关闭线程池."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+__all__ = ["PasswordHasher", "check_password", "hash_password", "password_hasher"]
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import uuid
+from collections import OrderedDict
+from time import monotonic
+from typing import Literal, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from jose import jwt
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+
+from ...config import settings
+
+logger = logging.getLogger(__name__)
+
+# 令牌桶: 按照时间补充令牌, 每个请求消耗一个令牌
+# KEYS[1] 桶的key, ARGV[1] 桶容量, ARGV[2] 补满整个桶所需毫秒数
+# 返回 {是否允许, 剩余令牌数, 需要等待的毫秒数}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + (now - ts) * capacity / period)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) * period / capacity)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], period)
+return {allowed, math.floor(tokens), wait}
+"""  # noqa: S105
+
+# 滑动窗口日志: 记录窗口内每个请求的时间, 超过数量则拒绝
+# KEYS[1] 日志的key, ARGV[1] 窗口内最大请求数, ARGV[2] 窗口毫秒数, ARGV[3] 本次请求的唯一标识
+# 返回 {是否允许, 剩余请求数, 需要等待的毫秒数}
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, tonumber(oldest[2]) + window - now}
+"""
+
+# 预先计算脚本sha, 执行时使用EVALSHA, 服务端没有缓存脚本时自动加载
+_scripts = {
+    "token_bucket": AsyncScript(None, TOKEN_BUCKET_SCRIPT.encode()),
+    "sliding_window": AsyncScript(None, SLIDING_WINDOW_SCRIPT.encode()),
+}
+
+
+class LocalBlocklist:
+    """本地预过滤, 记录被Redis拒绝的key以及解封时间.
+
+    在解封时间之前的请求必然也会被拒绝, 可以直接在本地拒绝而不用访问Redis。
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._blocked: OrderedDict[str, float] = OrderedDict()
+
+    def retry_after(self, key: str) -> float:
+        """key被封禁的剩余秒数, 未封禁时返回0."""
+        until = self._blocked.get(key)
+        if until is None:
+            return 0
+        remain = until - monotonic()
+        if remain <= 0:
+            del self._blocked[key]
+            return 0
+        return remain
+
+    def block(self, key: str, seconds: float) -> None:
+        """封禁key若干秒."""
+        self._blocked[key] = monotonic() + seconds
+        self._blocked.move_to_end(key)
+        while len(self._blocked) > self.maxsize:
+            self._blocked.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空封禁记录."""
+        self._blocked.clear()
+
+
+local_blocklist = LocalBlocklist(settings.RATE_LIMIT_LOCAL_SIZE)
+
+
+def client_identity(request: Request, scope: Literal["ip", "user"]) -> str:
+    """限流对象的标识, 按用户限流时从JWT中获取用户名, 未登录的请求按IP限流."""
+    if scope == "user":
+        authorization = request.headers.get("Authorization", "")
+        if authorization.lower().startswith("bearer "):
+            try:
+                payload = jwt.decode(
+                    authorization[7:],
+                    settings.JWT_SECRET_KEY,
+                    algorithms=settings.JWT_ALGORITHM,
+                )
+                return f"user:{payload.get('sub')}"
+            except jwt.JWTError:
+                pass
+    return f"ip:{request.client.host if request.client else ''}"
+
+
+class RateLimiter:
+    """基于Redis的分布式限流, 作为FastAPI依赖使用.
+
+    使用方法: dependencies=[Depends(RateLimiter(times=10, seconds=60))]
+    """
+
+    def __init__(
+        self,
+        times: int,
+        seconds: int,
+        algorithm: Literal["token_bucket", "sliding_window"] = "token_bucket",
+        scope: Literal["ip", "user"] = "ip",
+        name: Optional[str] = None,
+    ) -> None:
+        """初始化.
+
+        :param times: 时间窗口内允许的请求数(令牌桶容量)
+        :param seconds: 时间窗口秒数(补满令牌桶的时间)
+        :param algorithm: 限流算法, 令牌桶允许突发, 滑动窗口日志严格限制窗口内的请求数
+        :param scope: 按IP或者按用户限流
+        :param name: 限流名称, 多个路由使用相同名称时共享配额, 默认每个路由单独计数
+        """
+        self.times = times
+        self.period = seconds * 1000
+        self.algorithm = algorithm
+        self.scope = scope
+        self.name = name
+
+    def build_key(self, request: Request) -> str:
+        """限流key: 前缀:名称:限流对象."""
+        name = self.name
+        if name is None:
+            endpoint = request.scope.get("endpoint")
+            name = (
+                f"{endpoint.__module__}.{endpoint.__qualname__}" if endpoint else request.url.path
+            )
+        return f"{settings.RATE_LIMIT_PREFIX}:{name}:{client_identity(request, self.scope)}"
+
+    async def hit(self, request: Request, key: str) -> tuple[bool, int, int]:
+        """在Redis中原子地执行限流算法, 返回 (是否允许, 剩余次数, 需要等待的毫秒数)."""
+        args = [self.times, self.period]
+        if self.algorithm == "sliding_window":
+            args.append(uuid.uuid4().hex)
+        allowed, remaining, wait = await _scripts[self.algorithm](
+            keys=[key],
+            args=args,
+            client=request.app.state.redis,
+        )
+        return bool(allowed), int(remaining), int(wait)
+
+    async def __call__(self, request: Request, response: Response) -> None:
+        """限流检查, 超过限制时返回429."""
+        if not settings.RATE_LIMIT_ENABLED or getattr(request.app.state, "redis", None) is None:
+            return
+
+        key = self.build_key(request)
+        retry_after = local_blocklist.retry_after(key)
+        if not retry_after:
+            try:
+                allowed, remaining, wait = await self.hit(request, key)
+            except RedisError:
+                # Redis不可用时不限流, 以免影响正常业务
+                logger.warning("Rate limit check failed for %s", key, exc_info=True)
+                return
+            if allowed:
+                response.headers["X-RateLimit-Limit"] = str(self.times)
+                response.headers["X-RateLimit-Remaining"] = str(remaining)
+                return
+            retry_after = wait / 1000
+            local_blocklist.block(key, retry_after)
+
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过于频繁, 请稍后再试",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+__all__ = ["LocalBlocklist", "RateLimiter", "local_blocklist"]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+
+from ...config import settings
+from .json import CustomJsonEncoder, JsonSerializer, OrjsonSerializer, json_default, orjson
+
+# 已注册的序列化后端
+_serializers: dict[str, JsonSerializer] = {JsonSerializer.name: JsonSerializer()}
+if orjson is not None:
+    _serializers[OrjsonSerializer.name] = OrjsonSerializer()
+
+
+def register_serializer(serializer: JsonSerializer) -> None:
+    """注册序列化后端, 同名后端会被覆盖."""
+    _serializers[serializer.name] = serializer
+
+
+def get_serializer(name: Optional[str] = None) -> JsonSerializer:
+    """获取序列化后端.
+
+    name为空时使用配置项JSON_SERIALIZER, auto表示优先使用orjson, 未安装时使用标准库。
+    """
+    name = name or settings.JSON_SERIALIZER
+    if name == "auto":
+        name = OrjsonSerializer.name if OrjsonSerializer.name in _serializers else "stdlib"
+    return _serializers[name]
+
+
+__all__ = [
+    "CustomJsonEncoder",
+    "JsonSerializer",
+    "OrjsonSerializer",
+    "get_serializer",
+    "json_default",
+    "register_serializer",
+]
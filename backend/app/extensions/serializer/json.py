@@ -3,20 +3,122 @@
 import datetime
 import decimal
 import json
+import math
+import re
+from typing import Any, Callable, ClassVar, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def json_default(obj):  # noqa: ANN001, ANN201
+    """非JSON原生类型的转换规则, 各序列化后端共用."""
+    if hasattr(obj, "keys") and hasattr(obj, "__getitem__"):
+        return dict(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(obj, datetime.date):
+        return obj.strftime("%Y-%m-%d")
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return str(obj, encoding="utf-8")
+    msg = f"Object of type {obj.__class__.__name__} is not JSON serializable"
+    raise TypeError(msg)
+
+
+def chain_default(fallback: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """先使用json_default转换, 不支持的类型再交给fallback处理."""
+
+    def default(obj):  # noqa: ANN001, ANN202
+        try:
+            return json_default(obj)
+        except TypeError:
+            return fallback(obj)
+
+    return default
+
+
+def has_non_finite(obj: Any) -> bool:  # noqa: ANN401
+    """dict/list/tuple中是否包含NaN/Infinity浮点数."""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_non_finite(value) for value in obj)
+    return False
+
+
+def finite_default(default: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """default转换的结果中包含NaN/Infinity时抛出ValueError."""
+
+    def checked(obj):  # noqa: ANN001, ANN202
+        value = default(obj)
+        if has_non_finite(value):
+            msg = "Out of range float values are not JSON compliant"
+            raise ValueError(msg)
+        return value
+
+    return checked
 
 
 class CustomJsonEncoder(json.JSONEncoder):
     """自定义JSON格式化."""
 
     def default(self, obj):  # noqa: D102, ANN001, ANN201
-        if hasattr(obj, "keys") and hasattr(obj, "__getitem__"):
-            return dict(obj)
-        if isinstance(obj, datetime.datetime):
-            return obj.strftime("%Y-%m-%d %H:%M:%S")
-        if isinstance(obj, datetime.date):
-            return obj.strftime("%Y-%m-%d")
-        if isinstance(obj, decimal.Decimal):
-            return float(obj)
-        if isinstance(obj, bytes):
-            return str(obj, encoding="utf-8")
-        return json.JSONEncoder.default(self, obj)
+        return json_default(obj)
+
+
+class JsonSerializer:
+    """标准库json序列化后端, 输出紧凑的UTF-8字节."""
+
+    name: ClassVar[str] = "stdlib"
+
+    def dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:  # noqa: ANN401
+        """序列化为JSON字节, default用于处理json_default不支持的类型."""
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            cls=CustomJsonEncoder,
+            default=chain_default(default) if default else None,
+        ).encode("utf-8")
+
+    def loads(self, data: bytes | str) -> Any:  # noqa: ANN401
+        """反序列化JSON."""
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """orjson序列化后端, 输出与JsonSerializer逐字节一致.
+
+    orjson与标准库在指数形式的浮点数(如1e-05与1e-5)、非字符串key、超过64位的整数上表现不同,
+    遇到这些情况时退回标准库重新序列化。orjson把NaN/Infinity输出为null, 输出中有null时检查数据,
+    包含NaN/Infinity时同样退回标准库, 与标准库一样抛出ValueError。
+    """
+
+    name: ClassVar[str] = "orjson"
+
+    # 可能与标准库输出不一致的浮点数: 指数形式或者0.0000开头的小数
+    float_pattern: ClassVar[re.Pattern] = re.compile(rb"(?:^|[:,\[])-?(?:\d+(?:\.\d+)?e|0\.0000)")
+
+    def dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:  # noqa: ANN401, D102
+        try:
+            data = orjson.dumps(
+                obj,
+                default=finite_default(chain_default(default) if default else json_default),
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            return super().dumps(obj, default)
+        if self.float_pattern.search(data) or (b"null" in data and has_non_finite(obj)):
+            return super().dumps(obj, default)
+        return data
+
+    def loads(self, data: bytes | str) -> Any:  # noqa: ANN401, D102
+        return orjson.loads(data)
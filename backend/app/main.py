@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -7,9 +8,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .apis import api_router, base_router
 from .config import settings
+from .extensions.fastapi.compression import CompressionMiddleware
 from .extensions.fastapi.exception import register_global_exception
 from .extensions.fastapi.middleware import MetaDataAdderMiddleware, TimingMiddleware
-from .models import init_db
+from .extensions.password import password_hasher
+from .models import init_db, replica_set
 from .models.redis import build_redis_cache
 
 
@@ -19,10 +22,25 @@ async def lifespan(application: FastAPI):  # noqa: ANN201
     # 创建数据库表(如果尚未创建)
     await init_db()
 
+    # 只读副本健康检查
+    monitor = None
+    if replica_set is not None:
+        monitor = asyncio.create_task(
+            replica_set.monitor(
+                settings.DB_REPLICA_HEALTH_INTERVAL,
+                settings.DB_REPLICA_HEALTH_TIMEOUT,
+            ),
+        )
+
     async with build_redis_cache(settings) as client:
         app.state.redis = client
         yield
 
+    if monitor is not None:
+        monitor.cancel()
+        await replica_set.dispose()
+    password_hasher.shutdown()
+
 
 # 创建 FastAPI 应用实例
 app = FastAPI(
@@ -35,10 +53,14 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# 添加api运行计时中间件
-app.add_middleware(TimingMiddleware)
 # 添加元数据中间件（统一API输出结构）
 app.add_middleware(MetaDataAdderMiddleware)
+# 添加响应压缩中间件, 放在元数据中间件外层, 压缩包装之后的完整响应体
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+# 添加api运行计时中间件, 放在元数据中间件外层, 以便统计完整的请求耗时
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(TimingMiddleware)
 # 添加 CORS 中间件
 app.add_middleware(
     CORSMiddleware,
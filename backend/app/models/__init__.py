@@ -1,32 +1,94 @@
 # -*- coding: utf-8 -*-
 
 from collections.abc import AsyncGenerator
+from typing import Any
 
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession as Session
 
 from ..config import settings
+from ..extensions.database import (
+    AdaptiveLimiter,
+    InstrumentedPool,
+    ReplicaSet,
+    RoutingSession,
+    instrument_pool,
+    unit_of_work,
+)
+from ..extensions.fastapi.service import notify_model_change
+from ..extensions.fastapi.timing import instrument_engine
 from .resource import *  # noqa: F403
 from .role import *  # noqa: F403
 from .user import *  # noqa: F403
 
-# 采用配置变量创建数据库引擎
-async_engine = create_async_engine(
-    settings.AIO_MARIADB_DATABASE_URI.unicode_string(),
-    echo=settings.DB_ENABLE_ECHO,
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_POOL_OVERFLOW,
-    future=True,
-)
 
-async_session = sessionmaker(async_engine, class_=Session, expire_on_commit=False)
+def create_engine(url: str, name: str, **kwargs: Any) -> AsyncEngine:  # noqa: ANN401
+    """采用配置变量创建数据库引擎, 统计SQL耗时(Server-Timing)与连接池状态.
+
+    :param url: 数据库连接
+    :param name: 连接池统计中的名称
+    """
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ENABLE_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        poolclass=InstrumentedPool,
+        **kwargs,
+    )
+    # 统计SQL耗时, 输出到Server-Timing响应头
+    instrument_engine(engine)
+    limiter = None
+    if settings.DB_POOL_ADAPTIVE:
+        limiter = AdaptiveLimiter(
+            settings.DB_POOL_SIZE + settings.DB_POOL_OVERFLOW,
+            settings.DB_POOL_ADAPTIVE_MIN,
+            settings.DB_POOL_TARGET_LATENCY,
+        )
+    instrument_pool(engine, name, limiter)
+    return engine
+
+
+async_engine = create_engine(settings.AIO_MARIADB_DATABASE_URI.unicode_string(), "primary")
+
+# 只读副本, 没有配置时所有查询都发送到主库
+replica_set = None
+if settings.DB_REPLICAS:
+    replica_set = ReplicaSet(
+        [
+            (
+                create_engine(
+                    replica.dsn.unicode_string(),
+                    f"replica:{replica.dsn.host}:{replica.dsn.port}",
+                    pool_pre_ping=True,
+                ),
+                replica.weight,
+            )
+            for replica in settings.DB_REPLICAS
+        ],
+        sticky_seconds=settings.DB_REPLICA_STICKY_SECONDS,
+    )
+
+async_session = sessionmaker(
+    async_engine,
+    class_=Session,
+    sync_session_class=RoutingSession,
+    replicas=replica_set,
+    expire_on_commit=False,
+)
 
 
 async def get_session() -> AsyncGenerator[Session, None, None]:
-    """获取数据库访问session."""
-    async with async_session() as session:
+    """获取数据库访问session.
+
+    一个请求中的所有服务共用一个session(请求级工作单元): 首次查询时才获取连接,
+    请求中的写入在请求结束时一次提交, 出错时全部回滚。
+    """
+    async with async_session() as session, unit_of_work(session, notify_model_change):
         yield session
 
 
@@ -1,187 +1,215 @@
 # -*- coding: utf-8 -*-
 
-from sqlmodel import Select, SelectOfScalar, func, select
+import asyncio
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
 
-from . import async_session, init_db
+from sqlalchemy import insert
+from sqlmodel import select
+
+from ..config import settings
+from ..extensions.password import PasswordHasher
+from ..services.resource import ResourceService
+from ..services.role import RoleService
+from ..services.user import UserService
+from . import Session, async_session, init_db
 from .resource import Resource
-from .role import Role
+from .role import Role, RoleResourceLink
 from .user import User
 
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None
 
-async def init_data() -> None:  # noqa: C901, PLR0915, PLR0912
-    """初始化表数据."""
-    await init_db()
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "seed.yaml"
 
-    async with async_session() as session:
-        # 新增资源
-
-        def get_select_resource_stmt(name: str) -> Select | SelectOfScalar:
-            return select(func.count(Resource.id)).where(Resource.name == name)
-
-        resource1 = resource2 = resource3 = resource4 = resource5 = None
-        resource6 = resource7 = resource8 = resource9 = resource10 = None
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource1 = Resource(
-                name="仪表盘",
-                level=1,
-                pid=0,
-                icon="VBr0B.png",
-                menu_url="/dashboard",
-                request_url="/",
-                permission_code="",
-            )
-            session.add(resource1)
-            session.refresh(resource1)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource2 = Resource(
-                name="系统管理",
-                level=0,
-                pid=0,
-                icon="VBr0B.png",
-                menu_url="/system/index",
-                request_url="/system",
-                permission_code="sys",
-            )
-            session.add(resource2)
-            session.refresh(resource2)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource3 = Resource(
-                name="用户管理",
-                level=1,
-                pid=2,
-                icon="VBclq.png",
-                menu_url="/system/user",
-                request_url="/user",
-                permission_code="sys:user",
-            )
-            session.add(resource3)
-            session.refresh(resource3)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource4 = Resource(
-                name="用户列表",
-                level=2,
-                pid=3,
-                request_url="/user/list",
-                permission_code="sys:user:list",
-            )
-            session.add(resource4)
-            session.refresh(resource4)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource5 = Resource(
-                name="新增用户",
-                level=2,
-                pid=3,
-                request_url="/user/add",
-                permission_code="sys:user:add",
-            )
-            session.add(resource5)
-            session.refresh(resource5)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource6 = Resource(
-                name="编辑用户",
-                level=2,
-                pid=3,
-                request_url="/user/update",
-                permission_code="sys:user:update",
-            )
-            session.add(resource6)
-            session.refresh(resource6)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource7 = Resource(
-                name="角色管理",
-                level=1,
-                pid=2,
-                icon="VBsBc.png",
-                menu_url="/system/role",
-                request_url="/role",
-                permission_code="sys:role",
-            )
-            session.add(resource7)
-            session.refresh(resource7)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource8 = Resource(
-                name="资源管理",
-                level=1,
-                pid=2,
-                icon="VBr0B.png",
-                menu_url="/system/resource",
-                request_url="/resource",
-                permission_code="sys:resource",
-            )
-            session.add(resource8)
-            session.refresh(resource8)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource9 = Resource(
-                name="公告通知",
-                level=1,
-                pid=0,
-                icon="VBr0B.png",
-                menu_url="/notice",
-                request_url="/notice",
-                permission_code="notice",
-            )
-            session.add(resource9)
-            session.refresh(resource9)
-        if await session.scalar(get_select_resource_stmt("ROLE_ADMIN")) == 0:
-            resource10 = Resource(
-                name="日志记录",
-                level=1,
-                pid=0,
-                icon="VBr0B.png",
-                menu_url="/log",
-                request_url="/log",
-                permission_code="log",
+
+def load_fixture(path: str | Path) -> dict[str, list[dict]]:
+    """读取初始化数据文件, 支持YAML与JSON."""
+    path = Path(path)
+    with path.open(encoding="utf-8") as f:
+        if path.suffix in (".yaml", ".yml"):
+            if yaml is None:
+                msg = "pyyaml is required to load YAML fixtures"
+                raise RuntimeError(msg)
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+async def existing_ids(session: Session, column: Any, keys: Iterable[str]) -> dict[str, int]:  # noqa: ANN401
+    """一次查询已经存在的数据, 返回 业务key -> id."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    model = column.class_
+    statement = select(column, model.id).where(column.in_(keys))
+    results = await session.exec(statement)
+    return dict(results.all())
+
+
+async def seed_resources(session: Session, resources: list[dict]) -> tuple[dict[str, int], int]:
+    """导入资源, 按照name判断是否已经存在, 返回 (name -> id, 新增数量).
+
+    上级资源(parent)需要先导入才能得到pid, 每一层级的资源使用一条多行INSERT导入。
+    """
+    ids = await existing_ids(session, Resource.name, (r["name"] for r in resources))
+    pending = [r for r in resources if r["name"] not in ids]
+    created = len(pending)
+    service = ResourceService(session)
+    while pending:
+        ready = [r for r in pending if not r.get("parent") or r["parent"] in ids]
+        if not ready:
+            msg = f"Unknown parent resource: {sorted({r['parent'] for r in pending})}"
+            raise ValueError(msg)
+        rows = [
+            {
+                **{k: v for k, v in r.items() if k != "parent"},
+                "pid": ids.get(r.get("parent"), 0),
+            }
+            for r in ready
+        ]
+        new_ids = await service.bulk_insert(rows, commit=False)
+        ids.update(zip((r["name"] for r in ready), new_ids, strict=True))
+        pending = [r for r in pending if r["name"] not in ids]
+    return ids, created
+
+
+async def seed_roles(
+    session: Session,
+    roles: list[dict],
+    resource_ids: dict[str, int],
+) -> tuple[dict[str, int], int]:
+    """导入角色以及角色与资源的关联, 按照code判断是否已经存在, 返回 (code -> id, 新增数量)."""
+    ids = await existing_ids(session, Role.code, (r["code"] for r in roles))
+    pending = [r for r in roles if r["code"] not in ids]
+    if pending:
+        rows = [{k: v for k, v in r.items() if k != "resources"} for r in pending]
+        new_ids = await RoleService(session).bulk_insert(rows, commit=False)
+        ids.update(zip((r["code"] for r in pending), new_ids, strict=True))
+
+    # 关联关系按照(角色, 资源)判断, 已有角色新增的资源也会导入
+    wanted = set()
+    for role in roles:
+        for name in role.get("resources", ()):
+            if name not in resource_ids:
+                msg = f"Unknown resource {name!r} for role {role['code']!r}"
+                raise ValueError(msg)
+            wanted.add((ids[role["code"]], resource_ids[name]))
+    if wanted:
+        statement = select(RoleResourceLink.role_id, RoleResourceLink.resource_id).where(
+            RoleResourceLink.role_id.in_({role_id for role_id, _ in wanted}),
+        )
+        results = await session.exec(statement)
+        links = sorted(wanted - set(results.all()))
+        if links:
+            await session.execute(
+                insert(RoleResourceLink.__table__).values(
+                    [
+                        {"role_id": role_id, "resource_id": resource_id}
+                        for role_id, resource_id in links
+                    ],
+                ),
             )
-            session.add(resource10)
-            session.refresh(resource10)
-
-        # 新增角色
-        def get_select_role_stmt(code: str) -> Select | SelectOfScalar:
-            return select(func.count(Role.id)).where(Role.code == code)
-
-        role_admin = role_user = role_audit = None
-        if await session.scalar(get_select_role_stmt("ROLE_ADMIN")) == 0:
-            role_admin = Role(name="超级管理员", code="ROLE_ADMIN")
-            role_admin.resources = [
-                resource1,
-                resource2,
-                resource3,
-                resource4,
-                resource5,
-                resource6,
-                resource7,
-                resource8,
-                resource9,
-                resource10,
-            ]
-            session.add(role_admin)
-            session.refresh(role_admin)
-        if await session.scalar(get_select_role_stmt("ROLE_USER")) == 0:
-            role_user = Role(name="用户", code="ROLE_USER")
-            role_user.resources = [resource1]
-            session.add(role_user)
-            session.refresh(role_user)
-        if await session.scalar(get_select_role_stmt("ROLE_AUDIT")) == 0:
-            role_audit = Role(name="审计员", code="ROLE_AUDIT")
-            role_audit.resources = [resource1, resource10]
-            session.add(role_audit)
-            session.refresh(role_audit)
-
-        # 新增预置用户
-        def get_select_user_stmt(name: str) -> Select | SelectOfScalar:
-            return select(func.count(User.id)).where(User.name == name)
-
-        if await session.scalar(get_select_user_stmt("admin")) == 0:
-            admin = User(name="admin", password=User.encrypt_password("123456"))
-            admin.role = role_admin
-            session.add(admin)
-        if await session.scalar(get_select_user_stmt("user")) == 0:
-            user = User(name="user", password=User.encrypt_password("123456"))
-            user.role = role_user
-            session.add(user)
-        if await session.scalar(get_select_user_stmt("user2")) == 0:
-            audit = User(name="audit", password=User.encrypt_password("123456"))
-            audit.role = role_audit
-            session.add(audit)
-
-        await session.commit()
+    return ids, len(pending)
+
+
+async def seed_users(
+    session: Session,
+    users: list[dict],
+    role_ids: dict[str, int],
+    hasher: PasswordHasher,
+) -> list[int]:
+    """导入用户, 按照name判断是否已经存在, 密码在线程池中并行加密."""
+    ids = await existing_ids(session, User.name, (u["name"] for u in users))
+    pending = [u for u in users if u["name"] not in ids]
+    if not pending:
+        return []
+
+    passwords = await asyncio.gather(*(hasher.hash(u["password"]) for u in pending))
+    rows = []
+    for user, password in zip(pending, passwords, strict=True):
+        if user.get("role") not in role_ids:
+            msg = f"Unknown role {user.get('role')!r} for user {user['name']!r}"
+            raise ValueError(msg)
+        row = {k: v for k, v in user.items() if k != "role"}
+        row.update(password=password, role_id=role_ids[user["role"]])
+        rows.append(row)
+    return await UserService(session).bulk_insert(rows, commit=False)
+
+
+async def seed_synthetic_users(
+    session: Session,
+    count: int,
+    role_id: int,
+    password: str,
+    hasher: PasswordHasher,
+    prefix: str = "loadtest_",
+) -> list[int]:
+    """导入count个压测用户, 用户名为 prefix + 序号, 所有用户使用相同的密码, 只需要加密一次."""
+    statement = select(User.name).where(User.name.startswith(prefix, autoescape=True))
+    results = await session.exec(statement)
+    existing = set(results.all())
+    hashed = await hasher.hash(password)
+
+    def rows() -> Iterator[dict]:
+        for i in range(count):
+            name = f"{prefix}{i:06d}"
+            if name not in existing:
+                yield {"name": name, "password": hashed, "role_id": role_id}
+
+    return await UserService(session).bulk_insert(rows(), commit=False)
+
+
+async def init_data(
+    fixture: str | Path = DEFAULT_FIXTURE,
+    synthetic_users: int = 0,
+    synthetic_role: str = "ROLE_USER",
+    synthetic_password: str = "123456",  # noqa: S107
+) -> dict[str, int]:
+    """初始化表数据, 可以重复执行, 已经存在的数据不会重复导入.
+
+    :param fixture: 初始化数据文件
+    :param synthetic_users: 额外导入的压测用户数
+    :param synthetic_role: 压测用户的角色code
+    :param synthetic_password: 压测用户的密码
+    :return: 各类数据新增的数量
+    """
+    await init_db()
+    data = load_fixture(fixture)
+    users = data.get("users", [])
+    hasher = PasswordHasher(
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        max_pending=max(len(users), 1),
+        rounds=settings.PASSWORD_HASH_ROUNDS,
+    )
+
+    try:
+        async with async_session() as session:
+            resource_ids, resource_count = await seed_resources(session, data.get("resources", []))
+            role_ids, role_count = await seed_roles(session, data.get("roles", []), resource_ids)
+            user_ids = await seed_users(session, users, role_ids, hasher)
+
+            synthetic_ids = []
+            if synthetic_users:
+                if synthetic_role not in role_ids:
+                    role_ids.update(await existing_ids(session, Role.code, [synthetic_role]))
+                synthetic_ids = await seed_synthetic_users(
+                    session,
+                    synthetic_users,
+                    role_ids[synthetic_role],
+                    synthetic_password,
+                    hasher,
+                )
+            await session.commit()
+    finally:
+        hasher.shutdown()
+
+    return {
+        "resources": resource_count,
+        "roles": role_count,
+        "users": len(user_ids),
+        "synthetic_users": len(synthetic_ids),
+    }
@@ -3,19 +3,54 @@ from __future__ import annotations
 
 import abc
 from contextlib import asynccontextmanager
+from time import perf_counter_ns
 from typing import TYPE_CHECKING, Any, AsyncGenerator
 
 import redis.asyncio as redis
 from aredis_om import HashModel, get_redis_connection
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 
 from ...config import settings
+from ...extensions.cache import BinaryCoder, LocalCache, TaggedRedisBackend, TwoLevelBackend
+from ...extensions.fastapi.timing import record
 
 if TYPE_CHECKING:
     from ...config.app_config import AppConfigSettings
 
 
+class TimedPipeline(redis.client.Pipeline):
+    """统计耗时的redis pipeline."""
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:  # noqa: D102
+        start = perf_counter_ns()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            record("redis", perf_counter_ns() - start)
+
+
+class TimedRedis(redis.Redis):
+    """统计命令耗时的redis客户端, 耗时计入当前请求Server-Timing的redis阶段."""
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:  # noqa: ANN401, D102
+        start = perf_counter_ns()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record("redis", perf_counter_ns() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> TimedPipeline:  # noqa: D102
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_redis_client: TimedRedis | None = None
+
+
+def get_redis_client() -> TimedRedis | None:
+    """当前应用使用的redis客户端, 在build_redis_cache中创建, 未初始化时为None."""
+    return _redis_client
+
+
 @asynccontextmanager
 async def build_redis_cache(
     redis_setting: AppConfigSettings = settings,
@@ -27,12 +62,32 @@ async def build_redis_cache(
         encoding="utf8",
         decode_responses=True,
     )
-    client = redis.Redis(connection_pool=pool)
-    # 初始化FastAPICache
-    FastAPICache.init(RedisBackend(client), prefix="fastapi-cache")
+    client = TimedRedis(connection_pool=pool)
+    # 接口缓存内容为二进制编码, 使用不自动解码的连接池
+    cache_pool = redis.ConnectionPool.from_url(redis_setting.REDIS_DSN.unicode_string())
+    cache_client = TimedRedis(connection_pool=cache_pool)
+    # 初始化FastAPICache, 可以在Redis前增加进程内缓存
+    if redis_setting.CACHE_LOCAL_ENABLED:
+        backend = TwoLevelBackend(
+            cache_client,
+            LocalCache(redis_setting.CACHE_LOCAL_MAX_BYTES, redis_setting.CACHE_LOCAL_TTL),
+        )
+        backend.start()
+    else:
+        backend = TaggedRedisBackend(cache_client)
+    FastAPICache.init(backend, prefix="fastapi-cache", coder=BinaryCoder)
 
-    yield client
+    global _redis_client  # noqa: PLW0603
+    _redis_client = client
+    try:
+        yield client
+    finally:
+        _redis_client = None
+        if isinstance(backend, TwoLevelBackend):
+            await backend.stop()
 
+    await cache_client.aclose()
+    await cache_pool.aclose()
     await client.aclose()
     await pool.aclose()
 
@@ -46,8 +46,9 @@ class ResourceBase(SQLModel):
 class Resource(TimestampModel, CommonPropertyModel, ResourceBase, IDModel, Metadata, table=True):
     """资源模型."""
 
+    # 默认不加载, 需要时在查询中指定加载方式(见ResourceService.load_profiles)
     roles: list[Role] = Relationship(
         back_populates="resources",
         link_model=RoleResourceLink,
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
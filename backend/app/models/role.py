@@ -29,12 +29,14 @@ class RoleBase(SQLModel):
 class Role(TimestampModel, CommonPropertyModel, RoleBase, IDModel, Metadata, table=True):
     """角色模型."""
 
+    # 关联集合默认不加载, 避免加载角色时连带加载全部用户与资源;
+    # 需要时在查询中指定加载方式(见RoleService.load_profiles), 未加载时访问会抛出异常
     users: list["User"] = Relationship(  # noqa: F821
         back_populates="role",
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
     resources: list["Resource"] = Relationship(  # noqa: F821
         back_populates="roles",
         link_model=RoleResourceLink,
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
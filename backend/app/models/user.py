@@ -2,12 +2,12 @@
 
 from typing import List, Optional
 
-import bcrypt
 from pydantic import EmailStr
 from sqlalchemy.dialects import mysql
 from sqlmodel import Field, Relationship, SmallInteger, SQLModel, String
 
 from ..commons.enums import UserGender
+from ..config import settings
 from ..extensions.fastapi.custom_type import ChinesePhoneNumber
 from ..extensions.fastapi.model import (
     AliasCamelModel,
@@ -19,7 +19,8 @@ from ..extensions.fastapi.model import (
     SortModel,
     TimestampModel,
 )
-from ..extensions.fastapi.pagination import PageModel
+from ..extensions.fastapi.pagination import CursorModel, PageModel
+from ..extensions.password import check_password, hash_password
 
 
 class UserBase(SQLModel):
@@ -94,21 +95,20 @@ class User(TimestampModel, CommonPropertyModel, UserCreate, IDModel, Metadata, t
     is_active: int = Field(default=0, nullable=True, description="是否激活", sa_type=SmallInteger)
 
     # 多对一关系，需要定义一个role_id字段
+    # 默认不加载, 需要时在查询中指定加载方式(见UserService.load_profiles), 未加载时访问会抛出异常
     role: Optional["Role"] = Relationship(  # noqa: F821
         back_populates="users",
-        sa_relationship_kwargs={"lazy": "joined"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
 
     def verify_password(self, raw_password: str) -> bool:
-        """密码验证."""
-        if isinstance(raw_password, str):
-            raw_password = raw_password.encode()
-        return bcrypt.checkpw(raw_password, self.password.encode())
+        """密码验证, 会阻塞事件循环, 请求处理中请使用password_hasher.verify."""
+        return check_password(raw_password, self.password)
 
     @classmethod
     def encrypt_password(cls, raw_password: str) -> str:
-        """密码加密."""
-        return bcrypt.hashpw(raw_password.encode(), bcrypt.gensalt(12)).decode()
+        """密码加密, 会阻塞事件循环, 请求处理中请使用password_hasher.hash."""
+        return hash_password(raw_password, settings.PASSWORD_HASH_ROUNDS)
 
 
 class UserListPage(SQLModel):
@@ -118,6 +118,13 @@ class UserListPage(SQLModel):
     page: PageModel
 
 
+class UserScrollPage(SQLModel):
+    """API输出游标分页的用户列表模型, 忽略密码."""
+
+    users: List[UserPublic]
+    page: CursorModel
+
+
 class Token(SQLModel):
     """JWT Token模型."""
 
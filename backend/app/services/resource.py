@@ -1,28 +1,48 @@
 # -*- coding: utf-8 -*-
 
-from typing import List
+from typing import ClassVar, List
 
 from fastapi import Depends
+from sqlalchemy.orm import selectinload
 from sqlmodel import func, select
 
+from ..extensions.database import LIMIT, OFFSET, replica_read
+from ..extensions.fastapi.service import LoadProfiles, ServiceBase
 from ..models import Session, get_session
 from ..models.resource import Resource
 
+# 常用查询预先构造, 参数通过params传入
+RESOURCE_COUNT = select(func.count()).select_from(Resource)
+RESOURCE_LIST = select(Resource).offset(OFFSET).limit(LIMIT)
 
-class ResourceService:
+
+class ResourceService(ServiceBase[Resource]):
     """资源管理模块业务逻辑类."""
 
+    # 关联对象的加载方式
+    load_profiles: ClassVar[LoadProfiles] = {"roles": (selectinload(Resource.roles),)}
+
     def __init__(self, session: Session = Depends(get_session)) -> None:
-        self.session = session
+        super().__init__(Resource, session)
+
+    # 分页列表与导出的查询发送到只读副本, 权限索引与版本(ETag)的查询留在主库
+    get_list = replica_read(ServiceBase.get_list)
+    stream = replica_read(ServiceBase.stream)
 
+    @replica_read
     async def get_resource_list_count(self) -> int:
         """检索资源列表计数."""
-        count_statement = select(func.count()).select_from(Resource)
-        result = await self.session.exec(count_statement)
+        result = await self.session.exec(RESOURCE_COUNT)
         return result.one()
 
+    @replica_read
     async def get_resource_list(self, offset: int, limit: int) -> List[Resource] | None:
         """检索资源列表."""
-        statement = select(Resource).offset(offset).limit(limit)
+        result = await self.session.exec(RESOURCE_LIST, params={"offset": offset, "limit": limit})
+        return result.all()
+
+    async def get_permission_tree(self) -> List[tuple[int, int, str | None]]:
+        """检索全部资源的(资源id, 父节点id, 权限code), 用于构建权限索引."""
+        statement = select(Resource.id, Resource.pid, Resource.permission_code)
         result = await self.session.exec(statement)
         return result.all()
@@ -1,28 +1,54 @@
 # -*- coding: utf-8 -*-
 
-from typing import List
+from collections.abc import Iterable
+from typing import ClassVar, List, Optional
 
 from fastapi import Depends
+from sqlalchemy.orm import selectinload
 from sqlmodel import func, select
 
+from ..extensions.database import LIMIT, OFFSET, replica_read
+from ..extensions.fastapi.service import LoadProfiles, ServiceBase
 from ..models import Session, get_session
-from ..models.role import Role
+from ..models.role import Role, RoleResourceLink
 
+# 常用查询预先构造, 参数通过params传入
+ROLE_COUNT = select(func.count()).select_from(Role)
+ROLE_LIST = select(Role).offset(OFFSET).limit(LIMIT)
 
-class RoleService:
+
+class RoleService(ServiceBase[Role]):
     """角色管理业务逻辑类."""
 
+    # 关联对象的加载方式, 角色的用户可能很多, 不提供加载方式, 请分页检索
+    load_profiles: ClassVar[LoadProfiles] = {"resources": (selectinload(Role.resources),)}
+
     def __init__(self, session: Session = Depends(get_session)) -> None:
-        self.session = session
+        super().__init__(Role, session)
+
+    # 分页列表与导出的查询发送到只读副本, 权限索引与版本(ETag)的查询留在主库
+    get_list = replica_read(ServiceBase.get_list)
+    stream = replica_read(ServiceBase.stream)
 
+    @replica_read
     async def get_role_list_count(self) -> int:
         """检索角色列表计数."""
-        count_statement = select(func.count()).select_from(Role)
-        result = await self.session.exec(count_statement)
+        result = await self.session.exec(ROLE_COUNT)
         return result.one()
 
+    @replica_read
     async def get_role_list(self, offset: int, limit: int) -> List[Role] | None:
         """检索角色列表."""
-        statement = select(Role).offset(offset).limit(limit)
+        result = await self.session.exec(ROLE_LIST, params={"offset": offset, "limit": limit})
+        return result.all()
+
+    async def get_resource_links(
+        self,
+        role_ids: Optional[Iterable[int]] = None,
+    ) -> List[tuple[int, int]]:
+        """检索角色与资源的关联(角色id, 资源id), role_ids为空时检索全部角色."""
+        statement = select(RoleResourceLink.role_id, RoleResourceLink.resource_id)
+        if role_ids is not None:
+            statement = statement.where(RoleResourceLink.role_id.in_(role_ids))
         result = await self.session.exec(statement)
         return result.all()
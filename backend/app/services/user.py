@@ -1,28 +1,47 @@
 # -*- coding: utf-8 -*-
 
-from typing import Optional
+from typing import ClassVar, Optional
 
 from fastapi import Depends
+from sqlalchemy import Row, bindparam
+from sqlalchemy.orm import joinedload
 from sqlmodel import func, select
 
 from ..commons.enums import DeleteStatus, UserAvailableStatus
-from ..extensions.fastapi.service import ServiceBase
+from ..extensions.database import LIMIT, OFFSET, replica_read
+from ..extensions.fastapi.service import LoadProfiles, ServiceBase
+from ..extensions.password import password_hasher
 from ..models import Session, get_session
 from ..models.user import User, UserCreate, UserUpdate
 
+# 常用查询预先构造, 参数通过params传入
+USER_BY_NAME = select(User).where(User.name == bindparam("name"))
+USER_IDENTITY = select(User.id, User.name, User.role_id, User.is_active).where(
+    User.name == bindparam("name"),
+)
+USER_COUNT = select(func.count()).select_from(User)
+USER_LIST = select(User).offset(OFFSET).limit(LIMIT)
+
 
 class UserService(ServiceBase[User]):
     """用户管理模块业务逻辑."""
 
+    # 关联对象的加载方式, 默认不加载角色
+    load_profiles: ClassVar[LoadProfiles] = {"role": (joinedload(User.role),)}
+
     def __init__(self, session: Session = Depends(get_session)) -> None:
         super().__init__(User, session)
 
+    # 游标分页列表与导出的查询发送到只读副本
+    get_list = replica_read(ServiceBase.get_list)
+    stream = replica_read(ServiceBase.stream)
+
     async def create(self, user_create: UserCreate) -> User:
         """创建用户."""
         user = User.model_validate(
             user_create,
             update={
-                "password": User.encrypt_password(user_create.password),
+                "password": await password_hasher.hash(user_create.password),
                 "is_active": UserAvailableStatus.NOT_SET,
                 "is_deleted": DeleteStatus.NOT_SET,
             },
@@ -37,7 +56,7 @@ class UserService(ServiceBase[User]):
 
         if "password" in values:
             password = values["password"]
-            hashed_password = User.encrypt_password(password)
+            hashed_password = await password_hasher.hash(password)
             values["password"] = hashed_password
 
         await self.update(target_user, **values)
@@ -50,7 +69,7 @@ class UserService(ServiceBase[User]):
 
         if "password" in values:
             password = values["password"]
-            hashed_password = User.encrypt_password(password)
+            hashed_password = await password_hasher.hash(password)
             values["password"] = hashed_password
 
         await self.update(user, **values)
@@ -58,18 +77,22 @@ class UserService(ServiceBase[User]):
 
     async def get_user_by_name(self, username: Optional[str] = None) -> User | None:
         """通过用户名检索用户."""
-        statement = select(User).where(User.name == username)
-        results = await self.session.exec(statement=statement)
+        results = await self.session.exec(USER_BY_NAME, params={"name": username})
+        return results.one_or_none()
+
+    async def get_user_identity(self, username: str) -> Row | None:
+        """通过用户名检索鉴权需要的用户字段, 不加载角色等关联对象."""
+        results = await self.session.exec(USER_IDENTITY, params={"name": username})
         return results.one_or_none()
 
+    @replica_read
     async def get_user_list_count(self) -> int:
         """检索用户列表计数."""
-        count_statement = select(func.count()).select_from(User)
-        result = await self.session.exec(count_statement)
+        result = await self.session.exec(USER_COUNT)
         return result.one()
 
+    @replica_read
     async def get_user_list(self, offset: int, limit: int) -> User | None:
         """检索用户列表."""
-        statement = select(User).offset(offset).limit(limit)
-        result = await self.session.exec(statement)
+        result = await self.session.exec(USER_LIST, params={"offset": offset, "limit": limit})
         return result.all()
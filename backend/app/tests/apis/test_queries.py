@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import pytest
+from httpx import AsyncClient
+from starlette.status import HTTP_200_OK
+
+# 接口的SQL语句数与加载的对象数上限, 超过时说明出现了N+1查询或者连带加载了关联对象
+QUERY_BUDGETS = [
+    # (路径, 语句数上限, 加载对象数上限)
+    ("/user/me", 2, 1),
+    ("/user/2", 4, 1),
+    ("/user/?page=1&page_size=10", 5, 3),
+    ("/role/?page=1&page_size=10", 4, 3),
+    ("/resource/?page=1&page_size=10", 4, 10),
+]
+
+
+@pytest.mark.asyncio()
+@pytest.mark.parametrize(("path", "statements", "objects"), QUERY_BUDGETS)
+async def test_query_budget(
+    setup_initial_dataset,
+    setup_redis_cache,
+    async_client: AsyncClient,
+    api_prefix: str,
+    header_payload_admin: str,
+    query_counter,
+    path: str,
+    statements: int,
+    objects: int,
+):
+    query_counter.reset()
+    response = await async_client.get(f"{api_prefix}{path}", headers=header_payload_admin)
+    assert response.status_code == HTTP_200_OK
+    query_counter.assert_max(statements=statements, objects=objects)
+
+
+@pytest.mark.asyncio()
+async def test_load_profiles(
+    setup_initial_dataset,
+    async_session,
+    query_counter,
+):
+    from sqlalchemy.exc import InvalidRequestError
+
+    from ...services.role import RoleService
+    from ...services.user import UserService
+
+    # 初始化数据时设置的关联对象不影响检查
+    async_session.expunge_all()
+    query_counter.reset()
+
+    # 默认不加载关联对象, 访问时抛出异常而不是查询
+    user = await UserService(async_session).get(1)
+    with pytest.raises(InvalidRequestError):
+        _ = user.role
+    query_counter.assert_max(statements=1, objects=1)
+
+    query_counter.reset()
+    user = await UserService(async_session).get(1, profile="role")
+    assert user.role.code == "ROLE_ADMIN"
+    role = await RoleService(async_session).get(user.role_id, profile="resources")
+    assert len(role.resources) == 10  # noqa: PLR2004
+    query_counter.assert_max(statements=3)
+
+    with pytest.raises(ValueError, match="Unknown load profile"):
+        await RoleService(async_session).get(1, profile="users")
@@ -3,6 +3,7 @@ import pytest
 from httpx import AsyncClient
 from starlette.status import (
     HTTP_200_OK,
+    HTTP_304_NOT_MODIFIED,
 )
 
 
@@ -94,3 +95,36 @@ async def test_user_create_wrong_password_format(
     res = await async_client.post(f"{api_prefix}/user/signup", json=wrong_user.model_dump())
     data = res.json()
     assert data["status"] is False
+
+
+@pytest.mark.asyncio()
+async def test_read_users_not_modified(
+    setup_initial_dataset,
+    setup_redis_cache,
+    async_client: AsyncClient,
+    api_prefix: str,
+    header_payload_admin: str,
+):
+    response = await async_client.get(f"{api_prefix}/user/", headers=header_payload_admin)
+    etag = response.headers["etag"]
+
+    response = await async_client.get(
+        f"{api_prefix}/user/",
+        headers={**header_payload_admin, "If-None-Match": etag},
+    )
+    assert response.status_code == HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+
+@pytest.mark.asyncio()
+async def test_read_roles_not_modified(
+    setup_initial_dataset,
+    async_client: AsyncClient,
+    api_prefix: str,
+):
+    response = await async_client.get(f"{api_prefix}/role/")
+    # 数据刚刚写入, 同一秒内不输出Last-Modified, 只能通过ETag验证
+    etag = response.headers["etag"]
+
+    response = await async_client.get(f"{api_prefix}/role/", headers={"If-None-Match": etag})
+    assert response.status_code == HTTP_304_NOT_MODIFIED
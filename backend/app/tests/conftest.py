@@ -117,6 +117,15 @@ async def async_client(async_session, app_settings):
         yield client
 
 
+@pytest_asyncio.fixture(scope="function")
+async def query_counter(async_engine):
+    """统计执行的SQL语句数与加载的对象数."""
+    from ..extensions.database import QueryCounter
+
+    with QueryCounter(async_engine) as counter:
+        yield counter
+
+
 @pytest_asyncio.fixture(scope="function")
 async def setup_redis_cache(app_settings):
     """构建redis cache."""
@@ -277,5 +286,9 @@ async def setup_initial_dataset(async_session: Session):
     session.add(audit)
 
     await session.commit()
+    # 数据直接写入数据库, 需要手动使缓存的用户权限失效
+    from ..extensions.auth.principal import principal_cache
+
+    await principal_cache.invalidate()
 
     yield
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi_cache import FastAPICache
+from starlette.requests import Request
+
+from ...extensions.cache import (
+    BinaryCoder,
+    CacheCodec,
+    CacheDecodeError,
+    CacheStats,
+    LocalCache,
+    RenderedResponse,
+    TwoLevelBackend,
+    cache_stats,
+    cached,
+    model_tags,
+    tagged,
+    vary_key_builder,
+)
+from ...extensions.cache.decorator import CacheEntry, _coalesce, _read
+from ...extensions.cache.tags import _pending_tags
+from ...models.user import User
+
+
+def make_request(query: str = "", principal=None, **headers) -> Request:
+    request = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/user/",
+            "query_string": query.encode(),
+            "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+        },
+    )
+    if principal is not None:
+        request.state.principal = principal
+    return request
+
+
+async def read_users():
+    pass
+
+
+@pytest.fixture()
+def _cache_prefix(monkeypatch):
+    monkeypatch.setattr(FastAPICache, "_prefix", "test-cache")
+
+
+@pytest.mark.usefixtures("_cache_prefix")
+def test_vary_key_builder_ignores_other_headers():
+    builder = vary_key_builder(query=("page",), headers=("Accept-Language",), scope="public")
+
+    key = builder(read_users, "", request=make_request("page=1", user_agent="a", cookie="x=1"))
+    assert key.startswith("test-cache:read_users:")
+    assert key == builder(read_users, "", request=make_request("page=1&_t=2", user_agent="b"))
+    assert key != builder(read_users, "", request=make_request("page=2"))
+    assert key != builder(read_users, "", request=make_request("page=1", accept_language="en"))
+
+
+@pytest.mark.usefixtures("_cache_prefix")
+def test_vary_key_builder_auth_scope():
+    admin = SimpleNamespace(id=1, role_id=1)
+    user1 = SimpleNamespace(id=2, role_id=2)
+    user2 = SimpleNamespace(id=3, role_id=2)
+
+    def keys(scope):
+        builder = vary_key_builder(scope=scope)
+        return [
+            builder(read_users, "", request=make_request(principal=p))
+            for p in (admin, user1, user2)
+        ]
+
+    assert len(set(keys("public"))) == 1
+    assert len(set(keys("role"))) == 2  # noqa: PLR2004
+    assert len(set(keys("user"))) == 3  # noqa: PLR2004
+
+
+def test_cache_stats():
+    stats = CacheStats()
+    stats.record("fastapi-cache:read_users:abc", hit=True)
+    stats.record("fastapi-cache:read_users:def", hit=False)
+    stats.record("fastapi-cache::abc", hit=False)
+
+    assert stats.snapshot() == {
+        "": {"hits": 0, "misses": 1, "local_hits": 0, "hit_rate": 0},
+        "read_users": {"hits": 1, "misses": 1, "local_hits": 0, "hit_rate": 0.5},
+    }
+
+
+def test_model_tags():
+    assert model_tags(User, [1, 2]) == ["user-list", "user:1", "user:2"]
+    assert model_tags(User) == ["user-list"]
+
+
+def test_tagged_key_builder():
+    def key_builder(func, namespace="", **kwargs):
+        return f"{namespace}:{func.__name__}"
+
+    builder = tagged(key_builder, "user:{user_id}", "user:{principal.id}", "user-list")
+    kwargs = {"user_id": 3, "principal": SimpleNamespace(id=1)}
+
+    assert builder(test_tagged_key_builder, "ns", kwargs=kwargs) == "ns:test_tagged_key_builder"
+    assert _pending_tags.get() == ("user:3", "user:1", "user-list")
+    _pending_tags.set(())
+
+
+@pytest.mark.asyncio()
+async def test_tagged_backend_invalidate(setup_redis_cache):
+    from fastapi_cache import FastAPICache
+
+    from ...extensions.cache import invalidate_tags
+
+    backend = FastAPICache.get_backend()
+    _pending_tags.set(("test-tag:1", "test-tag-list"))
+    await backend.set("test-cache:1", b"1", 60)
+    _pending_tags.set(("test-tag-list",))
+    await backend.set("test-cache:2", b"2", 60)
+
+    assert await invalidate_tags("test-tag:1") == ["test-cache:1"]
+    assert await backend.get("test-cache:1") is None
+    assert await backend.get("test-cache:2") == b"2"
+
+    # 已经失效的缓存仍然登记在其他标签中, 再次删除不影响结果
+    assert set(await invalidate_tags("test-tag-list")) == {"test-cache:1", "test-cache:2"}
+    assert await backend.get("test-cache:2") is None
+
+
+@pytest.mark.asyncio()
+async def test_tagged_backend_skips_stale_fill(setup_redis_cache):
+    from fastapi_cache import FastAPICache
+
+    from ...extensions.cache import invalidate_tags
+
+    backend = FastAPICache.get_backend()
+    _pending_tags.set(("test-tag:1",))
+    await backend.read_generations()
+    assert await backend.set("test-cache:1", b"1", 60)
+    assert await backend.get("test-cache:1") == b"1"
+
+    # 计算之前读取了版本号, 计算期间标签失效, 计算结果不再写入
+    _pending_tags.set(("test-tag:1",))
+    await backend.read_generations()
+    await invalidate_tags("test-tag:1")
+    assert not await backend.set("test-cache:1", b"2", 60)
+    assert await backend.get("test-cache:1") is None
+
+    # 失效之后开始的计算正常写入
+    _pending_tags.set(("test-tag:1",))
+    await backend.read_generations()
+    assert await backend.set("test-cache:1", b"3", 60)
+    assert await backend.get("test-cache:1") == b"3"
+
+
+@pytest.mark.asyncio()
+async def test_cached_invalidated_during_compute(setup_redis_cache):
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from ...extensions.cache import invalidate_tags
+
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/items")
+    @cached(expire=60, key_builder=tagged(vary_key_builder(scope="public"), "test-item"))
+    async def read_items() -> dict:
+        app.state.calls += 1
+        if app.state.calls == 1:
+            # 读取数据之后、写入缓存之前数据发生变更
+            await invalidate_tags("test-item")
+        return {"calls": app.state.calls}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/items")).json() == {"calls": 1}
+        assert (await client.get("/items")).json() == {"calls": 2}
+        assert (await client.get("/items")).json() == {"calls": 2}
+
+
+def test_local_cache_lru_by_size():
+    local = LocalCache(max_bytes=1000, max_ttl=60)
+    for i in range(10):
+        local.set(f"key{i}", "x" * 150, 60)
+
+    assert local.size <= 1000  # noqa: PLR2004
+    assert local.get("key0") is None
+    assert local.get("key9") == (60, "x" * 150)
+
+    local.set("big", "x" * 2000, 60)
+    assert local.get("big") is None
+
+
+def test_local_cache_ttl():
+    local = LocalCache(max_bytes=1000, max_ttl=10)
+    local.set("capped", "1", 3600)
+    assert local.get("capped")[0] <= 10  # noqa: PLR2004
+
+    local.set("expired", "1", 10)
+    local._data["expired"] = (0, "1", local._data["expired"][2])
+    assert local.get("expired") is None
+
+
+@pytest.mark.asyncio()
+async def test_two_level_backend_invalidate_across_workers(setup_redis_cache):
+    from fastapi_cache import FastAPICache
+
+    redis = FastAPICache.get_backend().redis
+    worker1 = TwoLevelBackend(redis, LocalCache(max_bytes=10000, max_ttl=60))
+    worker2 = TwoLevelBackend(redis, LocalCache(max_bytes=10000, max_ttl=60))
+    worker2.start()
+    await asyncio.sleep(0.1)
+    try:
+        _pending_tags.set(("test-tag:1",))
+        await worker1.set("test-cache:1", b"1", 60)
+        assert await worker2.get_with_ttl("test-cache:1") == (60, b"1")
+        assert len(worker2.local) == 1
+
+        await worker1.invalidate("test-tag:1")
+        for _ in range(20):
+            if not len(worker2.local):
+                break
+            await asyncio.sleep(0.05)
+        assert await worker2.get_with_ttl("test-cache:1") == (-2, None)
+    finally:
+        await worker2.stop()
+
+
+@pytest.fixture()
+def _memory_cache():
+    from fastapi_cache.backends.inmemory import InMemoryBackend
+
+    # InMemoryBackend的数据保存在类属性中, 各个测试之间需要清空
+    InMemoryBackend._store.clear()
+    FastAPICache.reset()
+    FastAPICache.init(InMemoryBackend(), prefix="test-cache", coder=BinaryCoder)
+    yield
+    FastAPICache.reset()
+
+
+def make_app(**options):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/items")
+    @cached(expire=60, key_builder=vary_key_builder(scope="public"), **options)
+    async def read_items() -> dict:
+        app.state.calls += 1
+        await asyncio.sleep(0.05)
+        return {"calls": app.state.calls}
+
+    return app
+
+
+def test_cache_entry():
+    entry = CacheEntry(b'\x11{"a":1}', expires=100.0, delta=0.5)
+
+    loaded = CacheEntry.loads(entry.dumps())
+    assert (loaded.value, loaded.expires, loaded.delta) == (b'\x11{"a":1}', 100.0, 0.5)
+    assert CacheEntry.loads(b"not an entry") is None
+    assert not loaded.should_refresh(beta=0, now=99.9)
+    assert loaded.should_refresh(beta=0, now=100.0)
+    # 计算耗时远大于剩余时间时必然提前刷新
+    assert CacheEntry("", expires=100.0, delta=1e9).should_refresh(beta=1, now=99.9)
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_cached_coalesces_concurrent_misses():
+    from httpx import ASGITransport, AsyncClient
+
+    app = make_app()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get("/items") for _ in range(20)))
+
+    assert {r.json()["calls"] for r in responses} == {1}
+    assert app.state.calls == 1
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_cached_serves_stale_while_revalidating(monkeypatch):
+    import time
+
+    from httpx import ASGITransport, AsyncClient
+
+    app = make_app(stale=60)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/items")).json() == {"calls": 1}
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        responses = await asyncio.gather(*(client.get("/items") for _ in range(5)))
+
+    # 一个请求重新计算, 其他请求返回旧数据
+    assert sorted(r.json()["calls"] for r in responses) == [1, 1, 1, 1, 2]
+    assert app.state.calls == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_recompute_lock(setup_redis_cache):
+    from ...extensions.cache.decorator import acquire_lock, release_lock
+
+    backend = FastAPICache.get_backend()
+    token = await acquire_lock(backend, "test-cache:lock", 5)
+    assert token is not None
+    assert await acquire_lock(backend, "test-cache:lock", 5) is None
+
+    await release_lock(backend, "test-cache:lock", "other")
+    assert await acquire_lock(backend, "test-cache:lock", 5) is None
+    await release_lock(backend, "test-cache:lock", token)
+    token = await acquire_lock(backend, "test-cache:lock", 5)
+    assert token is not None
+    await release_lock(backend, "test-cache:lock", token)
+
+
+@pytest.mark.asyncio()
+async def test_coalesce_polling_not_counted(setup_redis_cache):
+    from ...extensions.cache.decorator import acquire_lock, release_lock
+
+    backend = FastAPICache.get_backend()
+    key = "test-cache:coalesce:abc"
+    cache_stats.reset()
+    # 其他进程持有锁, 正在计算
+    token = await acquire_lock(backend, key, 5)
+
+    async def compute():
+        raise AssertionError
+
+    task = asyncio.create_task(_coalesce(key, compute, backend, 5))
+    await asyncio.sleep(0.2)
+    rendered = RenderedResponse.from_body(200, [], b"[1]")
+    await backend.set(key, CacheEntry(rendered.dumps(), expires=1e10, delta=0).dumps(), 60)
+    entry = await task
+    await release_lock(backend, key, token)
+
+    assert entry.result.bodies == {"identity": b"[1]"}
+    # 等待期间的多次轮询不计入统计, 请求只在第一次读取时记为一次未命中
+    assert "coalesce" not in cache_stats.snapshot()
+
+
+@pytest.mark.parametrize("fmt", ["json", "msgpack"])
+def test_cache_codec(fmt):
+    from datetime import UTC, datetime
+
+    from ...models.user import UserPublic
+
+    if fmt == "msgpack":
+        # msgspec为可选依赖, 没有安装时缓存使用JSON格式
+        pytest.importorskip("msgspec")
+    codec = CacheCodec(fmt, "zlib", min_size=100)
+    now = datetime.now(UTC)
+    user = UserPublic(id=1, name="test", role_id=1, is_active=1, create_time=now, update_time=now)
+    value = {"users": [user] * 20, "total": 20}
+
+    data = codec.encode(value)
+    assert data[0] >> 4 == CacheCodec.version
+    assert data[0] & 0b11 == CacheCodec.compressions.index("zlib")
+    assert codec.decode(data) == {"users": [user.model_dump(mode="json")] * 20, "total": 20}
+
+    # 小于min_size时不压缩, 任意配置的CacheCodec都可以按照头部解码
+    small = codec.encode({"total": 0})
+    assert small[0] & 0b11 == CacheCodec.compressions.index("none")
+    assert CacheCodec("json", "none").decode(data) == codec.decode(data)
+
+    with pytest.raises(CacheDecodeError):
+        codec.decode(b'{"total":0}')
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_rendered_response_codec_version():
+    rendered = RenderedResponse.from_body(200, [("content-type", "application/json")], b"[1]")
+    data = rendered.dumps()
+    # 元数据由CacheCodec编码, 第一个字节为带版本号的头部
+    assert data[4] >> 4 == CacheCodec.version
+    loaded = RenderedResponse.loads(data)
+    assert (loaded.status_code, loaded.headers, loaded.bodies, loaded.etag) == (
+        200,
+        [("content-type", "application/json")],
+        {"identity": b"[1]"},
+        rendered.etag,
+    )
+
+    # 其他版本的程序写入的缓存按照未命中处理
+    stale = data[:4] + bytes(((CacheCodec.version + 1) << 4 | data[4] & 0b1111,)) + data[5:]
+    with pytest.raises(CacheDecodeError):
+        RenderedResponse.loads(stale)
+    entry = CacheEntry(stale, expires=1e10, delta=0)
+    await FastAPICache.get_backend().set("test-cache:stale", entry.dumps(), 60)
+    assert await _read(FastAPICache.get_backend(), "test-cache:stale") is None
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_cached_serves_rendered_envelope():
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from ...extensions.fastapi.middleware import MetaDataAdderMiddleware
+
+    app = FastAPI()
+    app.add_middleware(MetaDataAdderMiddleware)
+
+    @app.get("/items", response_model=list[int])
+    @cached(expire=60, key_builder=vary_key_builder(scope="public"))
+    async def read_items() -> list:
+        return list(range(1000))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        miss = await client.get("/items", headers={"Accept-Encoding": "gzip"})
+        hit = await client.get("/items", headers={"Accept-Encoding": "gzip"})
+        plain = await client.get("/items", headers={"Accept-Encoding": "identity"})
+
+    assert miss.json() == {"status": True, "code": 0, "message": "成功", "data": list(range(1000))}
+    assert hit.headers["content-encoding"] == "gzip"
+    # httpx自动解压响应体
+    assert hit.content == plain.content == miss.content
+    assert "content-encoding" not in plain.headers
+    assert hit.headers["etag"] == miss.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert hit.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_cached_not_modified():
+    from httpx import ASGITransport, AsyncClient
+
+    app = make_app()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        etag = (await client.get("/items")).headers["etag"]
+        res = await client.get("/items", headers={"If-None-Match": etag})
+
+    assert res.status_code == 304  # noqa: PLR2004
+    assert res.content == b""
+    assert res.headers["etag"] == etag
+    # 服务端缓存可能随时失效, 客户端每次都需要验证
+    assert res.headers["cache-control"] == "no-cache"
+
+
+@pytest.mark.asyncio()
+@pytest.mark.usefixtures("_memory_cache")
+async def test_cached_user_scope_private():
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    app = FastAPI()
+
+    @app.get("/me")
+    @cached(expire=60, key_builder=tagged(vary_key_builder(scope="user"), "test-user"))
+    async def read_me() -> dict:
+        return {"id": 1}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        miss = await client.get("/me")
+        hit = await client.get("/me")
+
+    assert miss.headers["cache-control"] == hit.headers["cache-control"] == "private, no-cache"
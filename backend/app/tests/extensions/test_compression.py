@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from ...extensions.fastapi.compression import CompressionMiddleware, negotiate
+from ...extensions.fastapi.middleware import MetaDataAdderMiddleware
+
+ITEMS = [{"id": i, "name": f"item{i}"} for i in range(200)]
+
+
+async def large_json(request):
+    return JSONResponse(ITEMS, headers={"ETag": '"abc"'})
+
+
+async def small_json(request):
+    return JSONResponse({"id": 1})
+
+
+async def encoded(request):
+    return Response(gzip.compress(b"x" * 5000), headers={"Content-Encoding": "gzip"})
+
+
+async def streamed(request):
+    async def chunks():
+        for i in range(3):
+            yield json.dumps({"line": i}).encode() + b"\n"
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@pytest.fixture()
+def compression_client():
+    app = Starlette(
+        routes=[
+            Route("/large", large_json),
+            Route("/small", small_json),
+            Route("/encoded", encoded),
+            Route("/stream", streamed),
+        ],
+    )
+    app = CompressionMiddleware(MetaDataAdderMiddleware(app))
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+def test_negotiate():
+    assert negotiate("gzip, deflate, br") in ("br", "gzip")
+    assert negotiate("gzip;q=0, deflate") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") is not None
+    assert negotiate("br;q=1, gzip;q=0.5", ("gzip",)) == "gzip"
+
+
+@pytest.mark.asyncio()
+async def test_compress_enveloped_body(compression_client):
+    res = await compression_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"] == '"abc-gzip"'
+    assert int(res.headers["content-length"]) < len(res.content)
+    assert res.json()["data"] == ITEMS
+
+    res = await compression_client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.json()["data"] == ITEMS
+
+
+@pytest.mark.asyncio()
+async def test_skip_small_and_encoded(compression_client):
+    res = await compression_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.json()["data"] == {"id": 1}
+
+    res = await compression_client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert res.content == b"x" * 5000
+
+
+@pytest.mark.asyncio()
+async def test_compress_stream_incrementally():
+    app = CompressionMiddleware(Starlette(routes=[Route("/stream", streamed)]))
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    messages = []
+    finished = asyncio.Event()
+
+    async def receive():
+        # StreamingResponse同时等待客户端断开, 输出结束后再断开
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if not message.get("more_body", True):
+            finished.set()
+
+    await app(scope, receive, send)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    # 每一块都已经flush, 收到即可解压出对应的行
+    decompressor = zlib.decompressobj(31)
+    lines = [decompressor.decompress(m["body"]) for m in messages[1:]]
+    assert lines[:3] == [json.dumps({"line": i}).encode() + b"\n" for i in range(3)]
+    assert decompressor.eof
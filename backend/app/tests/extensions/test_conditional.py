@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from datetime import UTC, datetime
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.datastructures import Headers
+
+from ...extensions.fastapi.compression import CompressionMiddleware
+from ...extensions.fastapi.conditional import (
+    ResourceVersion,
+    coded_etag,
+    conditional_get,
+    etag_matches,
+    http_date,
+    is_not_modified,
+)
+from ...extensions.fastapi.exception import register_global_exception
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"xyz", "abc-gzip"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert etag_matches('"abc-zstd"', '"abc"')
+
+
+def test_coded_etag():
+    assert coded_etag('"abc"', "gzip") == '"abc-gzip"'
+    assert coded_etag('"abc-br"', "gzip") == '"abc-br"'
+    assert coded_etag('W/"abc"', "gzip") == 'W/"abc"'
+
+
+def test_is_not_modified():
+    modified = datetime(2024, 5, 6, 7, 8, 9, 123456)  # noqa: DTZ001
+    since = Headers({"if-modified-since": http_date(modified)})
+    assert http_date(modified) == "Mon, 06 May 2024 07:08:09 GMT"
+    assert is_not_modified(since, '"abc"', modified)
+    assert not is_not_modified(since, '"abc"', datetime(2024, 5, 6, 7, 8, 10, tzinfo=UTC))
+
+    # 有If-None-Match时忽略If-Modified-Since
+    both = Headers({"if-none-match": '"other"', "if-modified-since": http_date(modified)})
+    assert not is_not_modified(both, '"abc"', modified)
+    assert not is_not_modified(Headers({"if-modified-since": "invalid"}), '"abc"', modified)
+
+
+@pytest.mark.asyncio()
+async def test_conditional_get_skips_endpoint():
+    app = FastAPI()
+    register_global_exception(app)
+    app.state.version = ResourceVersion('"v1"', datetime(2024, 1, 1, tzinfo=UTC))
+    app.state.calls = 0
+
+    async def version() -> ResourceVersion:
+        return app.state.version
+
+    @app.get("/items", dependencies=[Depends(conditional_get(version))])
+    async def read_items() -> list:
+        app.state.calls += 1
+        return [1, 2]
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        res = await client.get("/items")
+        etag = res.headers["etag"]
+        assert res.headers["last-modified"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+        res = await client.get("/items", headers={"If-None-Match": etag})
+        assert res.status_code == 304  # noqa: PLR2004
+        assert res.content == b""
+        assert res.headers["etag"] == etag
+
+        res = await client.get(
+            "/items",
+            headers={"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"},
+        )
+        assert res.status_code == 304  # noqa: PLR2004
+
+        app.state.version = ResourceVersion('"v2"', datetime(2024, 1, 2, tzinfo=UTC))
+        res = await client.get("/items", headers={"If-None-Match": etag})
+        assert res.status_code == 200  # noqa: PLR2004
+        assert res.headers["etag"] != etag
+
+    assert app.state.calls == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_conditional_get_same_second():
+    app = FastAPI()
+    register_global_exception(app)
+    now = datetime.now(UTC)
+
+    async def version() -> ResourceVersion:
+        return ResourceVersion('"v1"', now)
+
+    @app.get("/items", dependencies=[Depends(conditional_get(version))])
+    async def read_items() -> list:
+        return [1, 2]
+
+    # 当前这一秒内修改的资源可能再次修改, 修改时间不能作为验证器
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        res = await client.get("/items")
+        assert "last-modified" not in res.headers
+        res = await client.get("/items", headers={"If-Modified-Since": http_date(now)})
+        assert res.status_code == 200  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_conditional_get_compressed_etag():
+    app = FastAPI()
+    register_global_exception(app)
+    version = ResourceVersion('"v1"', datetime(2024, 1, 1, tzinfo=UTC))
+
+    async def get_version() -> ResourceVersion:
+        return version
+
+    @app.get("/items", dependencies=[Depends(conditional_get(get_version))])
+    async def read_items() -> list:
+        return [{"id": i, "name": f"item{i}"} for i in range(200)]
+
+    transport = ASGITransport(app=CompressionMiddleware(app))
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"Accept-Encoding": "gzip"}
+        res = await client.get("/items", headers=headers)
+        assert res.headers["content-encoding"] == "gzip"
+        etag = res.headers["etag"]
+        assert etag.endswith('-gzip"')
+
+        # 304与压缩后的200使用相同的ETag
+        res = await client.get("/items", headers={**headers, "If-None-Match": etag})
+        assert res.status_code == 304  # noqa: PLR2004
+        assert res.headers["etag"] == etag
+        assert "Accept-Encoding" in res.headers["vary"]
+
+        res = await client.get("/items", headers={"Accept-Encoding": "identity"})
+        assert coded_etag(res.headers["etag"], "gzip") == etag
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import bindparam, column, insert, select, table, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ...extensions.database import (
+    AdaptiveLimiter,
+    InstrumentedPool,
+    PoolMonitor,
+    ReplicaSet,
+    RoutingSession,
+    UnitOfWork,
+    replica_read,
+    replica_reads,
+    statement_templates,
+    unit_of_work,
+)
+
+item = table("item", column("name"))
+
+
+@pytest_asyncio.fixture()
+async def engines(tmp_path):
+    result = []
+    for name in ("primary", "replica"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE item (name TEXT)"))
+            await conn.execute(insert(item).values(name=name))
+        result.append(engine)
+    yield result
+    for engine in result:
+        await engine.dispose()
+
+
+def session_factory(engines, sticky_seconds=0):
+    primary, replica = engines
+    replicas = ReplicaSet([(replica, 1)], sticky_seconds=sticky_seconds)
+    return replicas, sessionmaker(
+        primary,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        replicas=replicas,
+        expire_on_commit=False,
+    )
+
+
+async def read(session) -> str:
+    return (await session.execute(select(item.c.name))).scalars().first()
+
+
+@pytest.mark.asyncio()
+async def test_route_reads(engines):
+    replicas, factory = session_factory(engines)
+
+    @replica_read
+    async def read_replica(session):
+        return await read(session)
+
+    async with factory() as session:
+        assert await read(session) == "primary"
+        assert await read_replica(session) == "replica"
+        replicas.mark(engines[1], healthy=False)
+        assert await read_replica(session) == "primary"
+        await replicas.check(timeout=1)
+        assert await read_replica(session) == "replica"
+
+        # 写入之后同一个session的查询都发送到主库
+        await session.execute(insert(item).values(name="written"))
+        with replica_reads():
+            assert await read(session) == "primary"
+            assert (await session.execute(select(item.c.name))).scalars().all() == [
+                "primary",
+                "written",
+            ]
+
+
+@pytest.mark.asyncio()
+async def test_sticky_after_commit(engines):
+    _, factory = session_factory(engines, sticky_seconds=60)
+    async with factory() as session:
+        with replica_reads():
+            assert await read(session) == "replica"
+        await session.execute(insert(item).values(name="written"))
+        await session.commit()
+
+    async with factory() as session:
+        with replica_reads():
+            assert await read(session) == "primary"
+
+
+def test_authorization_reads_on_primary():
+    from ...services.resource import ResourceService
+    from ...services.role import RoleService
+
+    # 权限索引与版本(ETag)需要最新数据, 不发送到可能落后的副本
+    for method in (
+        RoleService.get_resource_links,
+        ResourceService.get_permission_tree,
+        RoleService.version,
+        ResourceService.version,
+    ):
+        assert not hasattr(method, "__wrapped__")
+    assert hasattr(RoleService.get_role_list, "__wrapped__")
+
+
+@pytest.mark.asyncio()
+async def test_unit_of_work(engines):
+    _, factory = session_factory(engines)
+    notified = []
+
+    async def notify(model, ids):
+        # 通知时写入已经提交
+        async with factory() as other:
+            rows = (await other.execute(select(item.c.name))).scalars().all()
+        notified.append((model, ids, rows))
+
+    # 没有服务请求提交时回滚
+    async with factory() as session, unit_of_work(session, notify):
+        await session.execute(insert(item).values(name="discarded"))
+
+    async with factory() as session, unit_of_work(session, notify) as uow:
+        assert UnitOfWork.current(session) is uow
+        for name in ("a", "b"):
+            await session.execute(insert(item).values(name=name))
+            uow.request_commit()
+            uow.record_change("item", [name])
+        assert notified == []
+    assert UnitOfWork.current(session) is None
+    assert notified == [("item", ["a", "b"], ["primary", "a", "b"])]
+
+    async def failed_request():
+        async with factory() as session, unit_of_work(session, notify) as uow:
+            await session.execute(insert(item).values(name="failed"))
+            uow.request_commit()
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await failed_request()
+    async with factory() as session:
+        assert (await session.execute(select(item.c.name))).scalars().all() == [
+            "primary",
+            "a",
+            "b",
+        ]
+
+
+@pytest.mark.asyncio()
+async def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(max_limit=4, min_limit=2, target_latency=10)
+    for _ in range(3):
+        limiter.observe(100)
+    # 每轮(limit次查询)最多减少一次
+    assert limiter.limit == 4 * 0.9
+    for _ in range(100):
+        limiter.observe(100)
+    assert limiter.limit == 2  # noqa: PLR2004
+    for _ in range(100):
+        limiter.observe(1)
+    assert limiter.limit == 4  # noqa: PLR2004
+
+    for _ in range(4):
+        await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.snapshot()["waiting"] == 1
+    limiter.release()
+    await waiter
+    assert limiter.in_use == 4  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_pool_monitor(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.db",
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+    )
+    monitor = PoolMonitor("test", AdaptiveLimiter(max_limit=1))
+    monitor.attach(engine)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 1"))
+            stats = monitor.snapshot()
+            assert stats["checked_out"] == 1
+            assert stats["adaptive"]["in_use"] == 1
+        stats = monitor.snapshot()
+        assert stats["checked_out"] == 0
+        assert stats["adaptive"]["in_use"] == 0
+        assert stats["checkout_wait"]["count"] == 1
+        assert stats["query_latency"]["count"] == 2  # noqa: PLR2004
+        assert stats["statement_cache"]["misses"] == 1
+        assert stats["statement_cache"]["hits"] == 1
+        assert stats["connections"]["open"] == 1
+        assert stats["connections"]["opened"] == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio()
+async def test_statement_templates(engines):
+    _, factory = session_factory(engines)
+
+    def build():
+        return select(item.c.name).where(item.c.name == bindparam("name"))
+
+    statement = statement_templates.get(("item", "by_name"), build)
+    assert statement_templates.get(("item", "by_name"), build) is statement
+
+    async with factory() as session:
+        for name in ("primary", "missing"):
+            result = await session.execute(statement, params={"name": name})
+            assert result.scalars().first() == (name if name == "primary" else None)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from ...extensions.fastapi.export import ExportResponse, render_csv, render_ndjson
+from ...extensions.fastapi.middleware import MetaDataAdderMiddleware
+
+COLUMNS = ("id", "name", "createTime")
+ROWS = [
+    (1, "中文", datetime(2024, 1, 2, 3, 4, 5)),  # noqa: DTZ001
+    (2, "a,b", None),
+]
+
+
+async def batches():
+    yield ROWS[:1]
+    yield ROWS[1:]
+
+
+async def export(request):
+    return ExportResponse(batches(), COLUMNS, request.query_params["format"], filename="users")
+
+
+@pytest.fixture()
+def export_client():
+    app = Starlette(routes=[Route("/export", export)])
+    return AsyncClient(
+        transport=ASGITransport(app=MetaDataAdderMiddleware(app)),
+        base_url="http://test",
+    )
+
+
+def test_render():
+    lines = render_ndjson(COLUMNS, ROWS).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "name": "中文", "createTime": "2024-01-02 03:04:05"},
+        {"id": 2, "name": "a,b", "createTime": None},
+    ]
+    assert render_csv(ROWS).decode() == '1,中文,2024-01-02 03:04:05\n2,"a,b",\n'
+
+
+@pytest.mark.asyncio()
+async def test_export_not_enveloped(export_client):
+    res = await export_client.get("/export", params={"format": "ndjson"})
+    assert res.headers["content-type"] == "application/x-ndjson"
+    assert res.headers["content-disposition"] == 'attachment; filename="users.ndjson"'
+    assert [json.loads(line)["id"] for line in res.text.splitlines()] == [1, 2]
+
+    res = await export_client.get("/export", params={"format": "csv"})
+    assert res.headers["content-type"] == "text/csv; charset=utf-8"
+    assert res.text.splitlines()[0] == "id,name,createTime"
+    assert len(res.text.splitlines()) == len(ROWS) + 1
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from ...extensions.fastapi.api import ApiResponse
+from ...extensions.fastapi.middleware import MetaDataAdderMiddleware
+
+
+async def plain_json(request):
+    return JSONResponse({"name": "中文", "items": [1, 2]})
+
+
+async def enveloped_dict(request):
+    return JSONResponse({"status": True, "code": 200, "access_token": "token"})
+
+
+async def api_response(request):
+    return ApiResponse(status=False, code=10001, message="出错", status_code=400)
+
+
+async def streamed_json(request):
+    async def chunks():
+        yield b"["
+        yield b"1,"
+        yield b"2]"
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+async def plain_text(request):
+    return PlainTextResponse("hello")
+
+
+@pytest.fixture()
+def envelope_client():
+    app = Starlette(
+        routes=[
+            Route("/json", plain_json),
+            Route("/login", enveloped_dict),
+            Route("/api", api_response),
+            Route("/stream", streamed_json),
+            Route("/text", plain_text),
+        ],
+    )
+    return AsyncClient(
+        transport=ASGITransport(app=MetaDataAdderMiddleware(app)),
+        base_url="http://test",
+    )
+
+
+@pytest.mark.asyncio()
+async def test_wrap_plain_json(envelope_client):
+    res = await envelope_client.get("/json")
+    assert int(res.headers["content-length"]) == len(res.content)
+    assert res.json() == {
+        "status": True,
+        "code": 0,
+        "message": "成功",
+        "data": {"name": "中文", "items": [1, 2]},
+    }
+
+
+@pytest.mark.asyncio()
+async def test_keep_enveloped_output(envelope_client):
+    res = await envelope_client.get("/login")
+    assert res.json() == {"status": True, "code": 200, "access_token": "token"}
+
+    res = await envelope_client.get("/api")
+    assert res.status_code == 400  # noqa: PLR2004
+    assert res.json() == {"status": False, "code": 10001, "message": "出错", "data": None}
+
+
+@pytest.mark.asyncio()
+async def test_wrap_streamed_json(envelope_client):
+    res = await envelope_client.get("/stream")
+    assert json.loads(res.content)["data"] == [1, 2]
+
+
+@pytest.mark.asyncio()
+async def test_skip_non_json(envelope_client):
+    res = await envelope_client.get("/text")
+    assert res.text == "hello"
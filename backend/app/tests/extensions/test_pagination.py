@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from ...extensions.fastapi.pagination import (
+    CursorModel,
+    InvalidCursorException,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor_roundtrip():
+    created = datetime.datetime(2024, 5, 6, 7, 8, 9, 123456)  # noqa: DTZ001
+    cursor = encode_cursor("create_time", True, [created, 10])
+
+    assert decode_cursor(cursor, "create_time", True) == [created.isoformat(), 10]
+
+
+@pytest.mark.parametrize(
+    ("sort", "desc"),
+    [("id", True), ("create_time", False)],
+)
+def test_cursor_mismatch(sort, desc):
+    cursor = encode_cursor("create_time", True, [1, 10])
+
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, sort, desc)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "abc", "abc.def", "a.b.c", "!!!.!!!"],
+)
+def test_cursor_invalid(cursor):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, "id", False)
+
+
+def test_cursor_tampered():
+    cursor = encode_cursor("id", False, [10, 10])
+    payload, signature = cursor.split(".")
+    other = encode_cursor("id", False, [1, 1]).split(".")[0]
+
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(f"{other}.{signature}", "id", False)
+
+
+def test_paginate():
+    page = CursorModel(page_size=2, sort="name")
+    items = [SimpleNamespace(id=i, name=f"u{i}") for i in range(3)]
+
+    assert page.position() is None
+    assert page.paginate(items) == items[:2]
+    assert page.has_more
+
+    page = CursorModel(page_size=2, sort="name", cursor=page.next_cursor)
+    assert page.position() == ["u1", 1]
+    assert page.paginate(items[2:]) == items[2:]
+    assert not page.has_more
+    assert page.next_cursor is None
+
+
+def test_cursor_model_serialization():
+    page = CursorModel(page_size=2, cursor="abc", count="exact", total=3)
+
+    # 请求参数不输出, 空值不输出
+    assert page.model_dump() == {"pageSize": 2, "hasMore": False, "total": 3}
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ...extensions.password import PasswordHasher, hash_password, password_rounds
+
+
+@pytest.fixture()
+def hasher():
+    hasher = PasswordHasher(max_workers=2, max_pending=4, rounds=4)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio()
+async def test_hash_and_verify(hasher: PasswordHasher):
+    hashed = await hasher.hash("123456")
+
+    assert password_rounds(hashed) == 4  # noqa: PLR2004
+    assert await hasher.verify("123456", hashed)
+    assert not await hasher.verify("654321", hashed)
+    assert not await hasher.verify("123456", "not a bcrypt hash")
+
+
+def test_needs_rehash(hasher: PasswordHasher):
+    assert hasher.needs_rehash(hash_password("123456", 4)) is False
+    hasher.rounds = 5
+    assert hasher.needs_rehash(hash_password("123456", 4)) is True
+    assert hasher.needs_rehash("plain") is False
+
+
+@pytest.mark.asyncio()
+async def test_overload(hasher: PasswordHasher):
+    results = await asyncio.gather(
+        *(hasher.hash("123456") for _ in range(6)),
+        return_exceptions=True,
+    )
+
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 2  # noqa: PLR2004
+    assert rejected[0].status_code == 503  # noqa: PLR2004
+    assert hasher.pending == 0
+
+
+@pytest.mark.asyncio()
+async def test_event_loop_not_blocked(hasher: PasswordHasher):
+    hasher.rounds = 10
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    task = asyncio.create_task(heartbeat())
+    await hasher.hash("123456")
+    task.cancel()
+
+    assert ticks > 1
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from ...extensions.auth.permission import PermissionIndex
+
+# (资源id, 父节点id, 权限code)
+RESOURCES = [
+    (1, 0, ""),
+    (2, 0, "sys"),
+    (3, 2, "sys:user"),
+    (4, 3, "sys:user:list"),
+    (5, 3, "sys:user:update"),
+    (6, 0, "log"),
+]
+# (角色id, 资源id)
+LINKS = [(1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 1), (3, 3)]
+
+
+class FakeRoleService:
+    def __init__(self):
+        self.links = list(LINKS)
+        self.calls = []
+        # 设置时查询等待该事件, 模拟较慢的查询
+        self.gate = None
+
+    async def get_resource_links(self, role_ids=None):
+        self.calls.append(role_ids)
+        if self.gate is not None:
+            await self.gate.wait()
+        return [link for link in self.links if role_ids is None or link[0] in role_ids]
+
+
+class FakeResourceService:
+    def __init__(self):
+        self.calls = 0
+        self.resources = RESOURCES
+
+    async def get_permission_tree(self):
+        self.calls += 1
+        return self.resources
+
+
+def build_index(inherit=False):
+    index = PermissionIndex(inherit=inherit)
+    index.build_resources(RESOURCES)
+    index.build_roles(LINKS)
+    return index
+
+
+def test_check():
+    index = build_index()
+
+    assert index.check(1, "sys:user:list")
+    assert index.check(1, "log")
+    assert not index.check(2, "sys:user:list")
+    assert not index.check(3, "sys:user:list")
+    assert not index.check(None, "sys")
+    assert not index.check(1, "unknown")
+    # 空的权限code不参与检查
+    assert not index.check(2, "")
+
+
+def test_check_inherit():
+    index = build_index(inherit=True)
+
+    assert index.check(3, "sys:user")
+    assert index.check(3, "sys:user:list")
+    assert index.check(3, "sys:user:update")
+    assert not index.check(3, "sys")
+    assert not index.check(3, "log")
+
+
+def test_inherit_ignores_cycle():
+    index = PermissionIndex(inherit=True)
+    index.build_resources([(1, 2, "a"), (2, 1, "b"), (3, 0, "c")])
+    index.build_roles([(1, 1), (1, 3)])
+
+    assert index.check(1, "a")
+    assert index.check(1, "c")
+
+
+@pytest.mark.asyncio()
+async def test_ensure_reload_on_version():
+    index = PermissionIndex()
+    roles, resources = FakeRoleService(), FakeResourceService()
+
+    await index.ensure(1, roles, resources)
+    await index.ensure(1, roles, resources)
+    assert resources.calls == 1
+    assert index.check(1, "sys")
+
+    await index.ensure(2, roles, resources)
+    assert resources.calls == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_ensure_incremental_role_change():
+    index = PermissionIndex()
+    roles, resources = FakeRoleService(), FakeResourceService()
+    await index.ensure(1, roles, resources)
+
+    roles.links.append((2, 6))
+    index.changed(2, [2])
+    index.changed(3)  # 用户变更不影响权限
+    await index.ensure(3, roles, resources)
+
+    assert resources.calls == 1
+    assert roles.calls[-1] == {2}
+    assert index.check(2, "log")
+    assert index.check(1, "log")
+
+
+@pytest.mark.asyncio()
+async def test_ensure_full_reload_when_version_skipped():
+    index = PermissionIndex()
+    roles, resources = FakeRoleService(), FakeResourceService()
+    await index.ensure(1, roles, resources)
+
+    # 其他进程也有变更, 版本号跳过了一个
+    index.changed(3, [2])
+    await index.ensure(3, roles, resources)
+
+    assert resources.calls == 2  # noqa: PLR2004
+    assert roles.calls[-1] is None
+
+
+@pytest.mark.asyncio()
+async def test_ensure_swaps_atomically():
+    index = PermissionIndex()
+    roles, resources = FakeRoleService(), FakeResourceService()
+    await index.ensure(1, roles, resources)
+
+    # 新版本中资源顺序变化, 比特位重新分配
+    resources.resources = list(reversed(RESOURCES))
+    roles.gate = asyncio.Event()
+    reloads = [asyncio.create_task(index.ensure(2, roles, resources)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    # 加载期间的检查使用一致的旧索引
+    assert index.check(3, "sys:user")
+    assert not index.check(3, "sys:user:update")
+
+    roles.gate.set()
+    await asyncio.gather(*reloads)
+    assert resources.calls == 2  # noqa: PLR2004
+    assert index.version == 2  # noqa: PLR2004
+    assert index.check(3, "sys:user")
+    assert not index.check(3, "sys:user:update")
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from ...extensions.auth.principal import Principal, PrincipalCache
+from ...extensions.fastapi.service import _change_listeners, notify_model_change, on_model_change
+from ...models.role import Role
+from ...models.user import User
+
+
+@pytest.fixture()
+def cache():
+    return PrincipalCache(maxsize=2, ttl=60, prefix="test-principal")
+
+
+def test_principal_roundtrip():
+    principal = Principal(id=1, name="admin", role_id=1, is_active=1)
+
+    assert Principal.from_dict(principal.to_dict()) == principal
+
+
+@pytest.mark.asyncio()
+async def test_cache_hit_and_invalidate(cache: PrincipalCache):
+    principal = Principal(id=1, name="admin")
+    versions = await cache.versions("admin")
+    await cache.set("admin", versions, principal)
+    assert await cache.get("admin", versions) is principal
+
+    await cache.invalidate()
+    new_versions = await cache.versions("admin")
+    assert new_versions != versions
+    assert await cache.get("admin", new_versions) is None
+
+
+@pytest.mark.asyncio()
+async def test_cache_stale_version_not_visible(cache: PrincipalCache):
+    # 读取版本号之后缓存失效, 之后写入的旧数据不能被新版本读到
+    versions = await cache.versions("admin")
+    await cache.invalidate()
+    await cache.set("admin", versions, Principal(id=1, name="admin"))
+
+    assert await cache.get("admin", await cache.versions("admin")) is None
+
+
+@pytest.mark.asyncio()
+async def test_cache_lru(cache: PrincipalCache):
+    versions = await cache.versions("")
+    for i, name in enumerate(("a", "b", "c")):
+        await cache.set(name, versions, Principal(id=i, name=name))
+
+    assert await cache.get("a", versions) is None
+    assert (await cache.get("c", versions)).name == "c"
+
+
+@pytest.mark.asyncio()
+async def test_cache_ttl():
+    cache = PrincipalCache(maxsize=2, ttl=0, prefix="test-principal")
+    await cache.set("admin", (0, 0), Principal(id=1, name="admin"))
+
+    assert await cache.get("admin", (0, 0)) is None
+
+
+async def check_invalidate_users(cache: PrincipalCache):
+    admin, user = Principal(id=1, name="admin"), Principal(id=2, name="user")
+    for principal in (admin, user):
+        await cache.set(principal.name, await cache.versions(principal.name), principal)
+    version = await cache.version()
+
+    # 用户变更只使该用户的缓存失效, 全局版本号不变
+    await cache.invalidate_users([1])
+    assert await cache.version() == version
+    assert await cache.get("admin", await cache.versions("admin")) is None
+    assert await cache.get("user", await cache.versions("user")) == user
+
+    # 读取版本号之后用户变更, 之后写入的旧数据不能被新版本读到
+    versions = await cache.versions("user")
+    await cache.invalidate_users([2])
+    await cache.set("user", versions, user)
+    assert await cache.get("user", await cache.versions("user")) is None
+
+    # 没有缓存过的用户没有需要失效的缓存, 全局版本号不变, 变更之前开始加载的数据不写入缓存
+    guest = Principal(id=3, name="guest")
+    versions = await cache.versions("guest")
+    await cache.invalidate_users([3])
+    assert await cache.version() == version
+    await cache.set("guest", versions, guest)
+    assert await cache.get("guest", await cache.versions("guest")) is None
+
+
+@pytest.mark.asyncio()
+async def test_invalidate_users(cache: PrincipalCache):
+    await check_invalidate_users(cache)
+
+
+@pytest.mark.asyncio()
+async def test_invalidate_users_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from ...extensions.auth import principal
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(principal, "get_redis_client", lambda: client)
+    cache = PrincipalCache(maxsize=10, ttl=60, prefix="test-principal")
+    await check_invalidate_users(cache)
+
+    # 失效的用户从ID与sub的对应关系中删除, 对应关系随缓存过期
+    assert await client.hkeys(cache.subjects_key) == ["2"]
+    assert 0 < await client.ttl(cache.subjects_key) <= 60  # noqa: PLR2004
+    await cache.invalidate_users([2])
+    assert await client.hkeys(cache.subjects_key) == []
+
+    # 其他进程的进程内缓存也按照Redis中的用户版本号失效
+    other = PrincipalCache(maxsize=10, ttl=60, prefix="test-principal")
+    admin = Principal(id=1, name="admin")
+    await other.set("admin", await other.versions("admin"), admin)
+    await cache.invalidate_users([1])
+    assert await other.get("admin", await other.versions("admin")) is None
+
+
+@pytest.mark.asyncio()
+async def test_model_change_listener():
+    changes = []
+
+    @on_model_change(Role)
+    async def listener(model, ids):
+        changes.append((model, ids))
+
+    @on_model_change(Role)
+    async def broken_listener(model, ids):
+        raise RuntimeError
+
+    try:
+        await notify_model_change(Role, [1, 2])
+        await notify_model_change(User, [3])
+    finally:
+        _change_listeners[Role].remove(listener)
+        _change_listeners[Role].remove(broken_listener)
+
+    assert (Role, [1, 2]) in changes
+    assert all(model is Role for model, _ in changes)
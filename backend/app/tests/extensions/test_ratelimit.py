@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+from ...extensions import ratelimit
+from ...extensions.ratelimit import LocalBlocklist, RateLimiter, local_blocklist
+
+# 限流脚本在Redis中执行, 测试使用fakeredis(Lua脚本需要lupa)
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+@pytest.fixture()
+def redis():
+    local_blocklist.clear()
+    yield fakeredis.FakeAsyncRedis()
+    local_blocklist.clear()
+
+
+def make_request(redis, host: str = "10.0.0.1", endpoint=None) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/login",
+            "headers": [],
+            "query_string": b"",
+            "client": (host, 1234),
+            "endpoint": endpoint,
+            "app": SimpleNamespace(state=SimpleNamespace(redis=redis)),
+        },
+    )
+
+
+async def shift(redis, key: str, ms: int) -> None:
+    """把限流记录中的时间提前若干毫秒, 相当于时间过去了这么久."""
+    if await redis.type(key) == b"hash":
+        ts = int(await redis.hget(key, "ts"))
+        await redis.hset(key, "ts", ts - ms)
+    else:
+        for member, score in await redis.zrange(key, 0, -1, withscores=True):
+            await redis.zadd(key, {member: score - ms})
+
+
+@pytest.mark.asyncio()
+async def test_token_bucket_allow_deny_refill(redis):
+    limiter = RateLimiter(times=3, seconds=60, name="test")
+    request = make_request(redis)
+    key = limiter.build_key(request)
+    assert key.endswith(":test:ip:10.0.0.1")
+
+    results = [await limiter.hit(request, key) for _ in range(3)]
+    assert [(allowed, remaining) for allowed, remaining, _ in results] == [
+        (True, 2),
+        (True, 1),
+        (True, 0),
+    ]
+    allowed, remaining, wait = await limiter.hit(request, key)
+    assert (allowed, remaining) == (False, 0)
+    # 每20秒补充一个令牌
+    assert 19000 < wait <= 20000  # noqa: PLR2004
+
+    # 过去20秒, 补充了一个令牌
+    await shift(redis, key, 20000)
+    assert (await limiter.hit(request, key))[:2] == (True, 0)
+    assert not (await limiter.hit(request, key))[0]
+
+    # 过去很久也不超过桶容量
+    await shift(redis, key, 600000)
+    assert (await limiter.hit(request, key))[:2] == (True, 2)
+
+
+@pytest.mark.asyncio()
+async def test_sliding_window_boundary(redis):
+    limiter = RateLimiter(times=2, seconds=1, algorithm="sliding_window", name="test")
+    request = make_request(redis)
+    key = limiter.build_key(request)
+
+    assert (await limiter.hit(request, key))[:2] == (True, 1)
+    assert (await limiter.hit(request, key))[:2] == (True, 0)
+    allowed, _, wait = await limiter.hit(request, key)
+    assert not allowed
+    assert 0 < wait <= 1000  # noqa: PLR2004
+    # 被拒绝的请求不计入窗口
+    assert await redis.zcard(key) == 2  # noqa: PLR2004
+
+    # 最早的请求还差不到200毫秒离开窗口
+    await shift(redis, key, 800)
+    allowed, _, wait = await limiter.hit(request, key)
+    assert not allowed
+    assert 0 < wait <= 200  # noqa: PLR2004
+
+    # 恰好一个窗口之前的请求不再计入
+    await shift(redis, key, 200)
+    assert (await limiter.hit(request, key))[:2] == (True, 1)
+
+
+@pytest.mark.asyncio()
+async def test_limits_per_client(redis):
+    limiter = RateLimiter(times=1, seconds=60, name="test")
+    first, second = make_request(redis, "10.0.0.1"), make_request(redis, "10.0.0.2")
+
+    assert (await limiter.hit(first, limiter.build_key(first)))[0]
+    assert not (await limiter.hit(first, limiter.build_key(first)))[0]
+    assert (await limiter.hit(second, limiter.build_key(second)))[0]
+
+
+def test_local_blocklist_hit_and_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit, "monotonic", lambda: now[0])
+    blocklist = LocalBlocklist(maxsize=2)
+
+    blocklist.block("a", 5)
+    assert blocklist.retry_after("a") == 5  # noqa: PLR2004
+    assert blocklist.retry_after("b") == 0
+
+    now[0] = 103.0
+    assert blocklist.retry_after("a") == 2  # noqa: PLR2004
+    now[0] = 105.0
+    assert blocklist.retry_after("a") == 0
+    assert "a" not in blocklist._blocked
+
+    # 超过容量时淘汰最早封禁的key
+    for key in ("a", "b", "c"):
+        blocklist.block(key, 5)
+    assert blocklist.retry_after("a") == 0
+    assert blocklist.retry_after("c") == 5  # noqa: PLR2004
+
+
+@pytest.mark.asyncio()
+async def test_rejected_key_skips_redis(redis, monkeypatch):
+    from fastapi import HTTPException
+    from starlette.responses import Response
+
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter(times=1, seconds=60, name="test")
+    request = make_request(redis)
+    await limiter(request, Response())
+
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter(request, Response())
+    assert exc_info.value.headers == {"Retry-After": "60"}
+
+    # 封禁期间直接在本地拒绝, 不再访问Redis
+    request.app.state.redis = SimpleNamespace()
+    with pytest.raises(HTTPException):
+        await limiter(request, Response())
+
+
+@pytest.mark.asyncio()
+async def test_login_too_many_requests(redis, monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from ...apis.home import base_router, user_login
+    from ...main import app
+
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(app.state, "redis", redis, raising=False)
+    route = next(route for route in base_router.routes if route.endpoint is user_login)
+    limiter = route.dependencies[0].dependency
+    # 令牌已经用完, 请求在限流依赖中被拒绝, 不会访问数据库
+    key = limiter.build_key(make_request(redis, "127.0.0.1", user_login))
+    seconds, microseconds = await redis.time()
+    await redis.hset(key, mapping={"tokens": 0, "ts": seconds * 1000 + microseconds // 1000})
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        res = await client.post("/login", data={"username": "admin", "password": "x"})
+
+    assert res.status_code == 429  # noqa: PLR2004
+    assert res.headers["retry-after"] == "6"
+    assert "请求过于频繁" in res.text
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+from collections import OrderedDict
+from types import MappingProxyType
+
+import pytest
+
+from ...commons.enums import HttpMethodEnum, UserGender
+from ...extensions.serializer import JsonSerializer, OrjsonSerializer, get_serializer
+
+GOLDEN_CASES = [
+    (None, b"null"),
+    ({"status": True, "code": 0}, b'{"status":true,"code":0}'),
+    ('中文\n"引号"\x1f', b'"\xe4\xb8\xad\xe6\x96\x87\\n\\"\xe5\xbc\x95\xe5\x8f\xb7\\"\\u001f"'),
+    (datetime.datetime(2024, 5, 6, 7, 8, 9, 123456), b'"2024-05-06 07:08:09"'),  # noqa: DTZ001
+    (
+        datetime.datetime(2024, 5, 6, 7, 8, 9, tzinfo=datetime.UTC),
+        b'"2024-05-06 07:08:09"',
+    ),
+    (datetime.date(2024, 5, 6), b'"2024-05-06"'),
+    (decimal.Decimal("12.50"), b"12.5"),
+    (decimal.Decimal("0.00001"), b"1e-05"),
+    (b"bytes", b'"bytes"'),
+    (MappingProxyType({"a": 1}), b'{"a":1}'),
+    (OrderedDict([("b", 1), ("a", 2)]), b'{"b":1,"a":2}'),
+    ({1: "int key"}, b'{"1":"int key"}'),
+    ((1, 2.5, 1e16, 1e-7, -0.0), b"[1,2.5,1e+16,1e-07,-0.0]"),
+    (2**64, b"18446744073709551616"),
+    ({"gender": UserGender.MEN, "method": HttpMethodEnum.GET}, b'{"gender":1,"method":"GET"}'),
+    (
+        [{"id": 1, "createTime": datetime.datetime(2024, 1, 1), "score": decimal.Decimal("9.9")}],  # noqa: DTZ001
+        b'[{"id":1,"createTime":"2024-01-01 00:00:00","score":9.9}]',
+    ),
+]
+
+
+def available_serializers():
+    serializers = [JsonSerializer()]
+    try:
+        import orjson  # noqa: F401
+
+        serializers.append(OrjsonSerializer())
+    except ImportError:
+        pass
+    return serializers
+
+
+@pytest.mark.parametrize("serializer", available_serializers(), ids=lambda s: s.name)
+@pytest.mark.parametrize(("value", "expected"), GOLDEN_CASES)
+def test_golden_output(serializer, value, expected):
+    assert serializer.dumps(value) == expected
+
+
+@pytest.mark.parametrize("value", [value for value, _ in GOLDEN_CASES])
+def test_backends_identical(value):
+    pytest.importorskip("orjson")
+    assert OrjsonSerializer().dumps(value) == JsonSerializer().dumps(value)
+
+
+@pytest.mark.parametrize("serializer", available_serializers(), ids=lambda s: s.name)
+def test_unsupported_type(serializer):
+    with pytest.raises(TypeError):
+        serializer.dumps({1, 2})
+
+    assert serializer.dumps({1, 2}, default=sorted) == b"[1,2]"
+
+
+@pytest.mark.parametrize("serializer", available_serializers(), ids=lambda s: s.name)
+@pytest.mark.parametrize(
+    "value",
+    [
+        float("nan"),
+        {"score": float("inf"), "name": None},
+        [1, {"a": -float("inf")}],
+        decimal.Decimal("NaN"),
+    ],
+)
+def test_non_finite_float(serializer, value):
+    # 两个后端都不输出NaN/Infinity, 抛出相同的异常
+    with pytest.raises(ValueError, match="Out of range float values"):
+        serializer.dumps(value)
+
+
+def test_default_serializer():
+    assert get_serializer("stdlib").name == "stdlib"
+    assert get_serializer().name in ("stdlib", "orjson")
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, text
+
+
+async def resource_rows(count: int, prefix: str = "bulk"):
+    for i in range(count):
+        yield {"name": f"{prefix}{i}", "permission_code": f"{prefix}:{i}", "pid": 0}
+
+
+@pytest.mark.asyncio()
+async def test_bulk_insert(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+
+    ids = await resource_service.bulk_insert(resource_rows(25), chunk_size=10)
+    assert len(set(ids)) == 25  # noqa: PLR2004
+
+    results = await async_session.exec(select(Resource).where(Resource.id.in_(ids)))
+    assert sorted(r.name for r in results.all()) == sorted(f"bulk{i}" for i in range(25))
+
+    ids = await resource_service.bulk_insert([Resource(name="model", permission_code="model")])
+    assert len(ids) == 1
+
+
+@pytest.mark.asyncio()
+async def test_bulk_update(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(5))
+
+    rows = [{"id": id_, "name": f"renamed{id_}"} for id_ in ids[:3]] + [{"id": ids[3], "pid": 9}]
+    assert await resource_service.bulk_update(rows, chunk_size=2) == ids[:4]
+
+    async_session.expire_all()
+    results = await async_session.exec(select(Resource).where(Resource.id.in_(ids)))
+    resources = {r.id: r for r in results.all()}
+    assert resources[ids[0]].name == f"renamed{ids[0]}"
+    assert resources[ids[3]].name == "bulk3"
+    assert resources[ids[3]].pid == 9  # noqa: PLR2004
+    assert resources[ids[4]].name == "bulk4"
+
+
+@pytest.mark.asyncio()
+async def test_upsert(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(2))
+
+    await resource_service.upsert(
+        [
+            {"id": ids[0], "name": "upserted", "permission_code": "bulk:0", "pid": 0},
+            {"name": "inserted", "permission_code": "inserted", "pid": 0},
+        ],
+        update_fields=["name"],
+    )
+
+    async_session.expire_all()
+    results = await async_session.exec(select(Resource).where(Resource.name == "upserted"))
+    assert results.one().id == ids[0]
+    results = await async_session.exec(select(Resource).where(Resource.name == "inserted"))
+    assert results.one_or_none() is not None
+
+
+@pytest.mark.asyncio()
+async def test_upsert_models_keep_create_time(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from datetime import datetime
+
+    from sqlmodel import update
+
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(2, prefix="model"))
+    created = datetime(2020, 1, 1)  # noqa: DTZ001
+    await async_session.exec(
+        update(Resource).where(Resource.id.in_(ids)).values(create_time=created),
+    )
+    await async_session.exec(update(Resource).where(Resource.id == ids[1]).values(is_deleted=True))
+    await async_session.commit()
+
+    # 模型对象的model_dump包含全部字段, 默认不更新创建时间与软删除标记
+    await resource_service.upsert(
+        [
+            Resource(id=id_, name=f"upserted{i}", permission_code=f"model:{i}")
+            for i, id_ in enumerate(ids)
+        ],
+    )
+
+    async_session.expire_all()
+    results = await async_session.exec(select(Resource).where(Resource.id.in_(ids)))
+    resources = {r.id: r for r in results.all()}
+    assert [resources[id_].name for id_ in ids] == ["upserted0", "upserted1"]
+    assert all(resources[id_].create_time == created for id_ in ids)
+    assert resources[ids[1]].is_deleted
+
+
+@pytest.mark.asyncio()
+async def test_bulk_mixed_fields(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    rows = [
+        {"name": "mixed0", "permission_code": "mixed"},
+        {"name": "mixed1", "permission_code": "mixed", "icon": "a.png"},
+        {"icon": "b.png", "permission_code": "mixed", "name": "mixed2"},
+        {"name": "mixed3", "permission_code": "mixed"},
+    ]
+    ids = await resource_service.bulk_insert(rows, chunk_size=3)
+    assert len(set(ids)) == len(rows)
+
+    async_session.expire_all()
+    results = await async_session.exec(select(Resource).where(Resource.id.in_(ids)))
+    resources = {r.id: r for r in results.all()}
+    assert [resources[id_].name for id_ in ids] == [row["name"] for row in rows]
+    assert [resources[id_].icon for id_ in ids] == [None, "a.png", "b.png", None]
+
+    await resource_service.upsert(
+        [
+            {"id": ids[0], "name": "renamed", "permission_code": "mixed"},
+            {"id": ids[1], "name": "mixed1", "permission_code": "mixed", "icon": "c.png"},
+        ],
+    )
+    async_session.expire_all()
+    assert (await async_session.get(Resource, ids[0])).name == "renamed"
+    assert (await async_session.get(Resource, ids[1])).icon == "c.png"
+    assert (await async_session.get(Resource, ids[1])).name == "mixed1"
+
+
+@pytest.mark.asyncio()
+async def test_upsert_without_returning(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+    monkeypatch,
+) -> None:
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(1, prefix="unique"))
+    await async_session.exec(text("CREATE UNIQUE INDEX ix_resource_name_test ON resource (name)"))
+
+    # 不支持RETURNING时按照conflict_fields检索ID, 包括新增的记录
+    monkeypatch.setattr(async_session.get_bind().dialect, "insert_returning", False)
+    written = await resource_service.upsert(
+        [
+            {"name": "unique0", "permission_code": "updated"},
+            {"name": "unique1", "permission_code": "inserted"},
+        ],
+        conflict_fields=["name"],
+    )
+    assert len(written) == 2  # noqa: PLR2004
+    assert ids[0] in written
+
+
+@pytest.mark.asyncio()
+async def test_failed_write_in_unit_of_work(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from ...extensions.database import unit_of_work
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    notified = []
+
+    async def notify(model, ids):
+        notified.append((model, ids))
+
+    resource_service = ResourceService(async_session)
+    async with unit_of_work(async_session, notify) as uow:
+        kept = await resource_service.save(Resource(name="kept", permission_code="kept"))
+        # 写入出错只回滚到SAVEPOINT, 之前的写入与工作单元的状态不受影响
+        row = {"id": kept.id, "name": "dup", "permission_code": "dup"}
+        with pytest.raises(SQLAlchemyError):
+            await resource_service.bulk_insert([row])
+        with pytest.raises(SQLAlchemyError):
+            await resource_service.save(Resource(**row))
+        assert uow.commit_requested
+        assert uow.changes[Resource] == [kept.id]
+
+    assert notified == [(Resource, [kept.id])]
+    results = await async_session.exec(select(Resource.name).where(Resource.pid == 0))
+    assert "kept" in results.all()
+
+    # 不在SAVEPOINT中的写入出错时回滚整个事务, 工作单元不再提交
+    async with unit_of_work(async_session, notify) as uow:
+        await resource_service.save(Resource(name="discarded", permission_code="discarded"))
+        async_session.add(Resource(id=kept.id, name="dup", permission_code="dup"))
+        with pytest.raises(SQLAlchemyError):
+            await resource_service.commit_or_rollback()
+        assert not uow.commit_requested
+        assert not uow.changes
+
+    assert len(notified) == 1
+    results = await async_session.exec(select(Resource).where(Resource.name == "discarded"))
+    assert results.all() == []
+
+
+@pytest.mark.asyncio()
+async def test_add_or_update(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+
+    created = await resource_service.add_or_update({"name": "log_detail"}, permission_code="log:d")
+    assert created.id is not None
+
+    updated = await resource_service.add_or_update({"name": "log_detail"}, pid=created.id)
+    assert updated.id == created.id
+    assert updated.pid == created.id
+
+
+@pytest.mark.asyncio()
+async def test_version(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from datetime import timedelta
+
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(3, prefix="version"))
+    version = await resource_service.version(offset=0, limit=10, count=True)
+    assert version == await resource_service.version(offset=0, limit=10, count=True)
+
+    resource = await resource_service.get(ids[0])
+    modified = version.last_modified + timedelta(seconds=1)
+    await resource_service.update(resource, update_time=modified)
+    updated = await resource_service.version(offset=0, limit=10, count=True)
+    assert updated.etag != version.etag
+    assert updated.last_modified > version.last_modified
+
+    # 同一秒内的修改更新时间不变, ETag仍然变化
+    await resource_service.update(resource, name="renamed", update_time=modified)
+    renamed = await resource_service.version(offset=0, limit=10, count=True)
+    assert renamed.etag != updated.etag
+    assert renamed.last_modified == updated.last_modified
+
+    await resource_service.delete_by_id(ids[1])
+    assert (await resource_service.version(offset=0, limit=10, count=True)).etag != renamed.etag
+
+
+@pytest.mark.asyncio()
+async def test_stream(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...models.resource import Resource
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(25, prefix="stream"))
+
+    batches = [
+        rows
+        async for rows in resource_service.stream(
+            ("id", "name"),
+            Resource.id.in_(ids),
+            batch_size=10,
+        )
+    ]
+    assert [len(rows) for rows in batches] == [10, 10, 5]
+    assert [tuple(row) for rows in batches for row in rows] == [
+        (id_, f"stream{i}") for i, id_ in enumerate(sorted(ids))
+    ]
+
+
+@pytest.mark.asyncio()
+async def test_get_batched(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    import asyncio
+
+    from ...services.resource import ResourceService
+
+    resource_service = ResourceService(async_session)
+    ids = await resource_service.bulk_insert(resource_rows(3, prefix="loader"))
+    loader = resource_service.loader()
+    queries = loader.queries
+
+    # 同一个周期内的检索合并为一次查询, 结果与ID顺序一致
+    first, *others = await asyncio.gather(
+        resource_service.get(ids[0]),
+        resource_service.get_many([ids[2], -1, ids[1], ids[2]]),
+    )
+    assert first.name == "loader0"
+    assert [r.name if r else None for r in others[0]] == ["loader2", None, "loader1", "loader2"]
+    assert loader.queries == queries + 1
+
+    # 检索过的对象不再查询, 变更之后重新查询
+    assert (await resource_service.get(ids[1])).name == "loader1"
+    assert loader.queries == queries + 1
+    await resource_service.delete_by_id(ids[1])
+    assert await resource_service.get(ids[1]) is None
+    assert loader.queries == queries + 2
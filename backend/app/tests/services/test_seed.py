@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import func, select
+
+
+async def seed(async_session: AsyncSession, hasher) -> tuple[int, int, int]:
+    from ...models.init_data import (
+        DEFAULT_FIXTURE,
+        load_fixture,
+        seed_resources,
+        seed_roles,
+        seed_users,
+    )
+
+    data = load_fixture(DEFAULT_FIXTURE)
+    resource_ids, resource_count = await seed_resources(async_session, data["resources"])
+    role_ids, role_count = await seed_roles(async_session, data["roles"], resource_ids)
+    user_ids = await seed_users(async_session, data["users"], role_ids, hasher)
+    await async_session.commit()
+    return resource_count, role_count, len(user_ids)
+
+
+@pytest.mark.asyncio()
+async def test_seed_is_idempotent(async_session: AsyncSession) -> None:
+    from ...extensions.password import PasswordHasher
+    from ...models.resource import Resource
+    from ...models.role import RoleResourceLink
+    from ...models.user import User
+
+    hasher = PasswordHasher(max_workers=2, max_pending=10, rounds=4)
+    try:
+        assert await seed(async_session, hasher) == (10, 3, 3)
+        links = (await async_session.exec(select(func.count()).select_from(RoleResourceLink))).one()
+
+        assert await seed(async_session, hasher) == (0, 0, 0)
+        assert (
+            await async_session.exec(select(func.count()).select_from(RoleResourceLink))
+        ).one() == links
+
+        results = await async_session.exec(select(Resource).where(Resource.name == "用户列表"))
+        child = results.one()
+        parent = await async_session.get(Resource, child.pid)
+        assert parent.name == "用户管理"
+
+        results = await async_session.exec(select(User).where(User.name == "admin"))
+        assert await hasher.verify("123456", results.one().password)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio()
+async def test_seed_synthetic_users(async_session: AsyncSession) -> None:
+    from ...extensions.password import PasswordHasher
+    from ...models.init_data import seed_synthetic_users
+    from ...models.role import Role
+
+    role = Role(name="普通用户", code="ROLE_USER")
+    async_session.add(role)
+    await async_session.commit()
+
+    hasher = PasswordHasher(max_workers=1, max_pending=1, rounds=4)
+    try:
+        ids = await seed_synthetic_users(async_session, 50, role.id, "123456", hasher)
+        assert len(ids) == 50  # noqa: PLR2004
+        ids = await seed_synthetic_users(async_session, 60, role.id, "123456", hasher)
+        assert len(ids) == 10  # noqa: PLR2004
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio()
+async def test_seed_optional_fields(async_session: AsyncSession) -> None:
+    from ...models.init_data import seed_resources
+    from ...models.resource import Resource
+
+    # 同一层级的资源字段不同
+    resources = [
+        {"name": "目录", "permission_code": "dir"},
+        {"name": "菜单", "permission_code": "menu", "icon": "menu.png", "menu_url": "/menu"},
+        {"name": "按钮", "parent": "菜单", "permission_code": "menu:button"},
+    ]
+    ids, created = await seed_resources(async_session, resources)
+    await async_session.commit()
+    assert created == len(resources)
+
+    menu = await async_session.get(Resource, ids["菜单"])
+    assert (menu.icon, menu.menu_url) == ("menu.png", "/menu")
+    assert (await async_session.get(Resource, ids["目录"])).icon is None
+    assert (await async_session.get(Resource, ids["按钮"])).pid == ids["菜单"]
@@ -16,3 +16,26 @@ async def test_create_user(
 
     ouser = await user_service.create(user_payload)
     assert ouser.id != 0
+
+
+@pytest.mark.asyncio()
+async def test_scroll_users(
+    setup_initial_dataset,
+    async_session: AsyncSession,
+) -> None:
+    from ...extensions.fastapi.pagination import CursorModel
+    from ...services.user import UserService
+
+    user_service = UserService(async_session)
+
+    page = CursorModel(page_size=2, sort="create_time", desc=True, count="exact")
+    users = await user_service.get_list(page)
+    assert len(users) == 2  # noqa: PLR2004
+    assert page.has_more
+    assert page.total == 3  # noqa: PLR2004
+
+    page = CursorModel(page_size=2, sort="create_time", desc=True, cursor=page.next_cursor)
+    users += await user_service.get_list(page)
+    assert len({user.id for user in users}) == 3  # noqa: PLR2004
+    assert not page.has_more
+    assert page.next_cursor is None
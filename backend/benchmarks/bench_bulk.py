@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""批量写入: 逐条保存与批量INSERT的对比.
+
+需要可用的数据库(使用.env中的数据库配置, 表需要已经创建), 测试数据写入resource表, 结束后删除。
+在backend目录下运行:
+python -m benchmarks.bench_bulk --rows 5000
+"""
+
+import asyncio
+from time import perf_counter
+
+import click
+from dotenv import load_dotenv
+from sqlmodel import delete
+
+
+async def run(rows: int, chunk_size: int) -> None:
+    """分别使用save与bulk_insert写入rows条资源."""
+    from app.models import async_engine, async_session
+    from app.models.resource import Resource
+    from app.services.resource import ResourceService
+
+    prefix = "bench-bulk"
+    async with async_session() as session:
+        service = ResourceService(session)
+
+        start = perf_counter()
+        for i in range(min(rows, 1000)):
+            await service.save(Resource(name=f"{prefix}{i}", permission_code=prefix))
+        per_row = (perf_counter() - start) / min(rows, 1000)
+        print(f"save          {per_row * rows:>8.2f}s (estimated for {rows} rows)")  # noqa: T201
+
+        start = perf_counter()
+        await service.bulk_insert(
+            ({"name": f"{prefix}{i}", "permission_code": prefix} for i in range(rows)),
+            chunk_size=chunk_size,
+        )
+        print(f"bulk_insert   {perf_counter() - start:>8.2f}s")  # noqa: T201
+
+        await session.exec(delete(Resource).where(Resource.permission_code == prefix))
+        await session.commit()
+    await async_engine.dispose()
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rows", default=5000, help="Rows to insert.")
+@click.option("--chunk-size", default=1000, help="Rows per INSERT statement.")
+def main(env_file: str, rows: int, chunk_size: int) -> None:
+    """批量写入耗时测试."""
+    load_dotenv(env_file)
+    asyncio.run(run(rows, chunk_size))
+
+
+if __name__ == "__main__":
+    main()
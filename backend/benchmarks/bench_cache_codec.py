@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""接口缓存内容编码: 原JSON文本与二进制编码(msgpack、压缩)的耗时及字节数对比.
+
+使用用户列表(UserListPage)与单个用户(UserPublic)作为缓存内容, 不需要数据库与Redis,
+在backend目录下运行:
+python -m benchmarks.bench_cache_codec --rounds 2000 --size 100
+"""
+
+from datetime import UTC, datetime
+
+import click
+from dotenv import load_dotenv
+
+from .utils import report, timeit_sync
+
+
+def run(rounds: int, size: int) -> None:
+    """分别编码、解码各种缓存内容, 输出耗时以及保存到Redis的字节数."""
+    from fastapi.encoders import jsonable_encoder
+
+    from app.extensions.cache import CacheCodec
+    from app.extensions.cache.codec import _compressors, msgspec
+    from app.extensions.fastapi.pagination import PageModel
+    from app.extensions.serializer import get_serializer
+    from app.models.user import UserListPage, UserPublic
+
+    def legacy_encode(value: object) -> bytes:
+        # 原来的JSON文本编码: 统一序列化后端, 其他对象交给jsonable_encoder
+        return get_serializer().dumps(value, default=jsonable_encoder)
+
+    now = datetime.now(UTC)
+    users = [
+        UserPublic(
+            id=i,
+            name=f"user{i}",
+            email=f"user{i}@example.com",
+            avatar=f"https://example.com/avatar/{i}.png",
+            role_id=2,
+            is_active=1,
+            create_time=now,
+            update_time=now,
+        )
+        for i in range(size)
+    ]
+    payloads = {
+        "UserPublic": users[0],
+        f"UserListPage({size})": UserListPage(
+            users=users,
+            page=PageModel(page=1, page_size=size, total=size * 10),
+        ),
+    }
+
+    codecs = {}
+    for fmt in ("json", "msgpack") if msgspec is not None else ("json",):
+        for compression in _compressors():
+            codecs[f"{fmt}+{compression}"] = CacheCodec(fmt, compression)
+
+    for name, payload in payloads.items():
+        print(f"{name}:")  # noqa: T201
+        data = legacy_encode(payload)
+        print(f"  {'legacy json':<29} {len(data):>8} bytes")  # noqa: T201
+        base_encode = timeit_sync(lambda payload=payload: legacy_encode(payload), rounds)
+        base_decode = timeit_sync(lambda data=data: get_serializer().loads(data), rounds)
+        report("  legacy json encode", base_encode)
+        report("  legacy json decode", base_decode)
+        for codec_name, codec in codecs.items():
+            data = codec.encode(payload)
+            print(f"  {codec_name:<29} {len(data):>8} bytes")  # noqa: T201
+            report(
+                f"  {codec_name} encode",
+                timeit_sync(lambda codec=codec, payload=payload: codec.encode(payload), rounds),
+                base_encode,
+            )
+            report(
+                f"  {codec_name} decode",
+                timeit_sync(lambda codec=codec, data=data: codec.decode(data), rounds),
+                base_decode,
+            )
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rounds", default=2000, help="Encodes/decodes per case.")
+@click.option("--size", default=100, help="Users in the cached list.")
+def main(env_file: str, rounds: int, size: int) -> None:
+    """接口缓存编码耗时与字节数测试."""
+    load_dotenv(env_file)
+    run(rounds, size)
+
+
+if __name__ == "__main__":
+    main()
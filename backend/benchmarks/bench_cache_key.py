@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""接口缓存key: 全部header参与计算与按照vary策略计算的命中率及耗时对比.
+
+模拟不同浏览器、带有链路追踪header的客户端读取用户列表, 不需要数据库与Redis, 在backend目录下运行:
+python -m benchmarks.bench_cache_key --clients 50 --requests 5000
+"""
+
+import hashlib
+import random
+
+import click
+from dotenv import load_dotenv
+
+from .utils import report, timeit_sync
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:126.0) Firefox/126.0",
+    "okhttp/4.12.0",
+]
+
+
+def run(clients: int, requests: int, pages: int) -> None:
+    """每个请求随机选择客户端与页码, 统计两种key的命中率."""
+    from fastapi_cache import FastAPICache
+    from starlette.requests import Request
+
+    from app.extensions.cache import CacheStats, vary_key_builder
+
+    FastAPICache._prefix = "fastapi-cache"
+
+    def legacy_key_builder(func: object, namespace: str = "", request: Request = None) -> str:
+        # 原request_key_builder的实现
+        query_params = repr(sorted(request.query_params.items()))
+        header_params = repr(sorted(request.headers.items()))
+        return (
+            f"fastapi-cache:{namespace}:"
+            + hashlib.sha256(
+                f"{request.method.lower()}:{request.url.path}:{query_params}:{header_params}".encode(),
+            ).hexdigest()
+        )
+
+    def read_users() -> None:
+        pass
+
+    rng = random.Random(0)  # noqa: S311
+    samples = []
+    for i in range(requests):
+        client = rng.randrange(clients)
+        headers = [
+            (b"authorization", f"Bearer token-{client}".encode()),
+            (b"user-agent", USER_AGENTS[client % len(USER_AGENTS)].encode()),
+            (b"accept-encoding", b"gzip, deflate, br"),
+            (b"traceparent", f"00-{i:032x}-{client:016x}-01".encode()),
+        ]
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/user/",
+            "query_string": f"page={rng.randrange(1, pages + 1)}&page_size=10".encode(),
+            "headers": headers,
+        }
+        samples.append(Request(scope))
+
+    builders = {
+        "all headers": legacy_key_builder,
+        "vary public": vary_key_builder(query=("page", "page_size"), scope="public"),
+    }
+    for name, builder in builders.items():
+        stats = CacheStats()
+        cached = set()
+        for request in samples:
+            key = builder(read_users, "read_users", request=request)
+            stats.record(key, key in cached)
+            cached.add(key)
+        print(f"{name:<32} {stats.snapshot()['read_users']}")  # noqa: T201
+
+    request = samples[0]
+    base = timeit_sync(lambda: legacy_key_builder(read_users, "read_users", request=request), 10000)
+    report("all headers key", base)
+    builder = builders["vary public"]
+    report(
+        "vary public key",
+        timeit_sync(lambda: builder(read_users, "read_users", request=request), 10000),
+        base,
+    )
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--clients", default=50, help="Distinct clients.")
+@click.option("--requests", default=5000, help="Simulated requests.")
+@click.option("--pages", default=5, help="Distinct pages requested.")
+def main(env_file: str, clients: int, requests: int, pages: int) -> None:
+    """接口缓存key命中率测试."""
+    load_dotenv(env_file)
+    run(clients, requests, pages)
+
+
+if __name__ == "__main__":
+    main()
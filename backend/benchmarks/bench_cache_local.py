@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""接口缓存命中时的开销: 只使用Redis与增加进程内缓存的对比.
+
+需要可用的Redis(使用.env中的REDIS_DSN), 在backend目录下运行:
+python -m benchmarks.bench_cache_local --rounds 5000
+"""
+
+import asyncio
+
+import click
+import redis.asyncio as redis
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi_cache import FastAPICache
+from fastapi_cache.decorator import cache
+from httpx import ASGITransport, AsyncClient
+
+from .utils import report, timeit_async
+
+
+async def run(rounds: int, size: int) -> None:
+    """分别使用两种缓存后端, 测试缓存命中时的接口耗时以及后端读取耗时."""
+    from app.config import settings
+    from app.extensions.cache import (
+        LocalCache,
+        TaggedRedisBackend,
+        TwoLevelBackend,
+        vary_key_builder,
+    )
+
+    client = redis.Redis.from_url(settings.REDIS_DSN.unicode_string(), decode_responses=True)
+    data = {
+        "users": [{"id": i, "name": f"user{i}", "email": f"{i}@example.com"} for i in range(size)],
+    }
+
+    app = FastAPI()
+
+    @app.get("/cached")
+    @cache(expire=600, key_builder=vary_key_builder(scope="public"))
+    async def cached() -> dict:
+        return data
+
+    backends = {
+        "redis": TaggedRedisBackend(client),
+        "local + redis": TwoLevelBackend(client, LocalCache(64 * 1024 * 1024, 60)),
+    }
+    base = None
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as http:
+        for name, backend in backends.items():
+            FastAPICache.reset()
+            FastAPICache.init(backend, prefix="bench-cache")
+            await http.get("/cached")  # 写入缓存
+            key = next(iter(await client.keys("bench-cache:cached:*")))
+
+            samples = await timeit_async(
+                lambda backend=backend, key=key: backend.get_with_ttl(key),
+                rounds,
+            )
+            report(f"{name} get", samples, base)
+            base = base or samples
+            report(
+                f"{name} request",
+                await timeit_async(lambda: http.get("/cached"), rounds),
+            )
+            await backend.clear(namespace="bench-cache")
+
+    await client.aclose()
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rounds", default=2000, help="Requests per case.")
+@click.option("--size", default=20, help="Users in the cached response.")
+def main(env_file: str, rounds: int, size: int) -> None:
+    """接口缓存命中耗时测试."""
+    load_dotenv(env_file)
+    asyncio.run(run(rounds, size))
+
+
+if __name__ == "__main__":
+    main()
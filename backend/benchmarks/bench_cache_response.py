@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""接口缓存命中耗时: 缓存返回值(每次经过pydantic校验、序列化与元数据中间件)与缓存预先渲染的响应对比.
+
+使用进程内缓存后端与用户列表(UserListPage), 不需要数据库与Redis, 在backend目录下运行:
+python -m benchmarks.bench_cache_response --rounds 2000 --size 100
+"""
+
+import asyncio
+from datetime import UTC, datetime
+
+import click
+from dotenv import load_dotenv
+from httpx import ASGITransport, AsyncClient
+
+from .utils import report, timeit_async
+
+
+async def run(rounds: int, size: int) -> None:
+    """两个接口返回相同的用户列表, 分别使用两种缓存, 测试缓存命中时的请求耗时."""
+    from fastapi import FastAPI
+    from fastapi_cache import FastAPICache
+    from fastapi_cache.backends.inmemory import InMemoryBackend
+    from fastapi_cache.decorator import cache
+
+    from app.extensions.cache import BinaryCoder, cached, vary_key_builder
+    from app.extensions.fastapi.middleware import MetaDataAdderMiddleware
+    from app.extensions.fastapi.pagination import PageModel
+    from app.models.user import UserListPage, UserPublic
+
+    now = datetime.now(UTC)
+    data = UserListPage(
+        users=[
+            UserPublic(
+                id=i,
+                name=f"user{i}",
+                email=f"user{i}@example.com",
+                role_id=2,
+                is_active=1,
+                create_time=now,
+                update_time=now,
+            )
+            for i in range(size)
+        ],
+        page=PageModel(page=1, page_size=size, total=size * 10),
+    )
+
+    app = FastAPI()
+    app.add_middleware(MetaDataAdderMiddleware)
+
+    @app.get("/value", response_model=UserListPage)
+    @cache(expire=600, key_builder=vary_key_builder(scope="public"))
+    async def read_value() -> UserListPage:
+        return data
+
+    @app.get("/rendered", response_model=UserListPage)
+    @cached(expire=600, key_builder=vary_key_builder(scope="public"))
+    async def read_rendered() -> UserListPage:
+        return data
+
+    FastAPICache.reset()
+    FastAPICache.init(InMemoryBackend(), prefix="bench-cache", coder=BinaryCoder)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as http:
+        base = None
+        for path in ("/value", "/rendered"):
+            for encoding in ("identity", "gzip"):
+                headers = {"Accept-Encoding": encoding}
+                await http.get(path, headers=headers)  # 写入缓存
+                samples = await timeit_async(
+                    lambda path=path, headers=headers: http.get(path, headers=headers),
+                    rounds,
+                )
+                report(f"{path} hit ({encoding})", samples, base)
+                base = base or samples
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rounds", default=2000, help="Requests per case.")
+@click.option("--size", default=100, help="Users in the cached response.")
+def main(env_file: str, rounds: int, size: int) -> None:
+    """接口缓存命中耗时测试."""
+    load_dotenv(env_file)
+    asyncio.run(run(rounds, size))
+
+
+if __name__ == "__main__":
+    main()
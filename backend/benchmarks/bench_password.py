@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""并发登录时的事件循环延迟.
+
+模拟concurrency个登录请求同时验证密码, 同时每1ms唤醒一次的心跳任务统计事件循环的延迟,
+对比在事件循环中直接调用bcrypt与使用线程池的差别。在backend目录下运行:
+python -m benchmarks.bench_password --concurrency 16
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from time import perf_counter_ns
+
+import click
+from dotenv import load_dotenv
+
+from .utils import report
+
+
+async def measure_lag(logins: int, verify: Callable[[], Awaitable[bool]]) -> list[int]:
+    """执行logins次并发登录, 返回心跳任务每次唤醒的延迟(纳秒)."""
+    samples = []
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        while not done.is_set():
+            start = perf_counter_ns()
+            await asyncio.sleep(0.001)
+            samples.append(perf_counter_ns() - start - 1_000_000)
+
+    task = asyncio.create_task(heartbeat())
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    done.set()
+    await task
+    return samples
+
+
+async def run(concurrency: int, rounds: int) -> None:
+    """分别测试同步与线程池验证密码."""
+    from app.extensions.password import PasswordHasher, check_password, hash_password
+
+    hashed = hash_password("123456", rounds)
+    hasher = PasswordHasher(max_workers=4, max_pending=concurrency, rounds=rounds)
+
+    async def sync_verify() -> bool:
+        # 原实现: 在事件循环中直接调用bcrypt
+        return check_password("123456", hashed)
+
+    async def pool_verify() -> bool:
+        return await hasher.verify("123456", hashed)
+
+    base = await measure_lag(concurrency, sync_verify)
+    report("event loop lag (sync bcrypt)", base)
+    report("event loop lag (worker pool)", await measure_lag(concurrency, pool_verify), base)
+    hasher.shutdown()
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--concurrency", default=16, help="Concurrent logins.")
+@click.option("--rounds", default=12, help="Bcrypt cost factor.")
+def main(env_file: str, concurrency: int, rounds: int) -> None:
+    """并发登录事件循环延迟测试."""
+    load_dotenv(env_file)
+    asyncio.run(run(concurrency, rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""权限检查: 遍历角色资源列表与权限位图索引的对比.
+
+不需要数据库, 在backend目录下运行:
+python -m benchmarks.bench_permission --resources 200
+"""
+
+from types import SimpleNamespace
+
+import click
+from dotenv import load_dotenv
+
+from .utils import report, timeit_sync
+
+
+def run(resources: int, rounds: int) -> None:
+    """构造拥有resources个权限的角色, 分别检查最后一个权限与不存在的权限."""
+    from app.extensions.auth.permission import PermissionIndex
+
+    codes = [f"sys:module{i // 10}:action{i}" for i in range(resources)]
+    role = SimpleNamespace(
+        resources=[SimpleNamespace(permission_code=code) for code in codes],
+    )
+
+    def loop_check(code: str) -> bool:
+        # 原PermissionChecker的实现
+        return any(code == res.permission_code for res in role.resources)
+
+    index = PermissionIndex()
+    index.build_resources((i + 1, 0, code) for i, code in enumerate(codes))
+    index.build_roles((1, i + 1) for i in range(resources))
+
+    for name, code in (("granted", codes[-1]), ("denied", "sys:unknown")):
+        base = timeit_sync(lambda code=code: loop_check(code), rounds)
+        report(f"loop {name}", base)
+        report(
+            f"bitset {name}",
+            timeit_sync(lambda code=code: index.check(1, code), rounds),
+            base,
+        )
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--resources", default=50, help="Permissions granted to the role.")
+@click.option("--rounds", default=100000, help="Checks per case.")
+def main(env_file: str, resources: int, rounds: int) -> None:
+    """权限检查耗时测试."""
+    load_dotenv(env_file)
+    run(resources, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""限流每个请求的开销.
+
+需要可用的Redis(使用.env中的REDIS_DSN), 在backend目录下运行:
+python -m benchmarks.bench_ratelimit --rounds 5000
+"""
+
+import asyncio
+
+import click
+import redis.asyncio as redis
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from .utils import report, timeit_async
+
+
+async def run(rounds: int) -> None:
+    """分别测试不限流、令牌桶、滑动窗口日志以及本地预过滤拒绝的请求耗时."""
+    from app.config import settings
+    from app.extensions.fastapi.exception import register_global_exception
+    from app.extensions.ratelimit import RateLimiter, local_blocklist
+
+    app = FastAPI()
+    register_global_exception(app)
+    app.state.redis = redis.Redis.from_url(
+        settings.REDIS_DSN.unicode_string(),
+        decode_responses=True,
+    )
+    await app.state.redis.flushdb()
+
+    @app.get("/baseline")
+    async def baseline() -> dict:
+        return {}
+
+    @app.get("/token-bucket", dependencies=[Depends(RateLimiter(rounds * 10, 60))])
+    async def token_bucket() -> dict:
+        return {}
+
+    @app.get(
+        "/sliding-window",
+        dependencies=[Depends(RateLimiter(rounds * 10, 60, algorithm="sliding_window"))],
+    )
+    async def sliding_window() -> dict:
+        return {}
+
+    @app.get("/rejected", dependencies=[Depends(RateLimiter(1, 600))])
+    async def rejected() -> dict:
+        return {}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        base = await timeit_async(lambda: client.get("/baseline"), rounds)
+        report("no limiter", base)
+        for path in ("/token-bucket", "/sliding-window"):
+            await client.get(path)  # 预热, 加载lua脚本
+            report(path, await timeit_async(lambda path=path: client.get(path), rounds), base)
+
+        await client.get("/rejected")
+        await client.get("/rejected")  # 被Redis拒绝, 之后走本地预过滤
+        report(
+            "rejected (local pre-filter)",
+            await timeit_async(lambda: client.get("/rejected"), rounds),
+            base,
+        )
+
+        async def reject_by_redis() -> None:
+            local_blocklist.clear()
+            await client.get("/rejected")
+
+        report("rejected (redis)", await timeit_async(reject_by_redis, rounds), base)
+
+    await app.state.redis.flushdb()
+    await app.state.redis.aclose()
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rounds", default=2000, help="Requests per case.")
+def main(env_file: str, rounds: int) -> None:
+    """限流开销测试."""
+    load_dotenv(env_file)
+    asyncio.run(run(rounds))
+
+
+if __name__ == "__main__":
+    main()
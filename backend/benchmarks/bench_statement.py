@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""常用查询: 每次构造语句与预先构造的语句模板的对比.
+
+默认只测试每次查询在Python中的开销(构造语句并生成编译缓存key), 不需要数据库;
+使用--database时再通过服务执行查询(使用.env中的数据库配置, 表需要已经创建)。
+在backend目录下运行:
+python -m benchmarks.bench_statement --database
+"""
+
+import asyncio
+
+import click
+from dotenv import load_dotenv
+
+from .utils import report, timeit_async, timeit_sync
+
+
+def run_overhead(rounds: int) -> None:
+    """构造语句并生成编译缓存key, 执行查询时SQLAlchemy以该key查找编译缓存."""
+    from sqlmodel import func, select
+
+    from app.models.user import User
+    from app.services.user import USER_BY_NAME, USER_COUNT, USER_LIST
+
+    cases = (
+        ("get_user_by_name", lambda: select(User).where(User.name == "admin"), USER_BY_NAME),
+        ("get_user_list_count", lambda: select(func.count()).select_from(User), USER_COUNT),
+        ("get_user_list", lambda: select(User).offset(0).limit(10), USER_LIST),
+    )
+    for name, build, template in cases:
+        base = timeit_sync(lambda build=build: build()._generate_cache_key(), rounds)
+        report(f"build {name}", base)
+        report(
+            f"template {name}",
+            timeit_sync(lambda template=template: template._generate_cache_key(), rounds),
+            base,
+        )
+
+
+async def run_database(rounds: int) -> None:
+    """通过服务执行查询, 与原来每次构造语句的实现对比."""
+    from sqlmodel import func, select
+
+    from app.extensions.database import pool_stats
+    from app.models import async_engine, async_session
+    from app.models.user import User
+    from app.services.user import UserService
+
+    async with async_session() as session:
+        service = UserService(session)
+
+        async def build_by_name() -> None:
+            # 原get_user_by_name的实现
+            (await session.exec(select(User).where(User.name == "admin"))).one_or_none()
+
+        async def build_count() -> None:
+            (await session.exec(select(func.count()).select_from(User))).one()
+
+        cases = (
+            ("get_user_by_name", build_by_name, lambda: service.get_user_by_name("admin")),
+            ("get_user_list_count", build_count, service.get_user_list_count),
+        )
+        for name, build, template in cases:
+            base = await timeit_async(build, rounds)
+            report(f"db build {name}", base)
+            report(f"db template {name}", await timeit_async(template, rounds), base)
+
+    print(pool_stats.snapshot()["primary"]["statement_cache"])  # noqa: T201
+    await async_engine.dispose()
+
+
+@click.command()
+@click.option("--env-file", default=".env", help="Project settings file.")
+@click.option("--rounds", default=10000, help="Statements per case.")
+@click.option("--database", is_flag=True, help="Also execute the queries on the database.")
+def main(env_file: str, rounds: int, database: bool) -> None:
+    """常用查询耗时测试."""
+    load_dotenv(env_file)
+    run_overhead(rounds)
+    if database:
+        asyncio.run(run_database(min(rounds, 1000)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import statistics
+from collections.abc import Awaitable, Callable
+from time import perf_counter_ns
+
+
+async def timeit_async(func: Callable[[], Awaitable[object]], rounds: int) -> list[int]:
+    """执行rounds次异步函数, 返回每次的耗时(纳秒)."""
+    samples = []
+    for _ in range(rounds):
+        start = perf_counter_ns()
+        await func()
+        samples.append(perf_counter_ns() - start)
+    return samples
+
+
+def timeit_sync(func: Callable[[], object], rounds: int) -> list[int]:
+    """执行rounds次函数, 返回每次的耗时(纳秒)."""
+    samples = []
+    for _ in range(rounds):
+        start = perf_counter_ns()
+        func()
+        samples.append(perf_counter_ns() - start)
+    return samples
+
+
+def percentile(samples: list[int], pct: float) -> float:
+    """百分位数, 单位微秒."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index] / 1000
+
+
+def report(name: str, samples: list[int], baseline: list[int] | None = None) -> None:
+    """输出p50/p99以及相对基准的p99开销, 单位微秒."""
+    line = (
+        f"{name:<32} mean={statistics.fmean(samples) / 1000:>10.2f}us "
+        f"p50={percentile(samples, 50):>10.2f}us p99={percentile(samples, 99):>10.2f}us"
+    )
+    if baseline is not None:
+        line += f" p99 overhead={percentile(samples, 99) - percentile(baseline, 99):>10.2f}us"
+    print(line)  # noqa: T201
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from typing import Optional
+
 import click
 import uvicorn
 from dotenv import load_dotenv
@@ -40,17 +42,35 @@ def start(env_file, log_config):
 
 @cli.command("init-data")
 @click.option("--env-file", default=".env", help="Project settings file.")
-def init_data(env_file):
-    """项目数据库初始化."""
+@click.option("--fixture", default=None, help="Seed data file (YAML or JSON).")
+@click.option("--users", default=0, help="Number of synthetic users for load testing.")
+@click.option("--user-role", default="ROLE_USER", help="Role code of synthetic users.")
+@click.option("--password", default="123456", help="Password of synthetic users.")
+def init_data(
+    env_file: str,
+    fixture: Optional[str],
+    users: int,
+    user_role: str,
+    password: str,
+) -> None:
+    """项目数据库初始化, 可以重复执行, 已经存在的数据不会重复导入."""
     load_dotenv(env_file)
 
     import asyncio
 
-    from app.models.init_data import init_data
+    from app.models.init_data import DEFAULT_FIXTURE, init_data
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(init_data())
+    result = loop.run_until_complete(
+        init_data(
+            fixture=fixture or DEFAULT_FIXTURE,
+            synthetic_users=users,
+            synthetic_role=user_role,
+            synthetic_password=password,
+        ),
+    )
+    click.echo(", ".join(f"{k}: {v}" for k, v in result.items()))
 
 
 if __name__ == "__main__":